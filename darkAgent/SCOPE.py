@@ -2,8 +2,11 @@
 Main file for the implementation of Sparse Cosine Optimized Policy Evolution (SCOPE)
 """
 
+from functools import lru_cache
+
 import numpy as np
-from scipy.fftpack import dct
+
+from tracing import traced
 
 
 class SCOPE:
@@ -38,15 +41,12 @@ class SCOPE:
         self.weights_2 = (np.asarray(chromosome[w1_len : w1_len + w2_len]).reshape(self.k, self.output_size))
         self.bias = (np.asarray(chromosome[w1_len + w2_len :]).reshape(1, self.output_size))
 
+    @traced("SCOPE.forward", "policy")
     def forward(self, frame: np.ndarray) -> np.ndarray:
         """Forward pass for the SCOPE policy"""
 
-        # Applying the 2-D DCT to the input
-        dct_rows = dct(frame.T, norm="ortho")
-        dct_full = dct(dct_rows.T, norm="ortho")
-
-        # Retain the top kxk block
-        m_prime = dct_full[: self.k, : self.k].copy()
+        # Applying the 2-D DCT to the input, computing only the retained top kxk block
+        m_prime = dct_topk(frame, self.k)
 
         # Sparsification step
         threshold = np.percentile(np.abs(m_prime), self.p)
@@ -56,6 +56,56 @@ class SCOPE:
         logits = self.weights_1 @ m_prime @ self.weights_2 + self.bias
         return logits.flatten()
 
+    def forward_batch(self, frames: np.ndarray) -> np.ndarray:
+        """
+        forward() over a batch of frames in one vectorized pass
+        Args:
+            frames: (B, H, W) frames
+        Returns:
+            (B, output_size) logits
+        """
+        return project(dct_topk(frames, self.k), self.p, self.weights_1, self.weights_2, self.bias)
+
+
+@lru_cache(maxsize=None)
+def dct_basis(n: int, k: int) -> np.ndarray:
+    """
+    The first k rows of the orthonormal DCT-II matrix of size n: basis @ x == scipy.fftpack.dct(x, norm="ortho")[:k]
+    for a length-n x. Read-only, cached per (n, k).
+    """
+    i = np.arange(n)
+    basis = np.cos(np.pi * (2 * i[None, :] + 1) * np.arange(k)[:, None] / (2 * n)) * np.sqrt(2.0 / n)
+    basis[0] /= np.sqrt(2.0)
+    basis.flags.writeable = False
+    return basis
+
+
+def dct_topk(frames: np.ndarray, k: int) -> np.ndarray:
+    """
+    The top-left kxk block of the 2-D DCT of each frame, without computing the rest of the transform
+    Args:
+        frames: (B, H, W) or (H, W)
+    Returns:
+        (B, k, k) or (k, k)
+    """
+    h, w = frames.shape[-2:]
+    return dct_basis(h, k) @ frames @ dct_basis(w, k).T
+
+
+def project(coeffs: np.ndarray, p: float, weights_1: np.ndarray, weights_2: np.ndarray, bias: np.ndarray) -> np.ndarray:
+    """
+    Sparsify each (k, k) block at its p-th percentile of magnitudes and apply the linear layers
+    Args:
+        coeffs: (B, k, k) DCT blocks
+        weights_1, weights_2, bias: One policy's (1, k), (k, out), (1, out), or per-sample (B, 1, k), (B, k, out), (B, 1, out)
+    Returns:
+        (B, out) logits
+    """
+    mag = np.abs(coeffs)
+    threshold = np.percentile(mag, p, axis=(1, 2), keepdims=True)
+    m_prime = np.where(mag < threshold, 0.0, coeffs)
+    return (weights_1 @ m_prime @ weights_2 + bias)[:, 0, :]
+
 
 def compute_chromosome_size(k: int, output_size: int) -> int:
     """Return expected length of chromosome for the current SCOPE policy"""
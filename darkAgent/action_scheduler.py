@@ -0,0 +1,195 @@
+"""
+Non-blocking timed actions: presses go out immediately, releases are scheduled on a deadline heap and sent by a
+background thread, so the caller can capture the next frame and run the policy while an action is held.
+
+The release thread sleeps on a condition until shortly before the earliest deadline and busy-waits the last
+SPIN_US microseconds, which keeps hold durations within a few tens of microseconds of the request instead of the
+scheduler's wake-up jitter. Keys and buttons are reference counted: if a new action presses a key that an earlier
+action still holds, the key stays down until the last hold on it ends.
+
+Usage:
+    with X11Input(":90") as x11, ActionScheduler(x11) as sched:
+        sched.submit("roll_fwd", hold_s=0.25)   # Returns right after the press is written
+        frame = grabber.latest()               # ... while the roll is held
+        print(sched.stats())                   # Actual hold durations and their error
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from typing import Sequence
+
+from capture_stats import LatencyHistogram
+from input_actions import ActionTable, CompiledAction
+from x11_input import X11Input
+
+SPIN_US = 300  # Busy-wait this close to a deadline instead of sleeping
+LATE_US = 1000  # Releases sent this much after their deadline count as late
+
+
+@dataclass
+class _Hold:
+    name: str
+    keycodes: tuple[int, ...]
+    buttons: tuple[int, ...]
+    hold_ns: int  # Requested duration
+    pressed_ns: int  # time.monotonic_ns() right after the press was written
+
+
+class ActionScheduler:
+    """
+    Press now, release at a deadline. All X writes are serialized by one lock, so submit() may be called from any
+    thread; the X connection itself stays owned by the scheduler while it runs.
+    """
+
+    def __init__(self, x11: X11Input, table: ActionTable | None = None, spin_us: int = SPIN_US):
+        """
+        Args:
+            x11: The connection to inject on
+            table: Compiled actions for x11's display (default: compiled from input_actions.ACTIONS)
+            spin_us: Busy-wait window before each deadline
+        """
+        self.x11 = x11
+        self.table = table if table is not None else ActionTable(x11)
+        self.spin_ns = spin_us * 1000
+        self._x_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._heap: list[tuple[int, int, _Hold]] = []
+        self._in_flight = 0  # Popped from the heap, release not sent yet
+        self._seq = itertools.count()
+        self._key_refs: dict[int, int] = {}
+        self._button_refs: dict[int, int] = {}
+        self.hold_hist = LatencyHistogram()  # Actual press-to-release durations
+        self.error_hist = LatencyHistogram()  # |actual - requested|
+        self.submitted = 0
+        self.late = 0
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="ActionScheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, action: str | int | CompiledAction, hold_s: float) -> None:
+        """
+        Press an action now and schedule its release
+        Args:
+            action: Action name, index into input_actions.ACTIONS, or a CompiledAction
+            hold_s: How long to hold it
+        """
+        a = action if isinstance(action, CompiledAction) else self.table[action]
+        self.submit_codes(a.keycodes, a.buttons, hold_s, name=a.name)
+
+    def submit_codes(self, keycodes: Sequence[int], buttons: Sequence[int], hold_s: float, name: str = "") -> None:
+        """submit() for raw keycodes and buttons."""
+        keycodes, buttons = tuple(keycodes), tuple(buttons)
+        with self._x_lock:
+            new_keys = [kc for kc in keycodes if self._acquire(self._key_refs, kc)]
+            new_buttons = [b for b in buttons if self._acquire(self._button_refs, b)]
+            if new_keys or new_buttons:
+                self.x11.press_codes(new_keys, new_buttons)
+            pressed_ns = time.monotonic_ns()
+        hold = _Hold(name=name, keycodes=keycodes, buttons=buttons, hold_ns=int(hold_s * 1e9), pressed_ns=pressed_ns)
+        with self._cond:
+            heapq.heappush(self._heap, (pressed_ns + hold.hold_ns, next(self._seq), hold))
+            self.submitted += 1
+            self._cond.notify_all()  # wait_idle() may be waiting on the condition too
+
+    @staticmethod
+    def _acquire(refs: dict[int, int], code: int) -> bool:
+        n = refs.get(code, 0)
+        refs[code] = n + 1
+        return n == 0  # Only the first hold sends the press
+
+    @staticmethod
+    def _drop(refs: dict[int, int], code: int) -> bool:
+        n = refs.get(code, 0)
+        if n <= 1:
+            refs.pop(code, None)
+            return n == 1  # Only the last hold sends the release
+        refs[code] = n - 1
+        return False
+
+    def _release(self, hold: _Hold, deadline_ns: int) -> None:
+        with self._x_lock:
+            up_keys = [kc for kc in hold.keycodes if self._drop(self._key_refs, kc)]
+            up_buttons = [b for b in hold.buttons if self._drop(self._button_refs, b)]
+            if up_keys or up_buttons:
+                self.x11.release_codes(up_keys, up_buttons)
+            released_ns = time.monotonic_ns()
+        held = released_ns - hold.pressed_ns
+        self.hold_hist.record(held)
+        self.error_hist.record(abs(held - hold.hold_ns))
+        if released_ns - deadline_ns > LATE_US * 1000:
+            self.late += 1
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._stop:
+                    return
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                deadline = self._heap[0][0]
+                remaining = deadline - time.monotonic_ns()
+                if remaining > self.spin_ns:
+                    self._cond.wait((remaining - self.spin_ns) / 1e9)  # A new, earlier deadline also wakes us
+                    continue
+                _, _, hold = heapq.heappop(self._heap)
+                self._in_flight += 1
+            while time.monotonic_ns() < deadline:
+                pass  # Spin out the last few hundred microseconds
+            try:
+                self._release(hold, deadline)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._cond.notify_all()
+
+    def pending(self) -> int:
+        """Number of holds whose release was not sent yet (scheduled, or being sent)."""
+        with self._cond:
+            return len(self._heap) + self._in_flight
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Block until every scheduled release was sent; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._heap and not self._in_flight, timeout)
+
+    def release_all(self) -> None:
+        """Drop every scheduled release and let go of everything that is held, now."""
+        with self._cond:
+            self._heap.clear()
+            self._cond.notify_all()
+        with self._x_lock:
+            keys, buttons = list(self._key_refs), list(self._button_refs)
+            self._key_refs.clear()
+            self._button_refs.clear()
+            if keys or buttons:
+                self.x11.release_codes(keys, buttons, sync=True)
+
+    def stats(self) -> dict:
+        """Hold durations and their error against the request, in milliseconds."""
+        return {
+            "submitted": self.submitted,
+            "released": self.hold_hist.count,
+            "late": self.late,
+            "hold_ms": self.hold_hist.summary(),
+            "error_ms": self.error_hist.summary(),
+        }
+
+    def close(self) -> None:
+        """Stop the thread and release everything still held."""
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.release_all()
+
+    def __enter__(self) -> "ActionScheduler":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -0,0 +1,271 @@
+"""
+Fixed-tick agent loop: capture -> preprocess -> SCOPE.forward -> action injection, with the memory read running
+concurrently, all driven by one monotonic schedule at a target rate.
+
+Every tick starts on its deadline (start + n * period). The memory read is handed to a helper thread at the start of
+the tick and overlaps the capture, preprocessing and policy (/proc/pid/mem preads release the GIL); the tick joins it
+at the end. Each stage has a time budget; stage times go into per-stage histograms and budget overruns are counted.
+
+Frame-skip / action repeat: the policy runs on every `repeat`-th tick and the ticks in between only capture and read
+memory while the last action stays held. When a tick overruns its period or the policy path (preprocess + policy +
+act) exceeds its budget, `repeat` goes up (up to max_repeat); after RECOVER_TICKS ticks with at least half the
+period to spare it comes back down. When the loop falls a whole period or more behind, the missed ticks are dropped
+instead of run back to back, and counted as skipped.
+
+Usage:
+    python3 /root/darkAgent/agent_loop.py --instance dsr-1 --hz 30 --seconds 60 --chromosome best.npy
+    python3 /root/darkAgent/agent_loop.py --instance dsr-1 --hz 30 --seconds 10 --k 16 --p 50      # Random weights
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+import metrics
+from capture_stats import CaptureStats, format_stats
+from memory_tools import MemorySnapshot
+
+HZ = 30.0
+MAX_REPEAT = 4  # Hold an action for at most this many ticks when the loop cannot keep up
+RECOVER_TICKS = 30  # Ticks with slack before the repeat is lowered again
+OBS_SIZE = (128, 96)  # (width, height) the frames are downscaled to before the DCT
+GRAY = np.array([0.114, 0.587, 0.299, 0.0], dtype=np.float32)  # BGRA -> luma
+
+
+@dataclass(frozen=True)
+class StageBudgets:
+    """Class for storing the time budget of each stage of a tick, in milliseconds."""
+    capture: float = 8.0
+    preprocess: float = 2.0
+    policy: float = 4.0
+    act: float = 1.0
+    memory: float = 2.0  # Runs concurrently with capture, preprocess and policy
+
+    @classmethod
+    def for_rate(cls, hz: float) -> "StageBudgets":
+        """The default split scaled to a tick period of 1/hz (the defaults fill ~15 ms, i.e. suit ~30-60 Hz)."""
+        scale = (1000.0 / hz) / (cls.capture + cls.preprocess + cls.policy + cls.act) * 0.9
+        return cls(**{k: v * scale for k, v in asdict(cls()).items()})
+
+
+def preprocess(frame: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    """BGRA uint8 (H, W, 4) -> grayscale float32 (H, W) in [0, 1], the 2-D input of SCOPE.forward."""
+    out = np.matmul(frame, GRAY, out=out)  # uint8 @ float32 -> float32
+    out *= 1.0 / 255.0
+    return out
+
+
+class AgentLoop:
+    """
+    Drives one instance at a fixed rate. The grabber is used from the thread that calls run() (X connections are
+    not shared across threads); read_memory is called from a helper thread.
+    """
+
+    def __init__(self, grabber, policy, inputs, read_memory: Callable[[], MemorySnapshot] | None = None, hz: float = HZ, budgets: StageBudgets | None = None, max_repeat: int = MAX_REPEAT, stats: CaptureStats | None = None):
+        """
+        Args:
+            grabber: A FrameGrabber (grab() and latest())
+            policy: A SCOPE policy (forward(2-D frame) -> logits over input_actions.ACTIONS)
+            inputs: An InputState (apply(action index))
+            read_memory: Returns one MemorySnapshot, e.g. a bound read_snapshot_batched; None skips the stage
+            hz: Target tick rate
+            budgets: Per-stage budgets (default: StageBudgets.for_rate(hz))
+            max_repeat: Upper bound of the action repeat
+            stats: Where stage times, lateness and skipped ticks go (default: a new CaptureStats)
+        """
+        self.grabber = grabber
+        self.policy = policy
+        self.inputs = inputs
+        self.read_memory = read_memory
+        self.hz = hz
+        self.period_ns = int(1e9 / hz)
+        self.budgets = budgets if budgets is not None else StageBudgets.for_rate(hz)
+        self._budget_ns = {k: int(v * 1e6) for k, v in asdict(self.budgets).items()}
+        self._policy_budget_ns = self._budget_ns["preprocess"] + self._budget_ns["policy"] + self._budget_ns["act"]
+        self.max_repeat = max_repeat
+        self.stats = stats if stats is not None else CaptureStats(name="agent", target_fps=hz)
+        self.repeat = 1
+        self.action = -1  # Last chosen action index, -1 before the first decision
+        self.snapshot: MemorySnapshot | None = None  # Last memory read
+        self.ticks = 0
+        self.decisions = 0
+        self.overruns = 0  # Ticks whose work took longer than the period
+        self.over_budget: dict[str, int] = {k: 0 for k in self._budget_ns}
+        self._since_decision = 0
+        self._slack_ticks = 0
+        self._gray: np.ndarray | None = None
+        self._m_ticks = metrics.counter("dsr_agent_ticks_total", "Agent loop ticks", display=str(getattr(grabber, "display", "")))
+        self._m_overruns = metrics.counter("dsr_agent_overruns_total", "Ticks that took longer than the period", display=str(getattr(grabber, "display", "")))
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AgentLoop-memory") if read_memory is not None else None
+
+    def _timed(self, stage: str, t0: int) -> int:
+        t1 = time.monotonic_ns()
+        dt = t1 - t0
+        self.stats.record(stage, dt)
+        if dt > self._budget_ns[stage]:
+            self.over_budget[stage] += 1
+        return t1
+
+    def tick(self) -> None:
+        """Run one tick now (run() calls this on schedule)."""
+        t0 = time.monotonic_ns()
+        pending = self._pool.submit(self._read_memory_timed) if self._pool is not None else None
+
+        self.grabber.grab()
+        _, _, frame = self.grabber.latest()
+        t = self._timed("capture", t0)
+
+        policy_ns = 0
+        decide = self._since_decision + 1 >= self.repeat or self.action < 0
+        if decide:
+            t_capture = t
+            self._gray = preprocess(frame, self._gray)
+            t = self._timed("preprocess", t)
+            self.action = int(np.argmax(self.policy.forward(self._gray)))
+            t = self._timed("policy", t)
+            self.inputs.apply(self.action)
+            t = self._timed("act", t)
+            policy_ns = t - t_capture
+            self.decisions += 1
+            self._since_decision = 0
+        else:
+            self._since_decision += 1  # Frame skipped: the last action stays held
+
+        if pending is not None:
+            self.snapshot = pending.result()
+        self.ticks += 1
+        self.stats.frame()
+        self._adapt(time.monotonic_ns() - t0, policy_ns)
+
+    def _read_memory_timed(self) -> MemorySnapshot:
+        t0 = time.monotonic_ns()
+        snap = self.read_memory()
+        self._timed("memory", t0)
+        return snap
+
+    def _adapt(self, work_ns: int, policy_ns: int) -> None:
+        """Raise the action repeat after an overrun, lower it again after a run of ticks with slack."""
+        overrun = work_ns - self.period_ns
+        self.stats.record("overrun", max(overrun, 0))
+        slow_policy = policy_ns > self._policy_budget_ns
+        self._m_ticks.inc()
+        if overrun > 0:
+            self.overruns += 1
+            self._m_overruns.inc()
+        if overrun > 0 or slow_policy:
+            self.repeat = min(self.repeat + 1, self.max_repeat)
+            self._slack_ticks = 0
+        elif work_ns * 2 <= self.period_ns:
+            self._slack_ticks += 1
+            if self._slack_ticks >= RECOVER_TICKS and self.repeat > 1:
+                self.repeat -= 1
+                self._slack_ticks = 0
+        else:
+            self._slack_ticks = 0
+
+    def run(self, seconds: float | None = None, ticks: int | None = None) -> dict:
+        """
+        Tick on schedule until `seconds` elapsed or `ticks` ran (forever if both are None)
+        Returns:
+            summary()
+        """
+        start = time.monotonic_ns()
+        end = None if seconds is None else start + int(seconds * 1e9)
+        next_t = start
+        skipped = 0
+        while (end is None or next_t < end) and (ticks is None or self.ticks < ticks):
+            self.stats.tick(next_t, skipped=skipped)
+            self.tick()
+            next_t += self.period_ns
+            sleep_ns = next_t - time.monotonic_ns()
+            skipped = 0
+            if sleep_ns > 0:
+                time.sleep(sleep_ns / 1e9)
+            elif -sleep_ns >= self.period_ns:
+                skipped = -sleep_ns // self.period_ns  # Whole ticks we are behind; drop them instead of bursting
+                next_t += skipped * self.period_ns
+        return self.summary()
+
+    def summary(self) -> dict:
+        return {
+            "ticks": self.ticks,
+            "decisions": self.decisions,
+            "repeat": self.repeat,
+            "overruns": self.overruns,
+            "over_budget": dict(self.over_budget),
+            "budgets_ms": asdict(self.budgets),
+            "stats": self.stats.snapshot(),
+        }
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+        self.inputs.apply(None)
+
+    def __enter__(self) -> "AgentLoop":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Run a SCOPE policy on one instance at a fixed tick rate.")
+    p.add_argument("--instance", required=True, help="Instance name from /root/config/dsr_instances.json (e.g. dsr-1).")
+    p.add_argument("--hz", type=float, default=HZ, help=f"Tick rate (default: {HZ:g}).")
+    p.add_argument("--seconds", type=float, default=30.0, help="How long to run (default: 30).")
+    p.add_argument("--chromosome", type=Path, default=None, help="Policy weights (.npy); random when omitted.")
+    p.add_argument("--k", type=int, default=16, help="SCOPE DCT block size (default: 16).")
+    p.add_argument("--p", type=int, default=50, help="SCOPE sparsification percentile (default: 50).")
+    p.add_argument("--max-repeat", type=int, default=MAX_REPEAT, help=f"Upper bound of the action repeat (default: {MAX_REPEAT}).")
+    p.add_argument("--json", type=Path, default=None, help="Also write the summary to this JSON file.")
+    return p.parse_args()
+
+
+def main() -> None:
+    from frame_grabber import FrameGrabber
+    from input_actions import ACTION_NAMES
+    from input_state import InputState
+    from instance_config import resolve_instance
+    from memory_tools import BatchReader, read_snapshot_batched, setup_memory_reader
+    from SCOPE import SCOPE, compute_chromosome_size
+    from x11_input import X11Input
+
+    args = parse_args()
+    inst = resolve_instance(args.instance)
+    n_actions = len(ACTION_NAMES)
+    if args.chromosome is not None:
+        chromosome = np.load(args.chromosome)
+    else:
+        chromosome = np.random.default_rng(0).standard_normal(compute_chromosome_size(args.k, n_actions))
+    policy = SCOPE(chromosome, args.k, args.p, n_actions)
+
+    pid, _, basex, baseb, boss = setup_memory_reader(args.instance)
+    reader = BatchReader(pid)
+    try:
+        with X11Input(inst.display) as x11, InputState(x11) as inputs, \
+                FrameGrabber(inst.display, capacity=2, window=inst.desktop_name, out_size=OBS_SIZE, backend=inst.capture_backend, fbdir=inst.fbdir) as grabber:
+            x11.focus_window_by_name(inst.desktop_name)
+            with AgentLoop(grabber, policy, inputs, lambda: read_snapshot_batched(reader, basex, baseb, boss), hz=args.hz, max_repeat=args.max_repeat) as loop:
+                summary = loop.run(seconds=args.seconds)
+    finally:
+        reader.close()
+
+    print(format_stats(summary["stats"]))
+    print(f"decisions {summary['decisions']}/{summary['ticks']} ticks | final repeat {summary['repeat']} | overruns {summary['overruns']} | over budget {summary['over_budget']}")
+    if args.json is not None:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(json.dumps(summary, indent=2) + "\n", encoding="utf-8")
+        print("Wrote:", args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Array-of-bytes (AOB) signature scanner for locating the game's static pointer locations without hardcoded RVAs.
+
+The module's mapped regions are read from `/proc/<pid>/mem` in large chunks and every signature is matched with
+vectorized NumPy comparisons. RIP-relative operands are resolved into pointer locations and the resulting RVAs are
+cached on disk keyed by the module size and a hash of its PE header, so a scan only runs once per game build.
+
+The RVAs in memory_offsets.py stay the default: readers only use scanned ones when they opt in (scan_signatures=True
+in memory_tools.pointer_locations), after compare_rvas() or this CLI showed that the signatures agree with them.
+
+Usage:
+    Print the resolved RVAs for an instance (exits non-zero if they disagree with memory_offsets.py):
+        python3 /root/darkAgent/aob_scanner.py --instance dsr-1
+    Ignore the on-disk cache and rescan:
+        python3 /root/darkAgent/aob_scanner.py --instance dsr-1 --rescan
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+import memory_offsets
+from memory_tools import PROC_SUBSTR, find_game_pid, module_base, module_regions, read_exact
+from instance_config import resolve_instance
+
+CACHE_ROOT = Path("/root/cache/aob")  # One JSON file per game build
+CHUNK_SIZE = 16 * 1024 * 1024  # Bytes read from /proc/<pid>/mem per request
+HEADER_SIZE = 0x1000  # The PE header page, hashed for the cache key
+
+
+@dataclass(frozen=True)
+class Signature:
+    """
+    Class for storing a byte pattern and how to turn its match into an address.
+
+    If `disp_offset` is set, the match is a RIP-relative instruction and the resolved address is
+    `match + instr_len + rel32` where rel32 is read at `match + disp_offset`. Otherwise the match address itself is used.
+    """
+    name: str
+    pattern: str
+    disp_offset: int | None = None
+    instr_len: int = 0
+
+
+def parse_pattern(pattern: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Parses a pattern such as "48 8B 05 ?? ?? ?? ??" into byte values and a mask of the fixed positions
+    Args:
+        pattern: Space separated hex bytes, with "?" or "??" as wildcards
+    Returns:
+        The byte values (uint8) and the boolean mask where True marks a byte that must match
+    """
+    tokens = pattern.split()
+    if not tokens:
+        raise ValueError("Empty AOB pattern")
+    values = np.zeros(len(tokens), dtype=np.uint8)
+    mask = np.zeros(len(tokens), dtype=bool)
+    for i, tok in enumerate(tokens):
+        if tok in ("?", "??"):
+            continue
+        values[i] = int(tok, 16)
+        mask[i] = True
+    if not mask.any():
+        raise ValueError(f"AOB pattern has no fixed bytes: '{pattern}'")
+    return values, mask
+
+
+def find_pattern(buf, pattern: str) -> np.ndarray:
+    """
+    Finds every offset in `buf` where the pattern matches.
+
+    Candidates start as all positions matching the first fixed byte and are filtered by one vectorized
+    comparison per remaining fixed byte, so the cost is a handful of passes over the buffer instead of a Python loop.
+    Args:
+        buf: A bytes-like object or uint8 NumPy array
+        pattern: The AOB pattern (see parse_pattern)
+    Returns:
+        The sorted match offsets as an int64 array
+    """
+    arr = np.frombuffer(buf, dtype=np.uint8) if not isinstance(buf, np.ndarray) else buf
+    values, mask = parse_pattern(pattern)
+    n = arr.size - values.size + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    fixed = np.flatnonzero(mask)
+    first = int(fixed[0])
+    cand = np.flatnonzero(arr[first:first + n] == values[first])
+    for off in fixed[1:]:
+        if cand.size == 0:
+            break
+        cand = cand[arr[cand + off] == values[off]]
+    return cand.astype(np.int64, copy=False)
+
+
+def resolve_match(buf, match: int, sig: Signature) -> int:
+    """
+    Resolves a match offset inside `buf` into an offset relative to the start of `buf`
+    Args:
+        buf: The buffer the match was found in
+        match: The match offset
+        sig: The signature that produced the match
+    Returns:
+        The resolved offset, following the RIP-relative operand if the signature has one
+    """
+    if sig.disp_offset is None:
+        return match
+    p = match + sig.disp_offset
+    rel32 = int(np.frombuffer(buf, dtype="<i4", count=1, offset=p)[0])
+    return match + sig.instr_len + rel32
+
+
+def scan_buffer(buf, sigs: list[Signature]) -> dict[str, int]:
+    """
+    Scans an in-memory image for the signatures
+    Args:
+        buf: The module image (or a synthetic stand-in)
+        sigs: The signatures to look for
+    Returns:
+        A mapping from signature name to resolved offset for the signatures that were found (first match wins)
+    """
+    out: dict[str, int] = {}
+    for sig in sigs:
+        matches = find_pattern(buf, sig.pattern)
+        if matches.size:
+            out[sig.name] = resolve_match(buf, int(matches[0]), sig)
+    return out
+
+
+def scan_process(mem, pid: int, needle: str, sigs: list[Signature], chunk_size: int = CHUNK_SIZE) -> dict[str, int]:
+    """
+    Scans the module's readable regions in the process memory for the signatures
+    Args:
+        mem: The memory object (open /proc/<pid>/mem)
+        pid: The process ID of the game process
+        needle: The substring identifying the module in the maps. e.g. "DarkSoulsRemastered.exe"
+        sigs: The signatures to look for
+        chunk_size: Number of bytes read per request
+    Returns:
+        A mapping from signature name to resolved absolute address
+    """
+    remaining = list(sigs)
+    overlap = max(len(s.pattern.split()) for s in sigs) - 1 if sigs else 0
+    out: dict[str, int] = {}
+    for region in module_regions(pid, needle):
+        addr = region.start
+        while addr < region.end and remaining:
+            # Overlap consecutive chunks so matches spanning a chunk boundary are not missed
+            n = min(chunk_size + overlap, region.end - addr)
+            try:
+                buf = read_exact(mem, addr, n)
+            except (OSError, RuntimeError):
+                break  # Unreadable (e.g. guard pages); skip the rest of the region
+            found = scan_buffer(buf, remaining)
+            for name, off in found.items():
+                out[name] = addr + off
+            remaining = [s for s in remaining if s.name not in out]
+            addr += chunk_size
+    return out
+
+
+def default_signatures() -> list[Signature]:
+    """Returns the signatures for the pointer locations defined in memory_offsets.py"""
+    sigs = []
+    for name, aob in (("BASEX_PTRLOC_RVA", memory_offsets.BASEX_AOB), ("BASEB_PTRLOC_RVA", memory_offsets.BASEB_AOB), ("BOSS_BASE_PTRLOC_RVA", memory_offsets.BOSS_BASE_AOB)):
+        if aob is None:
+            continue
+        pattern, disp_offset, instr_len = aob
+        sigs.append(Signature(name=name, pattern=pattern, disp_offset=disp_offset, instr_len=instr_len))
+    return sigs
+
+
+def build_key(mem, pid: int, needle: str) -> str:
+    """
+    Builds the cache key for the running game build from the module size and a hash of its PE header
+    Args:
+        mem: The memory object
+        pid: The process ID of the game process
+        needle: The substring identifying the module in the maps
+    Returns:
+        The cache key, e.g. "1f3a000_<sha1>"
+    """
+    regions = module_regions(pid, needle)
+    size = regions[-1].end - regions[0].start
+    header = read_exact(mem, regions[0].start, min(HEADER_SIZE, regions[0].size))
+    return f"{size:x}_{hashlib.sha1(header).hexdigest()}"
+
+
+def resolve_rvas(mem, pid: int, base: int, needle: str = PROC_SUBSTR, sigs: list[Signature] | None = None, cache_root: Path | None = CACHE_ROOT, rescan: bool = False) -> dict[str, int]:
+    """
+    Resolves the RVAs of the signatures for the running game build, using the on-disk cache when possible
+    Args:
+        mem: The memory object
+        pid: The process ID of the game process
+        base: The base address of the module
+        needle: The substring identifying the module in the maps
+        sigs: The signatures to resolve (default: default_signatures())
+        cache_root: Directory for the per-build cache files, or None to disable caching
+        rescan: Ignore an existing cache entry
+    Returns:
+        A mapping from signature name to RVA for the signatures that were found
+    """
+    sigs = default_signatures() if sigs is None else sigs
+    if not sigs:
+        return {}
+
+    cache_path = None
+    if cache_root is not None:
+        cache_path = cache_root / f"{build_key(mem, pid, needle)}.json"
+        if not rescan and cache_path.is_file():
+            try:
+                cached = json.loads(cache_path.read_text(encoding="utf-8"))
+                if all(s.name in cached for s in sigs):
+                    return {s.name: int(cached[s.name]) for s in sigs}
+            except Exception:
+                pass  # Corrupt cache entry; rescan
+
+    rvas = {name: addr - base for name, addr in scan_process(mem, pid, needle, sigs).items()}
+    if cache_path is not None and rvas:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(rvas, indent=2) + "\n", encoding="utf-8")
+            tmp_path.replace(cache_path)
+        except OSError as e:
+            print(f"aob_scanner: not caching the scan ({e})", file=sys.stderr)  # Rescanned next time; the RVAs still hold
+    return rvas
+
+
+def compare_rvas(rvas: dict[str, int], sigs: list[Signature] | None = None) -> dict[str, tuple[int | None, int]]:
+    """
+    Compares scanned RVAs with the verified ones in memory_offsets.py
+    Args:
+        rvas: The result of resolve_rvas()
+        sigs: The signatures that were resolved (default: default_signatures())
+    Returns:
+        (scanned RVA or None if not found, hardcoded RVA) for every signature whose RVA does not agree; empty when all agree
+    """
+    sigs = default_signatures() if sigs is None else sigs
+    out = {}
+    for sig in sigs:
+        hardcoded = getattr(memory_offsets, sig.name)
+        found = rvas.get(sig.name)
+        if found != hardcoded:
+            out[sig.name] = (found, hardcoded)
+    return out
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Locate DSR pointer locations via AOB signatures.")
+    p.add_argument("--instance", help="Instance name from /root/config/dsr_instances.json (e.g. dsr-1).")
+    p.add_argument("--rescan", action="store_true", help="Ignore the on-disk cache and rescan the module.")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    wineprefix = resolve_instance(args.instance).wineprefix if args.instance else None
+    pid = find_game_pid(PROC_SUBSTR, PROC_SUBSTR, wineprefix=wineprefix)
+    base = module_base(pid, PROC_SUBSTR)
+    with open(f"/proc/{pid}/mem", "rb", buffering=0) as mem:
+        rvas = resolve_rvas(mem, pid, base, rescan=args.rescan)
+    mismatched = compare_rvas(rvas)
+    for sig in default_signatures():
+        found = rvas.get(sig.name)
+        status = "not found" if found is None else f"0x{found:X}"
+        if sig.name in mismatched and found is not None:
+            status += f" (hardcoded 0x{mismatched[sig.name][1]:X})"
+        print(f"{sig.name:<22} {status}")
+    if mismatched:
+        raise SystemExit("Signatures disagree with memory_offsets.py; do not pass scan_signatures=True for this build")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Test script for the AOB scanner: find_pattern, resolve_match and scan_buffer on synthetic buffers, checked against a
+plain Python matcher instead of the bytes fake_game.py plants.
+
+Usage:
+    python3 /root/darkAgent/aob_test.py
+    python3 -m pytest /root/darkAgent/aob_test.py
+"""
+
+from __future__ import annotations
+
+import struct
+
+import numpy as np
+
+from aob_scanner import Signature, find_pattern, parse_pattern, resolve_match, scan_buffer
+
+
+def _naive_find(buf: bytes, pattern: str) -> list[int]:
+    """Reference matcher: every offset, every byte."""
+    tokens = pattern.split()
+    out = []
+    for i in range(len(buf) - len(tokens) + 1):
+        if all(t in ("?", "??") or buf[i + j] == int(t, 16) for j, t in enumerate(tokens)):
+            out.append(i)
+    return out
+
+
+def _pattern_at(buf: bytes, start: int, length: int, rng: np.random.Generator) -> str:
+    """A pattern copied from buf[start:start + length] with some wildcards (never the first or last byte)."""
+    tokens = [f"{b:02X}" for b in buf[start:start + length]]
+    for j in range(1, length - 1):
+        if rng.random() < 0.3:
+            tokens[j] = "??"
+    return " ".join(tokens)
+
+
+def test_find_pattern_matches_reference() -> None:
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        buf = rng.integers(0, 4, int(rng.integers(1, 400)), dtype=np.uint8).tobytes()  # Small alphabet: many partial matches
+        length = int(rng.integers(2, 8))
+        if len(buf) < length:
+            continue
+        pattern = _pattern_at(buf, int(rng.integers(0, len(buf) - length + 1)), length, rng)
+        assert find_pattern(buf, pattern).tolist() == _naive_find(buf, pattern), pattern
+
+
+def test_find_pattern_edges() -> None:
+    buf = bytes([0x48, 0x8B, 0x05, 1, 2, 3, 4, 0x90, 0x48, 0x8B])
+    assert find_pattern(buf, "48 8B").tolist() == [0, 8]  # Including a match that ends at the last byte
+    assert find_pattern(buf, "48 8B 05 ?? ?? ?? ?? 90 48 8B 00").size == 0  # Longer than the rest of the buffer
+    assert find_pattern(buf[:1], "48 8B").size == 0
+    assert find_pattern(np.frombuffer(buf, dtype=np.uint8), "?? 8B 05").tolist() == [0]
+
+
+def test_parse_pattern_rejects_bad_patterns() -> None:
+    for bad in ("", "?? ??", "ZZ"):
+        try:
+            parse_pattern(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted {bad!r}")
+
+
+def test_resolve_match_rip_relative() -> None:
+    sig = Signature(name="X", pattern="48 8B 05 ?? ?? ?? ?? C3", disp_offset=3, instr_len=7)
+    for match, target in ((0x100, 0x2000), (0x1800, 0x40)):  # Forward and backward (negative rel32)
+        buf = bytearray(0x3000)
+        buf[match:match + 8] = bytes([0x48, 0x8B, 0x05]) + struct.pack("<i", target - (match + 7)) + b"\xC3"
+        assert find_pattern(bytes(buf), sig.pattern).tolist() == [match]
+        assert resolve_match(bytes(buf), match, sig) == target
+    assert resolve_match(b"\x00" * 16, 5, Signature(name="Y", pattern="00")) == 5  # No operand: the match itself
+
+
+def test_scan_buffer_first_match_and_missing() -> None:
+    rng = np.random.default_rng(1)
+    buf = bytearray(rng.integers(0, 256, 0x4000, dtype=np.uint8).tobytes())
+    code = bytes([0x48, 0x8B, 0x05]) + struct.pack("<i", 0x1000) + bytes([0x48, 0x39, 0x48, 0x68])
+    buf[0x3000:0x3000 + len(code)] = code
+    buf[0x2000:0x2000 + len(code)] = code  # Earlier copy wins
+    sigs = [Signature(name="A", pattern="48 8B 05 ?? ?? ?? ?? 48 39 48 68", disp_offset=3, instr_len=7), Signature(name="B", pattern="DE AD BE EF DE AD BE EF")]
+    assert scan_buffer(bytes(buf), sigs) == {"A": 0x2000 + 7 + 0x1000}
+
+
+def main() -> None:
+    tests = [(name, fn) for name, fn in globals().items() if name.startswith("test_")]
+    for name, fn in tests:
+        fn()
+        print(f"ok  {name}")
+    print(f"{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
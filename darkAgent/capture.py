@@ -4,8 +4,10 @@ Capture or record a specific DSR instance's display into `/root/captures/<timest
 Usage:
     Capture a single screenshot:
         python3 /root/darkAgent/capture.py --instance dsr-1 -capture
-    Record a GIF for 5 seconds:
-        python3 /root/darkAgent/capture.py --instance dsr-1 -record --seconds 5
+    Record 5 seconds (mp4 via ffmpeg, or compressed npz chunks), plus a GIF:
+        python3 /root/darkAgent/capture.py --instance dsr-1 -record --seconds 5 --gif
+    Record only the game window's play area, downscaled to the policy resolution:
+        python3 /root/darkAgent/capture.py --instance dsr-1 -record --seconds 5 --window --region 0,40,800,520 --scale 160x104
 """
 
 from __future__ import annotations
@@ -17,7 +19,11 @@ from datetime import datetime
 from pathlib import Path
 from typing import cast
 
+from capture_stats import CaptureStats, format_stats, live_path_for
+from frame_grabber import FrameGrabber, parse_region, parse_size
 from instance_config import resolve_instance
+from recorder import Recorder, iter_recording, write_gif
+from tracing import traced
 
 CAPTURES_ROOT = Path("/root/captures")
 FPS = 24.0
@@ -33,12 +39,19 @@ def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Capture or record X11 frames.")
     mode = p.add_mutually_exclusive_group(required=True)
     mode.add_argument("-capture", action="store_true", help="Capture a single screenshot.")
-    mode.add_argument("-record", action="store_true", help="Record at ~24 FPS for --seconds, then write recording.gif.")
+    mode.add_argument("-record", action="store_true", help="Record at ~24 FPS for --seconds to recording.mp4 (or npz chunks without ffmpeg).")
     p.add_argument("--seconds", type=float, default=None, help="Required for -record: stop automatically after N seconds (e.g. --seconds 5).")
+    p.add_argument("--backend", choices=("auto", "ffmpeg", "npz"), default="auto", help="Recording output (default: ffmpeg mp4 when available, else npz chunks).")
+    p.add_argument("--gif", action="store_true", help="After -record, also stream the frames into recording.gif.")
 
     src = p.add_mutually_exclusive_group()
     src.add_argument("--instance", help="Instance name from /root/config/dsr_instances.json (e.g. dsr-1).")
     src.add_argument("--display", default=None, help="X11 DISPLAY to capture from (e.g. :90).")
+
+    area = p.add_argument_group("capture area")
+    area.add_argument("--window", nargs="?", const="", default=None, help="Grab only the window with this title (default with --instance: its desktop name) instead of the full screen.")
+    area.add_argument("--region", type=parse_region, default=None, help="Sub-region x,y,w,h relative to the window (or screen), e.g. the HUD-free play area.")
+    area.add_argument("--scale", type=parse_size, default=None, help="Downscale frames to WxH while grabbing (e.g. 160x104).")
     args = p.parse_args()
     if args.record and args.seconds is None:
         p.error("--seconds is required when using -record")
@@ -54,94 +67,87 @@ def _ensure_run_dir() -> Path:
     return run_dir
 
 
-def _save_png(run_dir: Path, name: str, screenshot) -> Path:
-    """Save the screenshot to the given path"""
+@traced("save_png", "capture")
+def _save_png(run_dir: Path, name: str, frame, stats: CaptureStats) -> Path:
+    """Save a (H, W, 4) BGRA frame to the given path"""
+    import io
+
     from PIL import Image
 
     path = run_dir / name
-    img = Image.frombytes("RGB", screenshot.size, screenshot.rgb)
-    img.save(path)
+    h, w = frame.shape[:2]
+    buf = io.BytesIO()
+    with stats.stage("encode"):
+        Image.frombuffer("RGB", (w, h), frame, "raw", "BGRX", 0, 1).save(buf, format="PNG")
+    with stats.stage("write"):
+        path.write_bytes(buf.getbuffer())
     return path
 
 
-def _write_gif(frames_dir: Path, out_path: Path, fps: float) -> None:
-    """
-    Merge frame PNGs into a single animated GIF.
-
-    This is intentionally simple; GIFs can get large for long recordings.
-    """
-    from PIL import Image
-
-    frame_paths = sorted(frames_dir.glob("frame_*.png"))
-    if not frame_paths:
-        raise RuntimeError(f"No frames found in {frames_dir}")
-
-    duration_ms = max(1, int(round(1000.0 / fps)))
-
-    frames = []
-    for p in frame_paths:
-        with Image.open(p) as im:
-            frames.append(im.convert("P", palette=Image.ADAPTIVE, colors=256))
-
-    first, rest = frames[0], frames[1:]
-    first.save(out_path, save_all=True, append_images=rest, duration=duration_ms, loop=0, optimize=False, disposal=2)
-
-
-def capture_once() -> Path:
+def capture_once(window: str | None = None, region: tuple[int, int, int, int] | None = None, out_size: tuple[int, int] | None = None, grab_backend: str = "mss", fbdir: str | None = None) -> Path:
     run_dir = _ensure_run_dir()  # Ensure the run directory exists
     display = os.environ.get("DISPLAY", "")
     print("DISPLAY:", display)
     print("Output dir:", run_dir)
 
-    from mss import mss
-
-    with mss() as sct:  # Capture the screen
-        monitor = sct.monitors[0]  # full virtual screen
-        screenshot = sct.grab(monitor)  # Capture the screenshot
-        path = _save_png(run_dir, "capture.png", screenshot)
+    stats = CaptureStats(name=display)
+    with FrameGrabber(display, capacity=1, window=window, region=region, out_size=out_size, timing=stats, backend=grab_backend, fbdir=fbdir) as grabber:
+        grabber.grab()  # Capture the screenshot
+        _, _, frame = grabber.latest()
+        path = _save_png(run_dir, "capture.png", frame, stats)
         print("Saved:", path)
+        stats.dump(run_dir / "capture_stats.json")
         return path
 
 
-def record_png_sequence(seconds: float) -> Path:
-    """Record a sequence of screenshots and save them as a GIF"""
+def record_stream(seconds: float, window: str | None = None, region: tuple[int, int, int, int] | None = None, out_size: tuple[int, int] | None = None, backend: str = "auto", gif: bool = False, grab_backend: str = "mss", fbdir: str | None = None) -> Path:
+    """Record at FPS through the streaming recorder (mp4 or npz chunks, `backend`), optionally followed by a GIF; grab_backend and fbdir select the FrameGrabber source"""
     run_dir = _ensure_run_dir()
-    frames_dir = run_dir / "frames"
-    frames_dir.mkdir(parents=True, exist_ok=False)
 
     display = os.environ.get("DISPLAY", "")
     print("DISPLAY:", display)
     print("Output dir:", run_dir)
     print(f"Recording at ~{FPS:.0f} FPS for {seconds:g}s... (Ctrl+C stops early)")
 
-    frame_interval = 1.0 / FPS
-    start = time.perf_counter()
-    frame_idx = 0
-
-    from mss import mss
-
-    with mss() as sct:  # Capture the screen
-        monitor = sct.monitors[0]  # full virtual screen
-        try:
-            while True:
-                if (time.perf_counter() - start) >= seconds:
-                    break
-                screenshot = sct.grab(monitor)
-                _save_png(frames_dir, f"frame_{frame_idx:06d}.png", screenshot)
-                frame_idx += 1
-
-                next_t = start + frame_idx * frame_interval
-                now = time.perf_counter()
-                sleep_s = next_t - now
-                if sleep_s > 0:
-                    time.sleep(sleep_s)
+    interval_ns = int(1e9 / FPS)
+    timing = CaptureStats(name=display, target_fps=FPS, live_path=live_path_for(display))  # Also readable live by other processes
+
+    with FrameGrabber(display, capacity=2, window=window, region=region, out_size=out_size, timing=timing, backend=grab_backend, fbdir=fbdir) as grabber:  # Capture the screen
+        grabber.grab()  # Open the display to learn the frame shape
+        recorder = Recorder(run_dir, FPS, grabber.shape, backend=backend, stats=timing)
+        timing.reset()  # Leave the display setup out of the stats
+        start = time.monotonic_ns()
+        end = start + int(seconds * 1e9)
+        next_t = start
+        skipped = 0
+        try:  # The recorder is closed however the loop ends, so queued frames are written and the mp4 is finalized
+            while next_t < end:
+                timing.tick(next_t, skipped=skipped)
+                grabber.grab()
+                _, t_ns, frame = grabber.latest()
+                recorder.submit(frame, t_ns)  # Copies into the recorder's pool; encoding happens on its threads
+
+                next_t += interval_ns
+                sleep_ns = next_t - time.monotonic_ns()
+                skipped = 0
+                if sleep_ns > 0:
+                    time.sleep(sleep_ns / 1e9)
+                elif -sleep_ns >= interval_ns:
+                    skipped = -sleep_ns // interval_ns  # Whole ticks we are behind; skip them instead of bursting
+                    next_t += skipped * interval_ns
         except KeyboardInterrupt:
             pass
-
-    print(f"Stopped. Saved {frame_idx} frames to: {frames_dir}")
-    gif_path = run_dir / "recording.gif"
-    _write_gif(frames_dir, gif_path, FPS)
-    print("Wrote:", gif_path)
+        finally:
+            stats = recorder.close()
+
+    print(f"Stopped. Wrote {stats.frames_written} frames ({stats.backend}) to: {recorder.out_path}")
+    print(f"Achieved {stats.achieved_fps:.1f} / {FPS:.0f} FPS | dropped {stats.frames_dropped} frames")
+    timing.dump(run_dir / "capture_stats.json")
+    print(format_stats(timing.snapshot()))
+    if gif:
+        gif_path = run_dir / "recording.gif"
+        n = write_gif(iter_recording(run_dir), gif_path, FPS)
+        print(f"Wrote: {gif_path} ({n} frames)")
     return run_dir
 
 
@@ -149,17 +155,24 @@ def main() -> None:
     args = parse_args()
     CAPTURES_ROOT.mkdir(parents=True, exist_ok=True)  # Create the captures root directory if it doesn't exist
 
+    window = args.window
+    grab_backend, fbdir = "mss", None  # FrameGrabber source; an instance may capture from its Xvfb framebuffer instead
     if args.instance:
         inst = resolve_instance(args.instance)
         os.environ["DISPLAY"] = inst.display  # set display for mss
+        grab_backend, fbdir = inst.capture_backend, inst.fbdir
+        if window == "":
+            window = inst.desktop_name  # The Wine virtual desktop window of the instance
     else:
         os.environ["DISPLAY"] = args.display or DEFAULT_DISPLAY  # Set the display environment variable to the display number for the given display
+    if window == "":
+        raise SystemExit("--window needs a title when --instance is not given")
 
     if args.capture:
-        capture_once()  # Capture a single screenshot
+        capture_once(window=window, region=args.region, out_size=args.scale, grab_backend=grab_backend, fbdir=fbdir)  # Capture a single screenshot
         return
     if args.record:
-        record_png_sequence(cast(float, args.seconds))  # Record a sequence of screenshots
+        record_stream(cast(float, args.seconds), window=window, region=args.region, out_size=args.scale, backend=args.backend, gif=args.gif, grab_backend=grab_backend, fbdir=fbdir)  # Record a sequence of screenshots
         return
 
 if __name__ == "__main__":
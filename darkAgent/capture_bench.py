@@ -0,0 +1,190 @@
+"""
+Benchmark for the capture paths: the legacy per-run mss context + PIL conversion used by capture.py against the
+persistent ring-buffered FrameGrabber, with either the mss or the xwd (Xvfb framebuffer file) backend. Reports
+frames/s, per-grab latency and CPU time per frame, split between this process and the X server when it is our Xvfb.
+
+Runs against an existing display, or starts a private Xvfb stand-in with --xvfb (which also exposes its framebuffer
+for the xwd backend).
+
+Usage:
+    python3 /root/darkAgent/capture_bench.py --xvfb --res 800x600 --seconds 5
+    python3 /root/darkAgent/capture_bench.py --display :90
+    python3 /root/darkAgent/capture_bench.py --display :90 --fbdir /tmp/xvfb_fb_90
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from frame_grabber import FrameGrabber
+
+XVFB_DISPLAY_NUM = 199  # Display number for the private Xvfb
+
+
+def start_xvfb(display_num: int = XVFB_DISPLAY_NUM, res: str = "800x600", fbdir: Path | None = None, timeout_s: float = 10.0) -> subprocess.Popen:
+    """
+    Start a private Xvfb and wait until it accepts connections
+    Args:
+        display_num: The display number (":<display_num>")
+        res: The screen resolution, e.g. "800x600"
+        fbdir: If provided, Xvfb exposes its framebuffer as an XWD file in this directory (-fbdir)
+        timeout_s: How long to wait for the socket to appear
+    Returns:
+        The Xvfb process; terminate() it when done
+    """
+    if shutil.which("Xvfb") is None:
+        raise RuntimeError("Xvfb not found (apt-get install xvfb)")
+    cmd = ["Xvfb", f":{display_num}", "-screen", "0", f"{res}x24", "-nolisten", "tcp"]
+    if fbdir is not None:
+        fbdir.mkdir(parents=True, exist_ok=True)
+        cmd += ["-fbdir", str(fbdir)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    sock = Path(f"/tmp/.X11-unix/X{display_num}")
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if sock.exists():
+            return proc
+        if proc.poll() is not None:
+            break
+        time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"Xvfb failed to start on :{display_num}")
+
+
+def summarize(samples_ns: list[int], wall_s: float) -> dict[str, float]:
+    """ops/s over the wall time and p50/p99 latency in milliseconds."""
+    a = np.asarray(samples_ns, dtype=np.int64)
+    return {
+        "frames": int(a.size),
+        "fps": a.size / wall_s if wall_s > 0 else 0.0,
+        "p50_ms": float(np.percentile(a, 50)) / 1e6 if a.size else 0.0,
+        "p99_ms": float(np.percentile(a, 99)) / 1e6 if a.size else 0.0,
+    }
+
+
+def _proc_cpu_s(pid: int) -> float:
+    """utime + stime of another process, from /proc/<pid>/stat."""
+    fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+# Pid of the X server to charge server-side CPU to (set when we started the Xvfb)
+SERVER_PID: int | None = None
+
+
+def _time_loop(fn: Callable[[], object], seconds: float) -> dict[str, float]:
+    samples = []
+    server0 = _proc_cpu_s(SERVER_PID) if SERVER_PID else 0.0
+    cpu0 = time.process_time()
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        t0 = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - t0)
+    out = summarize(samples, time.perf_counter() - start)
+    n = max(1, out["frames"])
+    out["cpu_ms_per_frame"] = (time.process_time() - cpu0) * 1e3 / n
+    if SERVER_PID:
+        out["server_cpu_ms_per_frame"] = (_proc_cpu_s(SERVER_PID) - server0) * 1e3 / n
+    return out
+
+
+def bench_legacy(display: str, seconds: float) -> dict[str, float]:
+    """capture.py before the grabber: a fresh mss context per capture and a PIL image per grab."""
+    from mss import mss
+    from PIL import Image
+
+    def once() -> None:
+        with mss(display=display) as sct:
+            shot = sct.grab(sct.monitors[0])
+            Image.frombytes("RGB", shot.size, shot.rgb)
+
+    return _time_loop(once, seconds)
+
+
+def bench_legacy_loop(display: str, seconds: float) -> dict[str, float]:
+    """record_png_sequence's inner loop without the PNG encode: one mss context, a PIL image per grab."""
+    from mss import mss
+    from PIL import Image
+
+    with mss(display=display) as sct:
+        monitor = sct.monitors[0]
+
+        def once() -> None:
+            shot = sct.grab(monitor)
+            Image.frombytes("RGB", shot.size, shot.rgb)
+
+        return _time_loop(once, seconds)
+
+
+def bench_grabber(display: str, seconds: float, backend: str = "mss", fbdir: str | None = None) -> dict[str, float]:
+    """FrameGrabber.grab() into the preallocated ring."""
+    with FrameGrabber(display, backend=backend, fbdir=fbdir) as grabber:
+        grabber.grab()  # Open the display and allocate the ring outside the timed loop
+        return _time_loop(grabber.grab, seconds)
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Benchmark the capture paths.")
+    src = p.add_mutually_exclusive_group()
+    src.add_argument("--display", default=None, help="X11 DISPLAY to capture from (default: $DISPLAY).")
+    src.add_argument("--xvfb", action="store_true", help="Start a private Xvfb as the stand-in display.")
+    p.add_argument("--res", default="800x600", help="Xvfb resolution (default: 800x600).")
+    p.add_argument("--fbdir", default=None, help="-fbdir of the --display's Xvfb, to also benchmark the xwd backend.")
+    p.add_argument("--seconds", type=float, default=3.0, help="Duration of each benchmark (default: 3).")
+    p.add_argument("--json", type=Path, default=None, help="Also write the results to this JSON file.")
+    return p.parse_args()
+
+
+def main() -> None:
+    global SERVER_PID
+    args = parse_args()
+    xvfb = None
+    tmp = None
+    fbdir = args.fbdir
+    if args.xvfb:
+        tmp = tempfile.TemporaryDirectory(prefix="xvfb_fb_")
+        fbdir = tmp.name
+        xvfb = start_xvfb(res=args.res, fbdir=Path(fbdir))
+        SERVER_PID = xvfb.pid
+        display = f":{XVFB_DISPLAY_NUM}"
+    else:
+        display = args.display or os.environ.get("DISPLAY", ":99")
+    try:
+        results = {
+            "legacy_per_capture": bench_legacy(display, args.seconds),
+            "legacy_loop": bench_legacy_loop(display, args.seconds),
+            "frame_grabber": bench_grabber(display, args.seconds),
+        }
+        if fbdir:
+            results["frame_grabber_xwd"] = bench_grabber(display, args.seconds, backend="xwd", fbdir=fbdir)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+        if tmp is not None:
+            tmp.cleanup()
+
+    print(f"display {display}")
+    print(f"{'path':<20} {'fps':>8} {'p50 ms':>8} {'p99 ms':>8} {'cpu ms/f':>9} {'X cpu ms/f':>11}")
+    for name, r in results.items():
+        server = f"{r['server_cpu_ms_per_frame']:>11.3f}" if "server_cpu_ms_per_frame" in r else f"{'-':>11}"
+        print(f"{name:<20} {r['fps']:>8.1f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['cpu_ms_per_frame']:>9.3f} {server}")
+    if args.json is not None:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print("Wrote:", args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Capture every DSR instance display from one process.
+
+Each instance in `/root/config/dsr_instances.json` gets its own FrameGrabber: its own X connection, its own ring
+buffer and its own grab thread, using the instance's capture_backend (mss, or xwd for Xvfb displays). Nothing touches
+the process-global DISPLAY. The XShm grab and the NumPy copy release the GIL, so the grab threads overlap and throughput scales with the number of displays until the cores are saturated.
+
+Usage:
+    Capture all instances for 10 seconds and print per-instance throughput:
+        python3 /root/darkAgent/capture_service.py --seconds 10
+    Capture two instances' game windows at 30 FPS, downscaled to the policy resolution:
+        python3 /root/darkAgent/capture_service.py --instances dsr-1 dsr-2 --fps 30 --window --scale 160x120
+    Measure how the aggregate rate scales with 1..N displays:
+        python3 /root/darkAgent/capture_service.py --scaling --seconds 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import numpy as np
+
+from capture_stats import format_stats, live_path_for
+from frame_grabber import CAPACITY, FrameGrabber, GrabStats, parse_region, parse_size
+from instance_config import InstanceConfig, load_instances, resolve_instance
+
+
+@dataclass(frozen=True)
+class TaggedFrame:
+    """Class for storing a frame together with the instance it was captured from."""
+    instance: str
+    seq: int
+    t_ns: int  # time.monotonic_ns() at the start of the grab
+    frame: np.ndarray  # View into the instance's ring; valid until `capacity - 1` more frames are grabbed
+
+
+class CaptureService:
+    """
+    One FrameGrabber per instance, grabbing concurrently on background threads.
+    """
+
+    def __init__(self, instances: list[str] | None = None, fps: float | None = None, capacity: int = CAPACITY, window: bool = False, region: tuple[int, int, int, int] | None = None, out_size: tuple[int, int] | None = None):
+        """
+        Args:
+            instances: Instance names (default: every instance in the config)
+            fps: Grab rate per instance, or None to grab as fast as possible
+            capacity: Frames kept in each instance's ring buffer
+            window: Grab only each instance's desktop window instead of the whole screen
+            region: (x, y, w, h) sub-region, relative to the window or screen
+            out_size: (width, height) to downscale each frame to
+        """
+        names = instances if instances else sorted(load_instances().keys())
+        self.configs: dict[str, InstanceConfig] = {name: resolve_instance(name) for name in names}
+        self.fps = fps
+        self.grabbers: dict[str, FrameGrabber] = {
+            name: FrameGrabber(cfg.display, capacity=capacity, window=cfg.desktop_name if window else None, region=region, out_size=out_size, backend=cfg.capture_backend, fbdir=cfg.fbdir)
+            for name, cfg in self.configs.items()
+        }
+        for name, g in self.grabbers.items():
+            g.timing.name = name
+            g.timing.live_path = live_path_for(name)  # Readable from other processes with capture_stats.read_live(name)
+
+    def start(self) -> "CaptureService":
+        for g in self.grabbers.values():
+            g.start(self.fps)
+        return self
+
+    def stop(self) -> None:
+        for g in self.grabbers.values():
+            g.stop()
+
+    def close(self) -> None:
+        for g in self.grabbers.values():
+            g.close()
+
+    def __enter__(self) -> "CaptureService":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def latest(self, instance: str) -> TaggedFrame | None:
+        """The newest frame of one instance, or None before its first grab."""
+        out = self.grabbers[instance].latest()
+        if out is None:
+            return None
+        seq, t_ns, frame = out
+        return TaggedFrame(instance, seq, t_ns, frame)
+
+    def latest_all(self) -> dict[str, TaggedFrame]:
+        """The newest frame of every instance that has one."""
+        out = {}
+        for name in self.grabbers:
+            f = self.latest(name)
+            if f is not None:
+                out[name] = f
+        return out
+
+    def wait(self, instance: str, after_seq: int, timeout: float | None = None) -> TaggedFrame | None:
+        """Block until `instance` has a frame newer than `after_seq`; None on timeout or if its grabber died."""
+        g = self.grabbers[instance]
+        if g.wait(after_seq, timeout) <= after_seq:
+            return None
+        return self.latest(instance)
+
+    def errors(self) -> dict[str, BaseException]:
+        """Instances whose grab thread died (display gone, window never appeared, ...)."""
+        return {name: g.error for name, g in self.grabbers.items() if g.error is not None}
+
+    def stats(self) -> dict[str, GrabStats]:
+        return {name: g.stats() for name, g in self.grabbers.items()}
+
+    def timing(self) -> dict[str, dict]:
+        """Per-instance stage histograms, deadlines and effective FPS (capture_stats.CaptureStats.snapshot())."""
+        return {name: g.timing.snapshot() for name, g in self.grabbers.items()}
+
+
+def _print_stats(stats: dict[str, GrabStats], errors: dict[str, BaseException]) -> None:
+    print(f"{'instance':<16} {'frames':>8} {'fps':>8} {'grab ms':>9} {'max ms':>8}")
+    for name, s in stats.items():
+        err = f"  ERROR: {errors[name]}" if name in errors else ""
+        print(f"{name:<16} {s.frames:>8d} {s.fps:>8.1f} {s.grab_ms_mean:>9.2f} {s.grab_ms_max:>8.2f}{err}")
+    print(f"{'total':<16} {sum(s.frames for s in stats.values()):>8d} {sum(s.fps for s in stats.values()):>8.1f}")
+
+
+def run_scaling(names: list[str], seconds: float, **kwargs) -> list[dict[str, float]]:
+    """
+    Run the service on the first 1..N instances in turn and report the aggregate rate
+    Returns:
+        One row per instance count with the total fps and the speedup over a single display
+    """
+    rows = []
+    for n in range(1, len(names) + 1):
+        with CaptureService(names[:n], **kwargs) as svc:
+            time.sleep(seconds)
+            stats = svc.stats()
+            errors = svc.errors()
+        if errors:
+            raise RuntimeError(f"Capture failed: {errors}")
+        total = sum(s.fps for s in stats.values())
+        rows.append({"displays": n, "total_fps": total, "speedup": total / rows[0]["total_fps"] if rows else 1.0})
+        print(f"{n:>3} displays: {total:8.1f} fps total  (x{rows[-1]['speedup']:.2f})")
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Capture every instance display concurrently from one process.")
+    p.add_argument("--instances", nargs="+", default=None, help="Instance names (default: all in the config).")
+    p.add_argument("--fps", type=float, default=None, help="Grab rate per instance (default: as fast as possible).")
+    p.add_argument("--seconds", type=float, default=5.0, help="How long to run (default: 5).")
+    p.add_argument("--window", action="store_true", help="Grab only each instance's desktop window.")
+    p.add_argument("--region", type=parse_region, default=None, help="Sub-region x,y,w,h of the window or screen.")
+    p.add_argument("--scale", type=parse_size, default=None, help="Downscale frames to WxH.")
+    p.add_argument("--scaling", action="store_true", help="Measure the aggregate rate with 1..N displays.")
+    p.add_argument("--json", type=Path, default=None, help="Also write the results to this JSON file.")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    kwargs = dict(fps=args.fps, window=args.window, region=args.region, out_size=args.scale)
+    if args.scaling:
+        names = args.instances or sorted(load_instances().keys())
+        results: object = run_scaling(names, args.seconds, **kwargs)
+    else:
+        with CaptureService(args.instances, **kwargs) as svc:
+            try:
+                time.sleep(args.seconds)
+            except KeyboardInterrupt:
+                pass
+            stats, errors, timing = svc.stats(), svc.errors(), svc.timing()
+        _print_stats(stats, errors)
+        for snap in timing.values():
+            print(format_stats(snap))
+        results = {name: {**asdict(s), "timing": timing[name]} for name, s in stats.items()}
+    if args.json is not None:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print("Wrote:", args.json)
+
+
+if __name__ == "__main__":
+    main()
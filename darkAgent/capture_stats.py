@@ -0,0 +1,245 @@
+"""
+Timing instrumentation for the capture paths: per-stage latency histograms, deadline accounting and effective FPS.
+
+Stages are free-form names; the capture code uses:
+    grab      the X request (mss) or framebuffer read (xwd)
+    convert   copy/resample into the ring buffer
+    submit    handing a frame to the recorder
+    encode    PNG / npz compression or ffmpeg pipe writes
+    write     file writes that are timed separately from encoding
+
+Latencies go into HDR-style histograms: 32 linear sub-buckets per power of two, so every recorded value is kept
+with ~3% relative precision from 1 ns to minutes in 2 KiB of counters, and recording is O(1).
+
+A run dumps its stats as JSON (dump()); while running, snapshot() gives the same dict to other threads and
+publish() writes it atomically to a file (by default under /dev/shm) for other processes.
+
+Usage:
+    stats = CaptureStats(target_fps=24)
+    with stats.stage("grab"):
+        grabber.grab()
+    stats.tick(deadline_ns)
+    stats.dump(run_dir / "capture_stats.json")
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+SUB_BITS = 5
+SUB_COUNT = 1 << SUB_BITS  # Linear sub-buckets per power of two
+LINEAR_MAX = 2 * SUB_COUNT  # Values below this get a bucket each
+BUCKETS = 2048  # Enough for values up to ~2^68 ns; larger values land in the last bucket
+LIVE_DIR = Path("/dev/shm")
+PUBLISH_S = 1.0  # Minimum interval between automatic publishes
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+def _bucket(v: int) -> int:
+    if v < LINEAR_MAX:
+        return v if v > 0 else 0
+    e = v.bit_length() - (SUB_BITS + 1)
+    i = (e << SUB_BITS) + (v >> e)  # == LINEAR_MAX + (e - 1) * SUB_COUNT + ((v >> e) - SUB_COUNT)
+    return i if i < BUCKETS else BUCKETS - 1
+
+
+def _bucket_high(i: int) -> int:
+    """Highest value that maps to bucket i."""
+    if i < LINEAR_MAX:
+        return i
+    e, sub = divmod(i - LINEAR_MAX, SUB_COUNT)
+    e += 1
+    return ((sub + SUB_COUNT + 1) << e) - 1
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of non-negative integer values (nanoseconds), safe to record into from several threads.
+    """
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS  # A list: incrementing an element is ~10x cheaper than on a NumPy array
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+        self._lock = threading.Lock()
+
+    def record(self, v: int) -> None:
+        i = _bucket(v)
+        with self._lock:
+            self.counts[i] += 1
+            if not self.count or v < self.min:
+                self.min = v
+            if v > self.max:
+                self.max = v
+            self.count += 1
+            self.total += v
+
+    def percentile(self, q: float) -> int:
+        """Value at percentile q (0-100), as the highest value of its bucket, capped at the exact maximum."""
+        if not self.count:
+            return 0
+        cum = np.cumsum(np.asarray(self.counts, dtype=np.int64))
+        i = int(np.searchsorted(cum, max(1, int(np.ceil(q / 100.0 * self.count)))))
+        return min(_bucket_high(i), self.max)
+
+    def summary(self, scale: float = 1e6) -> dict[str, float]:
+        """count, mean, min, max and PERCENTILES, divided by `scale` (milliseconds by default)."""
+        out = {"count": self.count}
+        if not self.count:
+            return out
+        out["mean"] = self.total / self.count / scale
+        out["min"] = self.min / scale
+        for q in PERCENTILES:
+            out[f"p{q:g}"] = self.percentile(q) / scale
+        out["max"] = self.max / scale
+        return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts = [0] * BUCKETS
+            self.count = self.total = self.min = self.max = 0
+
+
+class CaptureStats:
+    """
+    Per-stage latency histograms plus frame, deadline and skipped-tick counters for one capture run.
+    """
+
+    def __init__(self, name: str = "capture", target_fps: float | None = None, live_path: Path | None = None):
+        """
+        Args:
+            name: Label stored in the dump (e.g. the display or instance)
+            target_fps: The scheduled rate, if any; deadlines are only accounted with a schedule
+            live_path: If provided, frame() publishes the stats there at most every PUBLISH_S seconds
+        """
+        self.name = name
+        self.target_fps = target_fps
+        self.live_path = live_path
+        self.stages: dict[str, LatencyHistogram] = {}
+        self.lateness = LatencyHistogram()  # How far past its deadline each scheduled frame started
+        self.frames = 0
+        self.missed_deadlines = 0  # Frames that started a whole interval or more after their deadline
+        self.skipped_ticks = 0  # Scheduled ticks dropped to catch up
+        self.started_ns = time.monotonic_ns()
+        self._last_publish_ns = 0
+        self._stages_lock = threading.Lock()
+
+    def histogram(self, stage: str) -> LatencyHistogram:
+        h = self.stages.get(stage)
+        if h is None:
+            with self._stages_lock:
+                h = self.stages.setdefault(stage, LatencyHistogram())
+        return h
+
+    def record(self, stage: str, ns: int) -> None:
+        self.histogram(stage).record(ns)
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        """Time the enclosed block into `stage`."""
+        h = self.histogram(stage)
+        t0 = time.monotonic_ns()
+        try:
+            yield
+        finally:
+            h.record(time.monotonic_ns() - t0)
+
+    def tick(self, deadline_ns: int, started_ns: int | None = None, skipped: int = 0) -> None:
+        """
+        Account one scheduled frame
+        Args:
+            deadline_ns: time.monotonic_ns() the frame was scheduled for
+            started_ns: When it actually started (default: now)
+            skipped: Scheduled ticks dropped before this one to catch up
+        """
+        late = (time.monotonic_ns() if started_ns is None else started_ns) - deadline_ns
+        if late > 0:
+            self.lateness.record(late)
+            if self.target_fps and late >= 1e9 / self.target_fps:
+                self.missed_deadlines += 1
+        else:
+            self.lateness.record(0)
+        self.skipped_ticks += skipped
+
+    def frame(self, n: int = 1) -> None:
+        """Count finished frames; publishes to live_path when it is due."""
+        self.frames += n
+        if self.live_path is not None:
+            now = time.monotonic_ns()
+            if now - self._last_publish_ns >= PUBLISH_S * 1e9:
+                self._last_publish_ns = now
+                self.publish(self.live_path)
+
+    def snapshot(self) -> dict:
+        elapsed = (time.monotonic_ns() - self.started_ns) / 1e9
+        return {
+            "name": self.name,
+            "elapsed_s": elapsed,
+            "frames": self.frames,
+            "effective_fps": self.frames / elapsed if elapsed > 0 else 0.0,
+            "target_fps": self.target_fps,
+            "missed_deadlines": self.missed_deadlines,
+            "skipped_ticks": self.skipped_ticks,
+            "lateness_ms": self.lateness.summary(),
+            "stages_ms": {name: h.summary() for name, h in list(self.stages.items())},
+        }
+
+    def publish(self, path: Path) -> None:
+        """Atomically replace `path` with the current snapshot, for readers in other processes."""
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(self.snapshot(), indent=2) + "\n", encoding="utf-8")
+        tmp.replace(path)
+
+    def dump(self, path: Path) -> dict:
+        """Write the final stats of the run as JSON; returns them."""
+        snap = self.snapshot()
+        path.write_text(json.dumps(snap, indent=2) + "\n", encoding="utf-8")
+        return snap
+
+    def reset(self) -> None:
+        for h in list(self.stages.values()):
+            h.reset()
+        self.lateness.reset()
+        self.frames = self.missed_deadlines = self.skipped_ticks = 0
+        self.started_ns = time.monotonic_ns()
+
+
+def live_path_for(name: str) -> Path:
+    """Default live stats file of a capture, e.g. /dev/shm/dsr_capture_stats_90.json for display :90."""
+    safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in name.lstrip(":"))
+    return LIVE_DIR / f"dsr_capture_stats_{safe}.json"
+
+
+def read_live(name: str) -> dict | None:
+    """The last published stats of a running capture, or None if it is not publishing."""
+    try:
+        return json.loads(live_path_for(name).read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def format_stats(snap: dict) -> str:
+    """Human-readable summary of a snapshot()."""
+    lines = [
+        f"{snap['name']}: {snap['frames']} frames in {snap['elapsed_s']:.1f}s = {snap['effective_fps']:.1f} FPS"
+        + (f" (target {snap['target_fps']:g})" if snap.get("target_fps") else "")
+        + f" | missed deadlines {snap['missed_deadlines']} | skipped ticks {snap['skipped_ticks']}",
+        f"  {'stage':<10} {'count':>7} {'mean ms':>8} {'p50':>8} {'p99':>8} {'p99.9':>8} {'max':>8}",
+    ]
+    rows = dict(snap["stages_ms"])
+    if snap["lateness_ms"].get("count"):
+        rows["late"] = snap["lateness_ms"]
+    for name, s in rows.items():
+        if not s.get("count"):
+            continue
+        lines.append(f"  {name:<10} {s['count']:>7d} {s['mean']:>8.3f} {s['p50']:>8.3f} {s['p99']:>8.3f} {s['p99.9']:>8.3f} {s['max']:>8.3f}")
+    return "\n".join(lines)
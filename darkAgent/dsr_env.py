@@ -0,0 +1,394 @@
+"""
+Vectorized Gym-style environment over the DSR instances in `/root/config/dsr_instances.json`.
+
+One worker process per instance owns that instance's X connection (input via InputState), FrameGrabber and memory
+reader. Observations, rewards, dones and the raw memory readings live in one shared-memory block that the workers
+write in place, so a step over N instances is one small message to and from each worker and no frame is ever pickled.
+
+Each step holds the chosen action (input_actions.ACTIONS index, -1 = nothing) for `step_s` seconds, then grabs the
+game window downscaled to `obs_size` and reads HP, deaths and boss HP. Rewards come from rewards.RewardTracker. An
+episode ends when the player dies or the boss HP reaches 0; the worker then resets on its own (gym VecEnv convention)
+and the returned observation is the first one of the next episode.
+
+backend="fake" replaces each instance with a fake_game.py process (real /proc memory reads, no X): frames are bars
+drawn from the memory values and actions have no effect. It needs no config file, for tests and benchmarks.
+
+Usage:
+    env = DSRVecEnv(obs_size=(160, 120))                 # Every configured instance
+    obs = env.reset()                                    # (N, H, W, 4) uint8 BGRA, in shared memory
+    obs, rewards, dones, infos = env.step(np.array([ACTION_INDEX["attack"]] * env.num_envs))
+    env.close()
+    Fake instances:
+        python3 /root/darkAgent/dsr_env.py --fake 4 --steps 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import time
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import metrics
+from instance_config import load_instances, resolve_instance
+from memory_tools import MemorySnapshot
+from rewards import DEFAULT_WEIGHTS, RewardTracker, RewardWeights
+
+OBS_SIZE = (160, 120)  # (width, height) of the observations
+STEP_S = 1.0 / 15  # How long each action is held before the next observation
+RESET_TIMEOUT_S = 30.0  # How long a reset waits for the player to be alive and readable
+START_METHOD = "spawn"  # Workers open their own X connections and /proc descriptors, so nothing is inherited
+MISSING = np.iinfo(np.int32).min  # Stored for memory values that could not be read
+MEM_FIELDS = ("hp", "hp_max", "deaths", "boss_hp")
+
+class _SharedArrays:
+    """The NumPy views of the env's shared-memory block; the same layout in the parent and every worker."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, n: int, obs_size: tuple[int, int]):
+        w, h = obs_size
+        self.shm = shm
+        off = 0
+
+        def take(shape: tuple[int, ...], dtype) -> np.ndarray:
+            nonlocal off
+            a = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=off)
+            off += -(-a.nbytes // 64) * 64  # Keep every array cache-line aligned
+            return a
+
+        self.obs = take((n, h, w, 4), np.uint8)
+        self.rewards = take((n,), np.float32)
+        self.dones = take((n,), np.bool_)
+        self.mem = take((n, len(MEM_FIELDS)), np.int32)  # Raw readings, MISSING when unreadable
+        self.t_ns = take((n,), np.int64)  # time.monotonic_ns() of each observation
+
+    @staticmethod
+    def nbytes(n: int, obs_size: tuple[int, int]) -> int:
+        w, h = obs_size
+        sizes = [n * h * w * 4, n * 4, n, n * len(MEM_FIELDS) * 4, n * 8]
+        return sum(-(-s // 64) * 64 for s in sizes)
+
+
+class _X11Backend:
+    """A real instance: inputs through XTEST, frames from its game window, memory from its game process."""
+
+    def __init__(self, name: str, obs_size: tuple[int, int]):
+        from frame_grabber import FrameGrabber
+        from input_state import InputState
+        from memory_tools import BatchReader, setup_memory_reader
+        from x11_input import X11Input
+
+        inst = resolve_instance(name)
+        self.x11 = X11Input(inst.display)
+        self.x11.focus_window_by_name(inst.desktop_name)
+        self.input = InputState(self.x11)
+        self.grabber = FrameGrabber(inst.display, capacity=2, window=inst.desktop_name, out_size=obs_size, backend=inst.capture_backend, fbdir=inst.fbdir)
+        pid, _, self.basex, self.baseb, self.boss = setup_memory_reader(name)
+        self.reader = BatchReader(pid)
+
+    def act(self, action: int) -> None:
+        self.input.apply(action if action >= 0 else None)
+
+    def observe(self, out: np.ndarray) -> MemorySnapshot:
+        from memory_tools import read_snapshot_batched
+
+        self.grabber.grab()
+        _, _, frame = self.grabber.latest()
+        np.copyto(out, frame)
+        return read_snapshot_batched(self.reader, self.basex, self.baseb, self.boss)
+
+    def reset(self) -> None:
+        self.input.apply(None)
+
+    def close(self) -> None:
+        self.input.close()
+        self.grabber.close()
+        self.reader.close()
+        self.x11.close()
+
+
+class _FakeBackend:
+    """A fake_game.py process per worker: real memory reads, frames drawn from the values, no input."""
+
+    def __init__(self, name: str, obs_size: tuple[int, int], seed: int, tick_hz: float = 240.0):
+        from fake_game import spawn_fake_game
+        from memory_tools import BatchReader, pointer_locations
+
+        self.proc = spawn_fake_game(wineprefix=f"/tmp/fake_prefix_{name}", tick_hz=tick_hz, seed=seed)
+        _, self.basex, self.baseb, self.boss = pointer_locations(self.proc.pid, scan_signatures=False)
+        self.reader = BatchReader(self.proc.pid)
+
+    def act(self, action: int) -> None:
+        pass
+
+    def observe(self, out: np.ndarray) -> MemorySnapshot:
+        from fake_game import BOSS_HP_MAX
+        from memory_tools import read_snapshot_batched
+
+        snap = read_snapshot_batched(self.reader, self.basex, self.baseb, self.boss)
+        h, w = out.shape[:2]
+        out[:] = 0
+        if snap.hp is not None and snap.hp_max:
+            out[: h // 8, : w * max(snap.hp, 0) // snap.hp_max, 2] = 255  # Player HP bar (red)
+        if snap.boss_hp is not None:
+            out[-h // 8:, : w * max(snap.boss_hp, 0) // BOSS_HP_MAX, 1] = 255  # Boss HP bar (green)
+        return snap
+
+    def reset(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.reader.close()
+        self.proc.terminate()
+        self.proc.wait()
+
+
+def _pack(snap: MemorySnapshot, row: np.ndarray) -> None:
+    for j, field in enumerate(MEM_FIELDS):
+        v = getattr(snap, field)
+        row[j] = MISSING if v is None else v
+
+
+def _reset(idx: int, backend, arrays: _SharedArrays) -> MemorySnapshot:
+    """Let go of all inputs and wait until the player is alive and readable; writes the first observation."""
+    backend.reset()
+    deadline = time.monotonic() + RESET_TIMEOUT_S
+    while True:
+        snap = backend.observe(arrays.obs[idx])
+        if (snap.hp is not None and snap.hp > 0) or time.monotonic() >= deadline:
+            break
+        time.sleep(0.1)  # Dead or loading; wait for the respawn
+    _pack(snap, arrays.mem[idx])
+    arrays.t_ns[idx] = snap.t_ns
+    return snap
+
+
+def _serve(idx: int, name: str, backend, arrays: _SharedArrays, step_s: float, weights: RewardWeights, conn) -> None:
+    m_steps = metrics.counter("dsr_env_steps_total", "Env steps", instance=name)
+    m_episodes = metrics.counter("dsr_env_episodes_total", "Episodes completed", instance=name)
+    m_observe = metrics.histogram("dsr_env_observe_seconds", "Frame grab + memory read per step", instance=name)
+    tracker = RewardTracker(1, weights)
+    mem, t_ns = arrays.mem[idx:idx + 1], arrays.t_ns[idx:idx + 1]  # This instance's rows, as (1, ...) views
+    episode_len = 0
+    while True:
+        cmd, arg = conn.recv()
+        if cmd == "step":
+            t_end = time.monotonic() + step_s
+            backend.act(int(arg))
+            if step_s > 0:
+                time.sleep(max(0.0, t_end - time.monotonic()))
+            t_obs = time.perf_counter()
+            snap = backend.observe(arrays.obs[idx])
+            m_observe.observe(time.perf_counter() - t_obs)
+            m_steps.inc()
+            _pack(snap, mem[0])
+            t_ns[0] = snap.t_ns
+            rewards, dones = tracker.update(mem, t_ns)
+            done = bool(dones[0])
+            episode_len += 1
+            info = {}
+            if done:
+                info = {"episode": {"r": float(tracker.returns[0]), "l": episode_len}, "terminal_mem": {f: getattr(snap, f) for f in MEM_FIELDS}}
+                episode_len = 0
+                m_episodes.inc()
+                _reset(idx, backend, arrays)  # obs and mem now hold the first observation of the next episode
+                tracker.reset(mem, t_ns)
+            arrays.rewards[idx] = rewards[0]
+            arrays.dones[idx] = done
+            conn.send(("ok", info))
+        elif cmd == "reset":
+            _reset(idx, backend, arrays)
+            tracker.reset(mem, t_ns)
+            episode_len = 0
+            conn.send(("ok", None))
+        elif cmd == "close":
+            return
+
+
+def _worker(idx: int, name: str, fake: bool, seed: int, shm_name: str, n: int, obs_size: tuple[int, int], step_s: float, weights: RewardWeights, conn) -> None:
+    # Spawned workers share the parent's resource tracker, which already tracks the block; no unregister here
+    shm = shared_memory.SharedMemory(name=shm_name)
+    arrays = _SharedArrays(shm, n, obs_size)
+    backend = None
+    try:
+        backend = _FakeBackend(name, obs_size, seed) if fake else _X11Backend(name, obs_size)
+        conn.send(("ready", None))
+        _serve(idx, name, backend, arrays, step_s, weights, conn)
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        if backend is not None:
+            backend.close()
+        del arrays
+        shm.close()
+        conn.close()
+
+
+@dataclass(frozen=True)
+class EnvSpec:
+    """Class for storing the static shape information of a DSRVecEnv."""
+    num_envs: int
+    obs_shape: tuple[int, int, int]  # (H, W, 4)
+    num_actions: int
+    instances: tuple[str, ...]
+
+
+class DSRVecEnv:
+    """
+    N instances stepped in lockstep by N worker processes through shared memory.
+
+    The arrays returned by reset()/step_wait() are views into shared memory and are overwritten by the next step;
+    copy them to keep them.
+    """
+
+    def __init__(self, instances: list[str] | None = None, obs_size: tuple[int, int] = OBS_SIZE, step_s: float = STEP_S, backend: str = "x11", num_fake: int = 2, seed: int = 0, weights: RewardWeights = DEFAULT_WEIGHTS):
+        """
+        Args:
+            instances: Instance names (default: every instance in the config); ignored for backend="fake"
+            obs_size: (width, height) of the observations
+            step_s: How long each action is held per step
+            backend: "x11" for the real instances, "fake" for fake_game.py stand-ins
+            num_fake: Number of fake instances for backend="fake"
+            seed: Seed of the fake games (worker i uses seed + i)
+            weights: Reward term weights (see rewards.py)
+        """
+        from input_actions import ACTION_NAMES
+
+        if backend not in ("x11", "fake"):
+            raise ValueError(f"Unknown backend '{backend}'. Supported: x11, fake")
+        fake = backend == "fake"
+        if fake:
+            names = [f"fake-{i}" for i in range(num_fake)]
+        else:
+            names = instances if instances else sorted(load_instances().keys())
+            for name in names:
+                resolve_instance(name)  # Fail fast on a bad name, before any worker starts
+        n = len(names)
+        self.spec = EnvSpec(num_envs=n, obs_shape=(obs_size[1], obs_size[0], 4), num_actions=len(ACTION_NAMES), instances=tuple(names))
+        self.num_envs = n
+        self._shm = shared_memory.SharedMemory(create=True, size=_SharedArrays.nbytes(n, obs_size))
+        self._arrays = _SharedArrays(self._shm, n, obs_size)
+        self._arrays.mem[:] = MISSING
+        ctx = mp.get_context(START_METHOD)
+        self._conns = []
+        self._procs = []
+        self._waiting = False
+        self._closed = False
+        for i, name in enumerate(names):
+            parent, child = ctx.Pipe()
+            p = ctx.Process(target=_worker, args=(i, name, fake, seed + i, self._shm.name, n, obs_size, step_s, weights, child), name=f"DSRVecEnv-{name}", daemon=True)
+            p.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(p)
+        try:
+            self._gather()  # "ready" from every worker
+        except Exception:
+            self.close()
+            raise
+
+    def _gather(self) -> list:
+        out = []
+        errors = []
+        for name, conn in zip(self.spec.instances, self._conns):
+            status, payload = conn.recv()
+            if status == "error":
+                errors.append(f"{name}: {payload}")
+            out.append(payload)
+        if errors:
+            raise RuntimeError("Env worker failed: " + "; ".join(errors))
+        return out
+
+    @property
+    def mem(self) -> np.ndarray:
+        """(N, 4) int32 readings of the last observation: hp, hp_max, deaths, boss_hp (MISSING when unreadable)."""
+        return self._arrays.mem
+
+    def reset(self) -> np.ndarray:
+        for conn in self._conns:
+            conn.send(("reset", None))
+        self._gather()
+        return self._arrays.obs
+
+    def step_async(self, actions) -> None:
+        """
+        Send one action per instance and return immediately
+        Args:
+            actions: (N,) action indices into input_actions.ACTIONS; -1 holds nothing
+        """
+        if self._waiting:
+            raise RuntimeError("step_async() called twice without step_wait()")
+        for conn, a in zip(self._conns, np.asarray(actions, dtype=np.int64).tolist()):
+            conn.send(("step", a))
+        self._waiting = True
+
+    def step_wait(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, list[dict]]:
+        """Wait for the step sent by step_async(); returns (obs, rewards, dones, infos)."""
+        if not self._waiting:
+            raise RuntimeError("step_wait() called without step_async()")
+        self._waiting = False
+        infos = self._gather()
+        a = self._arrays
+        return a.obs, a.rewards, a.dones, infos
+
+    def step(self, actions) -> tuple[np.ndarray, np.ndarray, np.ndarray, list[dict]]:
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for conn in self._conns:
+            try:
+                conn.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for p in self._procs:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        for conn in self._conns:
+            conn.close()
+        del self._arrays
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self) -> "DSRVecEnv":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Step the vectorized env with random actions and report its rate.")
+    p.add_argument("--instances", nargs="+", default=None, help="Instance names (default: all in the config).")
+    p.add_argument("--fake", type=int, default=0, metavar="N", help="Use N fake_game.py instances instead.")
+    p.add_argument("--steps", type=int, default=200, help="Steps to run (default: 200).")
+    p.add_argument("--step-s", type=float, default=None, help=f"Action hold per step (default: {STEP_S:.3f}; 0 with --fake).")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    step_s = args.step_s if args.step_s is not None else (0.0 if args.fake else STEP_S)
+    backend = "fake" if args.fake else "x11"
+    rng = np.random.default_rng(0)
+    with DSRVecEnv(args.instances, step_s=step_s, backend=backend, num_fake=args.fake or 2) as env:
+        env.reset()
+        episodes = []
+        t0 = time.perf_counter()
+        for _ in range(args.steps):
+            _, _, _, infos = env.step(rng.integers(0, env.spec.num_actions, env.num_envs))
+            episodes += [i["episode"] for i in infos if "episode" in i]
+        dt = time.perf_counter() - t0
+    print(f"{env.num_envs} envs x {args.steps} steps in {dt:.2f}s = {args.steps / dt:.1f} steps/s ({env.num_envs * args.steps / dt:.1f} env-steps/s)")
+    if episodes:
+        print(f"{len(episodes)} episodes, mean return {np.mean([e['r'] for e in episodes]):.2f}, mean length {np.mean([e['l'] for e in episodes]):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+"""
+Append-only episode store for recorded gameplay: frames, memory readings and actions, step by step.
+
+Layout under the store root (default `/root/episodes/`):
+    index.json                          Frame shape, chunk size, action names and per-episode step counts
+    ep_00000/c_00000/frames.npy         (chunk_steps, H, W, C) uint8
+    ep_00000/c_00000/t_ns.npy           int64 capture timestamps
+    ep_00000/c_00000/action.npy         int16 indices into input_actions.ACTIONS (-1 = no action)
+    ep_00000/c_00000/hp.npy ...         int32 hp, hp_max, deaths, boss_hp (MISSING when unreadable)
+
+Every chunk except the last of an episode holds exactly `chunk_steps` steps, so (episode, step) maps to a chunk file
+and row with one division. Chunks are plain .npy files opened with mmap_mode="r": random access touches only the
+pages it needs and streaming never loads a whole file. The writer only copies into an in-memory chunk buffer; full
+chunks are written and the index updated on a background thread.
+
+Usage:
+    List the episodes of a store:
+        python3 /root/darkAgent/episode_store.py info
+    Export an episode as a GIF:
+        python3 /root/darkAgent/episode_store.py gif 0 --out /root/captures/ep0.gif
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import queue
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from input_actions import ACTION_INDEX, ACTION_NAMES
+from memory_tools import MemorySnapshot
+
+STORE_ROOT = Path("/root/episodes")
+CHUNK_STEPS = 256  # Steps per chunk file
+BUFFERS = 3  # Chunk buffers preallocated per writer (one filling, the rest being written)
+LRU_CHUNKS = 8  # Memory-mapped chunks kept open per reader
+MISSING = np.iinfo(np.int32).min  # Stored for memory values that could not be read
+NO_ACTION = -1
+
+# Per-step columns besides the frames
+COLUMNS: dict[str, np.dtype] = {
+    "t_ns": np.dtype("<i8"),
+    "action": np.dtype("<i2"),
+    "hp": np.dtype("<i4"),
+    "hp_max": np.dtype("<i4"),
+    "deaths": np.dtype("<i4"),
+    "boss_hp": np.dtype("<i4"),
+}
+
+
+@dataclass(frozen=True)
+class Step:
+    """Class for storing one step of an episode. `frame` is a read-only view into the memory-mapped chunk."""
+    frame: np.ndarray
+    t_ns: int
+    action: str | None
+    hp: int | None
+    hp_max: int | None
+    deaths: int | None
+    boss_hp: int | None
+
+
+def _episode_dir(root: Path, episode: int) -> Path:
+    return root / f"ep_{episode:05d}"
+
+
+def _chunk_dir(root: Path, episode: int, chunk: int) -> Path:
+    return _episode_dir(root, episode) / f"c_{chunk:05d}"
+
+
+def _write_json(path: Path, data: dict) -> None:
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
+    tmp.replace(path)  # Readers never see a half-written index
+
+
+def _action_index(action: str | int | None) -> int:
+    if action is None:
+        return NO_ACTION
+    if isinstance(action, str):
+        if action not in ACTION_INDEX:
+            raise ValueError(f"Unknown action '{action}'. Available: {', '.join(ACTION_NAMES)}")
+        return ACTION_INDEX[action]
+    return int(action)
+
+
+def _or_missing(v: int | None) -> int:
+    return MISSING if v is None else v
+
+
+def _or_none(v: np.integer) -> int | None:
+    return None if v == MISSING else int(v)
+
+
+class _ChunkBuffer:
+    """One chunk's worth of preallocated frames and columns."""
+
+    def __init__(self, chunk_steps: int, frame_shape: tuple[int, ...]):
+        self.frames = np.empty((chunk_steps, *frame_shape), dtype=np.uint8)
+        self.columns = {name: np.empty(chunk_steps, dtype=dt) for name, dt in COLUMNS.items()}
+        self.n = 0
+        self.episode = 0
+        self.chunk = 0
+
+
+class EpisodeWriter:
+    """
+    Appends episodes to a store. append() copies the step into the current chunk buffer and returns; chunk files and
+    index.json are written by a background thread.
+
+    Memory is capped at `buffers` chunk buffers: if every one is still being written when a new chunk starts (the disk
+    is slower than capture), steps are dropped and counted in `dropped` until one is free, as the recorder drops frames.
+    """
+
+    def __init__(self, root: Path = STORE_ROOT, frame_shape: tuple[int, ...] | None = None, chunk_steps: int = CHUNK_STEPS, buffers: int = BUFFERS):
+        self.root = root
+        root.mkdir(parents=True, exist_ok=True)
+        index_path = root / "index.json"
+        if index_path.is_file():
+            self.index = json.loads(index_path.read_text(encoding="utf-8"))
+            if frame_shape is not None and tuple(frame_shape) != tuple(self.index["frame_shape"]):
+                raise RuntimeError(f"Store {root} holds frames of shape {tuple(self.index['frame_shape'])}, not {tuple(frame_shape)}")
+            if list(self.index["action_names"]) != list(ACTION_NAMES):
+                raise RuntimeError(f"Store {root} was written with a different action space")
+        else:
+            if frame_shape is None:
+                raise RuntimeError(f"frame_shape is required to create a new store in {root}")
+            self.index = {"version": 1, "frame_shape": list(frame_shape), "chunk_steps": chunk_steps, "action_names": list(ACTION_NAMES), "episodes": []}
+            _write_json(index_path, self.index)
+        self.frame_shape = tuple(self.index["frame_shape"])
+        self.chunk_steps = int(self.index["chunk_steps"])
+        self._index_lock = threading.Lock()  # index is updated by the writer thread and read by begin_episode()
+
+        self._free: queue.SimpleQueue[_ChunkBuffer] = queue.SimpleQueue()
+        for _ in range(buffers):
+            self._free.put(_ChunkBuffer(self.chunk_steps, self.frame_shape))
+        self._pending: queue.SimpleQueue[tuple[str, object] | None] = queue.SimpleQueue()
+        self._buf: _ChunkBuffer | None = None
+        self.episode: int | None = None
+        self.steps = 0  # Steps appended to the current episode
+        self.dropped = 0  # Steps not stored because every chunk buffer was still being written
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name="EpisodeWriter", daemon=True)
+        self._thread.start()
+
+    def begin_episode(self, meta: dict | None = None) -> int:
+        """
+        Start a new episode, ending the current one if any
+        Args:
+            meta: Optional JSON-serializable metadata stored with the episode (instance name, seed, ...)
+        Returns:
+            The episode number
+        """
+        if self.episode is not None:
+            self.end_episode()
+        with self._index_lock:
+            self.episode = len(self.index["episodes"])
+            self.index["episodes"].append({"steps": 0, "done": False, "meta": meta or {}})
+        self.steps = 0
+        self._pending.put(("index", None))
+        return self.episode
+
+    def append(self, frame: np.ndarray, action: str | int | None = None, snapshot: MemorySnapshot | None = None, t_ns: int | None = None) -> int:
+        """
+        Append one step to the current episode; never blocks on I/O, drops the step instead (see `dropped`)
+        Args:
+            frame: (H, W, C) uint8 frame of the store's frame shape
+            action: Action name, index into input_actions.ACTIONS, or None
+            snapshot: Memory readings for this step (None stores MISSING)
+            t_ns: Capture timestamp; defaults to the snapshot's
+        Returns:
+            The step number within the episode, or -1 if the step was dropped
+        """
+        if self._error is not None:
+            raise RuntimeError(f"Episode writer failed: {self._error}") from self._error
+        if self.episode is None:
+            self.begin_episode()
+        buf = self._buf
+        if buf is None:
+            try:
+                buf = self._free.get_nowait()
+            except queue.Empty:
+                self.dropped += 1
+                return -1
+            buf.n, buf.episode, buf.chunk = 0, self.episode, self.steps // self.chunk_steps
+            self._buf = buf
+
+        i = buf.n
+        np.copyto(buf.frames[i], frame)
+        cols = buf.columns
+        cols["action"][i] = _action_index(action)
+        if snapshot is not None:
+            cols["t_ns"][i] = snapshot.t_ns if t_ns is None else t_ns
+            cols["hp"][i] = _or_missing(snapshot.hp)
+            cols["hp_max"][i] = _or_missing(snapshot.hp_max)
+            cols["deaths"][i] = _or_missing(snapshot.deaths)
+            cols["boss_hp"][i] = _or_missing(snapshot.boss_hp)
+        else:
+            cols["t_ns"][i] = 0 if t_ns is None else t_ns
+            for name in ("hp", "hp_max", "deaths", "boss_hp"):
+                cols[name][i] = MISSING
+        buf.n += 1
+        step = self.steps
+        self.steps += 1
+        if buf.n == self.chunk_steps:
+            self._pending.put(("chunk", buf))
+            self._buf = None
+        return step
+
+    def end_episode(self) -> None:
+        """Flush the partial chunk of the current episode and mark it done."""
+        if self.episode is None:
+            return
+        if self._buf is not None and self._buf.n:
+            self._pending.put(("chunk", self._buf))
+        self._buf = None
+        self._pending.put(("end", self.episode))
+        self.episode = None
+
+    def _run(self) -> None:
+        index_path = self.root / "index.json"
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            kind, arg = item
+            try:
+                if kind == "chunk":
+                    buf = arg
+                    d = _chunk_dir(self.root, buf.episode, buf.chunk)
+                    d.mkdir(parents=True, exist_ok=True)
+                    np.save(d / "frames.npy", buf.frames[:buf.n])
+                    for name, col in buf.columns.items():
+                        np.save(d / f"{name}.npy", col[:buf.n])
+                    with self._index_lock:
+                        ep = self.index["episodes"][buf.episode]
+                        ep["steps"] = buf.chunk * self.chunk_steps + buf.n
+                        data = json.loads(json.dumps(self.index))  # Snapshot under the lock, write outside it
+                    self._free.put(buf)
+                elif kind == "end":
+                    with self._index_lock:
+                        self.index["episodes"][arg]["done"] = True
+                        data = json.loads(json.dumps(self.index))
+                else:
+                    with self._index_lock:
+                        data = json.loads(json.dumps(self.index))
+                _write_json(index_path, data)
+            except BaseException as e:
+                self._error = e
+
+    def close(self) -> None:
+        """End the current episode and wait until everything is on disk."""
+        self.end_episode()
+        self._pending.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise RuntimeError(f"Episode writer failed: {self._error}") from self._error
+
+    def __enter__(self) -> "EpisodeWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class EpisodeStore:
+    """
+    Read access to a store. Chunks are memory-mapped on first use and a few are kept open (LRU).
+
+    The index is read once; call refresh() to see episodes a live writer has added since.
+    """
+
+    def __init__(self, root: Path = STORE_ROOT, lru_chunks: int = LRU_CHUNKS):
+        self.root = root
+        self.lru_chunks = lru_chunks
+        self._open: dict[tuple[int, int], dict[str, np.ndarray]] = {}
+        self.refresh()
+
+    def refresh(self) -> None:
+        index_path = self.root / "index.json"
+        if not index_path.is_file():
+            raise RuntimeError(f"No episode store in {self.root}")
+        self.index = json.loads(index_path.read_text(encoding="utf-8"))
+        self.frame_shape = tuple(self.index["frame_shape"])
+        self.chunk_steps = int(self.index["chunk_steps"])
+        self.action_names = tuple(self.index["action_names"])
+
+    def __len__(self) -> int:
+        return len(self.index["episodes"])
+
+    def steps(self, episode: int) -> int:
+        return int(self.index["episodes"][episode]["steps"])
+
+    def meta(self, episode: int) -> dict:
+        return self.index["episodes"][episode]["meta"]
+
+    def _chunk(self, episode: int, chunk: int) -> dict[str, np.ndarray]:
+        key = (episode, chunk)
+        arrays = self._open.pop(key, None)
+        if arrays is None:
+            d = _chunk_dir(self.root, episode, chunk)
+            arrays = {name: np.load(d / f"{name}.npy", mmap_mode="r") for name in ("frames", *COLUMNS)}
+            if len(self._open) >= self.lru_chunks:
+                del self._open[next(iter(self._open))]  # Oldest first; dicts keep insertion order
+        self._open[key] = arrays  # Re-inserted as the most recent
+        return arrays
+
+    def _locate(self, episode: int, step: int) -> tuple[int, int]:
+        n = self.steps(episode)
+        if step < 0:
+            step += n
+        if not 0 <= step < n:
+            raise IndexError(f"Step {step} out of range for episode {episode} ({n} steps)")
+        return divmod(step, self.chunk_steps)
+
+    def step(self, episode: int, step: int) -> Step:
+        """
+        Random access to one step
+        Args:
+            episode: Episode number
+            step: Step within the episode (negative counts from the end)
+        Returns:
+            The step; its frame is a view into the memory-mapped chunk
+        """
+        chunk, row = self._locate(episode, step)
+        a = self._chunk(episode, chunk)
+        action = int(a["action"][row])
+        return Step(
+            frame=a["frames"][row],
+            t_ns=int(a["t_ns"][row]),
+            action=self.action_names[action] if action != NO_ACTION else None,
+            hp=_or_none(a["hp"][row]),
+            hp_max=_or_none(a["hp_max"][row]),
+            deaths=_or_none(a["deaths"][row]),
+            boss_hp=_or_none(a["boss_hp"][row]),
+        )
+
+    def iter_chunks(self, episode: int) -> Iterator[dict[str, np.ndarray]]:
+        """Stream an episode chunk by chunk, as dicts of memory-mapped arrays ("frames" plus the COLUMNS)."""
+        n = self.steps(episode)
+        for chunk in range((n + self.chunk_steps - 1) // self.chunk_steps):
+            yield self._chunk(episode, chunk)
+
+    def iter_frames(self, episode: int) -> Iterator[np.ndarray]:
+        for arrays in self.iter_chunks(episode):
+            yield from arrays["frames"]
+
+    def column(self, episode: int, name: str) -> np.ndarray:
+        """One per-step column of a whole episode (small: a few bytes per step)."""
+        if name not in COLUMNS:
+            raise ValueError(f"Unknown column '{name}'. Available: {', '.join(COLUMNS)}")
+        parts = [arrays[name] for arrays in self.iter_chunks(episode)]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=COLUMNS[name])
+
+    def close(self) -> None:
+        self._open.clear()
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Inspect an episode store.")
+    p.add_argument("--root", type=Path, default=STORE_ROOT, help=f"Store root (default: {STORE_ROOT}).")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("info", help="List the episodes.")
+    g = sub.add_parser("gif", help="Export one episode as a GIF (streamed, one frame in memory at a time).")
+    g.add_argument("episode", type=int)
+    g.add_argument("--out", type=Path, required=True)
+    g.add_argument("--fps", type=float, default=24.0)
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    store = EpisodeStore(args.root)
+    if args.cmd == "info":
+        print(f"{args.root}: {len(store)} episodes, frames {store.frame_shape}, {store.chunk_steps} steps/chunk")
+        for ep in range(len(store)):
+            info = store.index["episodes"][ep]
+            deaths = store.column(ep, "deaths") if info["steps"] else np.empty(0, dtype=np.int32)
+            valid = deaths[deaths != MISSING]
+            died = int(valid.max() - valid.min()) if valid.size else 0
+            print(f"  ep {ep:5d}: {info['steps']:7d} steps{'' if info['done'] else ' (open)'} | deaths +{died} | {info['meta']}")
+    else:
+        from recorder import write_gif
+
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        n = write_gif(store.iter_frames(args.episode), args.out, args.fps)
+        print(f"Wrote: {args.out} ({n} frames)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Stand-in for DarkSoulsRemastered.exe, for testing and benchmarking the memory tools without Wine.
+
+The process maps a sparse file named like the game module (so it shows up in /proc/<pid>/maps), lays out the pointer
+chains from memory_offsets.py in an anonymous "heap" mapping, plants the AOB signatures so aob_scanner resolves the
+same RVAs, and mutates HP, deaths and boss HP on a fixed schedule. Its command line contains the module name, so
+find_game_pid() picks it up like the real game; set WINEPREFIX in its environment to emulate an instance.
+
+Usage:
+    Run a stand-in until Ctrl+C:
+        python3 /root/darkAgent/fake_game.py
+    From Python:
+        proc = spawn_fake_game(wineprefix="/opt/prefix_dsr-1")
+"""
+
+from __future__ import annotations
+
+import argparse
+import ctypes
+import mmap
+import os
+import random
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from memory_offsets import ASYLUM_DEMON_OFFSETS, BASEB_AOB, BASEB_PTRLOC_RVA, BASEX_AOB, BASEX_PTRLOC_RVA, BOSS_BASE_AOB, BOSS_BASE_PTRLOC_RVA, OFF_DEATH_NUM, OFF_HP, OFF_STRUCT_PTR
+from memory_tools import PROC_SUBSTR
+
+MODULE_SIZE = 0x1D00000  # Covers the highest RVA in memory_offsets.py
+HEAP_SIZE = 0x10000
+TICK_HZ = 60.0
+SIGNATURE_RVA = 0x1000  # Where the AOB signatures are planted inside the fake module
+PLAYER_HP_MAX = 500
+BOSS_HP_MAX = 3000
+
+# Layout of the fake heap (offsets inside the heap mapping)
+HEAP_BASEX = 0x0000  # Object pointed to by BaseX; holds the player struct pointer at OFF_STRUCT_PTR
+HEAP_PLAYER = 0x1000  # Player struct with HP/max HP at OFF_HP/OFF_HPMAX
+HEAP_GAME_DATA = 0x2000  # Object pointed to by BaseB; holds the death count at OFF_DEATH_NUM
+HEAP_BOSS_CHAIN = 0x3000  # Start of the boss pointer chain, one page per link
+
+
+def _address_of(mm: mmap.mmap) -> int:
+    return ctypes.addressof(ctypes.c_char.from_buffer(mm))
+
+
+def _plant_signature(module: mmap.mmap, at: int, aob: tuple[str, int, int] | None, target_rva: int) -> int:
+    """Write the signature bytes at `at` with its rel32 pointing at target_rva; returns the next free offset."""
+    if aob is None:
+        return at
+    pattern, disp_offset, instr_len = aob
+    module[at:at + len(pattern.split())] = bytes(0 if t in ("?", "??") else int(t, 16) for t in pattern.split())
+    struct.pack_into("<i", module, at + disp_offset, target_rva - (at + instr_len))
+    return at + len(pattern.split()) + 0x10
+
+
+class FakeGame:
+    """
+    The fake module and heap, with helpers to mutate the values read by memory_tools.
+    """
+
+    def __init__(self, module_dir: Path, module_name: str = PROC_SUBSTR, seed: int = 0):
+        self.module_path = module_dir / module_name
+        with open(self.module_path, "wb") as f:
+            f.truncate(MODULE_SIZE)  # Sparse: no disk space used for the untouched pages
+        self._module_file = open(self.module_path, "r+b")
+        self.module = mmap.mmap(self._module_file.fileno(), MODULE_SIZE)
+        self.heap = mmap.mmap(-1, HEAP_SIZE)
+        self.base = _address_of(self.module)
+        self.heap_addr = _address_of(self.heap)
+        self.rng = random.Random(seed)
+        self.boss_present = True
+
+        # MZ header so the cache key hashes something stable
+        self.module[0:2] = b"MZ"
+        at = _plant_signature(self.module, SIGNATURE_RVA, BASEX_AOB, BASEX_PTRLOC_RVA)
+        at = _plant_signature(self.module, at, BASEB_AOB, BASEB_PTRLOC_RVA)
+        _plant_signature(self.module, at, BOSS_BASE_AOB, BOSS_BASE_PTRLOC_RVA)
+
+        # Static pointers in the module
+        struct.pack_into("<Q", self.module, BASEX_PTRLOC_RVA, self.heap_addr + HEAP_BASEX)
+        struct.pack_into("<Q", self.module, BASEB_PTRLOC_RVA, self.heap_addr + HEAP_GAME_DATA)
+        struct.pack_into("<Q", self.module, BOSS_BASE_PTRLOC_RVA, self.heap_addr + HEAP_BOSS_CHAIN)
+
+        # BaseX -> player struct
+        struct.pack_into("<Q", self.heap, HEAP_BASEX + OFF_STRUCT_PTR, self.heap_addr + HEAP_PLAYER)
+        self.set_player(PLAYER_HP_MAX, PLAYER_HP_MAX)
+        self.set_deaths(0)
+        self._link_boss_chain()
+        self.set_boss_hp(BOSS_HP_MAX)
+
+    def _boss_link(self, i: int) -> int:
+        return HEAP_BOSS_CHAIN + i * 0x1000
+
+    def _link_boss_chain(self) -> None:
+        # Each link i holds a pointer to link i+1 at ASYLUM_DEMON_OFFSETS[i]; the last link holds the HP
+        for i, off in enumerate(ASYLUM_DEMON_OFFSETS[:-1]):
+            struct.pack_into("<Q", self.heap, self._boss_link(i) + off, self.heap_addr + self._boss_link(i + 1))
+        self.boss_present = True
+
+    def set_player(self, hp: int, hp_max: int) -> None:
+        struct.pack_into("<ii", self.heap, HEAP_PLAYER + OFF_HP, hp, hp_max)
+
+    def player(self) -> tuple[int, int]:
+        return struct.unpack_from("<ii", self.heap, HEAP_PLAYER + OFF_HP)
+
+    def set_deaths(self, deaths: int) -> None:
+        struct.pack_into("<i", self.heap, HEAP_GAME_DATA + OFF_DEATH_NUM, deaths)
+
+    def deaths(self) -> int:
+        return struct.unpack_from("<i", self.heap, HEAP_GAME_DATA + OFF_DEATH_NUM)[0]
+
+    def set_boss_hp(self, hp: int) -> None:
+        last = self._boss_link(len(ASYLUM_DEMON_OFFSETS) - 1)
+        struct.pack_into("<i", self.heap, last + ASYLUM_DEMON_OFFSETS[-1], hp)
+
+    def boss_hp(self) -> int:
+        last = self._boss_link(len(ASYLUM_DEMON_OFFSETS) - 1)
+        return struct.unpack_from("<i", self.heap, last + ASYLUM_DEMON_OFFSETS[-1])[0]
+
+    def set_boss_present(self, present: bool) -> None:
+        """Null or restore the middle link of the boss chain, like a boss being unloaded/loaded."""
+        if present:
+            self._link_boss_chain()
+        else:
+            struct.pack_into("<Q", self.heap, self._boss_link(1) + ASYLUM_DEMON_OFFSETS[1], 0)
+            self.boss_present = False
+
+    def step(self) -> None:
+        """Advance the schedule by one tick: trade hits with the boss, heal now and then, die and respawn."""
+        hp, hp_max = self.player()
+        if not self.boss_present:
+            if self.rng.random() < 0.1:  # Respawned and walked back into the arena
+                self.set_boss_hp(BOSS_HP_MAX)
+                self.set_boss_present(True)
+            return
+        r = self.rng.random()
+        if r < 0.05:
+            hp -= self.rng.randint(20, 120)
+        elif r < 0.10:
+            self.set_boss_hp(max(0, self.boss_hp() - self.rng.randint(50, 200)))
+        elif r < 0.11:
+            hp = min(hp_max, hp + 200)
+        if hp <= 0:
+            self.set_deaths(self.deaths() + 1)
+            self.set_boss_present(False)
+            hp = hp_max
+        self.set_player(hp, hp_max)
+        if self.boss_hp() == 0:
+            self.set_boss_present(False)
+
+    def close(self) -> None:
+        self.module.close()
+        self.heap.close()
+        self._module_file.close()
+
+
+def spawn_fake_game(wineprefix: str | None = None, tick_hz: float = TICK_HZ, seed: int = 0) -> subprocess.Popen:
+    """
+    Start a stand-in process and wait until its memory is laid out
+    Args:
+        wineprefix: If provided, set as WINEPREFIX in the child's environment so instance lookups match it
+        tick_hz: Mutation rate of the schedule (0 keeps the values static)
+        seed: Seed of the schedule
+    Returns:
+        The running process; terminate() it when done
+    """
+    env = os.environ.copy()
+    if wineprefix is not None:
+        env["WINEPREFIX"] = wineprefix
+    # The module name on the command line is what find_game_pid() matches
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--module", PROC_SUBSTR, "--hz", str(tick_hz), "--seed", str(seed)]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline() if proc.stdout else ""
+    if not line.startswith("READY"):
+        proc.kill()
+        raise RuntimeError(f"Fake game failed to start: {line!r}")
+    return proc
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=f"Fake {PROC_SUBSTR} process for memory tool tests and benchmarks.")
+    p.add_argument("--module", default=PROC_SUBSTR, help=f"File name of the fake module (default: {PROC_SUBSTR}).")
+    p.add_argument("--hz", type=float, default=TICK_HZ, help=f"Mutation rate (default: {TICK_HZ:g}; 0 = static values).")
+    p.add_argument("--seed", type=int, default=0, help="Seed of the mutation schedule.")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # Clean up the module file on terminate()
+    with tempfile.TemporaryDirectory(prefix="fake_dsr_") as tmp:
+        game = FakeGame(Path(tmp), module_name=args.module, seed=args.seed)
+        print(f"READY pid={os.getpid()} base=0x{game.base:X} module={game.module_path}", flush=True)
+        try:
+            while True:
+                if args.hz > 0:
+                    game.step()
+                    time.sleep(1.0 / args.hz)
+                else:
+                    time.sleep(3600)
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            game.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""
+Continuous frame grabber for an instance display, for agents that pull frames in-process.
+
+A persistent mss grabber (XShm-backed on Linux) is kept per display, and every grab is copied once into a
+preallocated NumPy ring buffer of `capacity` frames together with its capture timestamp and sequence number.
+`latest()` and `get(seq)` return views into the ring, so no memory is allocated per frame.
+
+For Xvfb displays started with -fbdir, backend="xwd" reads the memory-mapped framebuffer file instead of issuing X
+requests (see xwd_capture.py); everything else works the same.
+
+Instead of the full virtual screen, the grabber can capture only the game window's client rectangle (or a sub-region
+of it, such as the HUD-free play area) and downscale it to the policy resolution while copying into the ring.
+
+Usage:
+    with FrameGrabber(":90", capacity=8) as grabber:
+        grabber.start(fps=60)
+        seq, t_ns, frame = grabber.latest()   # frame: (H, W, 4) uint8 BGRA view
+    Game window only, cropped and downscaled:
+        FrameGrabber(":90", window="DSR_1", region=(0, 40, 800, 520), out_size=(160, 104))
+    Headless instance, straight from the Xvfb framebuffer file:
+        FrameGrabber(":90", backend="xwd", fbdir="/tmp/xvfb_fb_90")
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+import metrics
+from capture_stats import CaptureStats
+from tracing import traced
+
+CAPACITY = 8  # Frames kept in the ring buffer
+BACKENDS = ("mss", "xwd")
+
+
+def parse_region(s: str) -> tuple[int, int, int, int]:
+    """Parse "x,y,w,h" into a region tuple."""
+    parts = [int(p) for p in s.split(",")]
+    if len(parts) != 4 or parts[2] <= 0 or parts[3] <= 0:
+        raise ValueError(f"Region must be x,y,w,h with positive w/h, got '{s}'")
+    return parts[0], parts[1], parts[2], parts[3]
+
+
+def parse_size(s: str) -> tuple[int, int]:
+    """Parse "WxH" into a (width, height) tuple."""
+    w, _, h = s.lower().partition("x")
+    if not (w.isdigit() and h.isdigit()) or int(w) <= 0 or int(h) <= 0:
+        raise ValueError(f"Size must be WxH, got '{s}'")
+    return int(w), int(h)
+
+
+class Resampler:
+    """
+    Nearest-neighbour downscale from (src_h, src_w) to (out_h, out_w), written straight into the destination.
+
+    Integer factors use strided views, so the crop, the downscale and the copy into the ring are a single pass.
+    """
+
+    def __init__(self, src_h: int, src_w: int, out_h: int, out_w: int, channels: int = 4):
+        self.src_shape = (src_h, src_w)
+        self._slices = None
+        if src_h % out_h == 0 and src_w % out_w == 0:
+            self._slices = (slice(None, None, src_h // out_h), slice(None, None, src_w // out_w))
+        else:
+            self._rows = (np.arange(out_h) * src_h) // out_h
+            self._cols = (np.arange(out_w) * src_w) // out_w
+            self._tmp = np.empty((out_h, src_w, channels), dtype=np.uint8)
+
+    @traced("Resampler", "capture")
+    def __call__(self, src: np.ndarray, out: np.ndarray) -> None:
+        if self._slices is not None:
+            np.copyto(out, src[self._slices])
+        else:
+            np.take(src, self._rows, axis=0, out=self._tmp)
+            np.take(self._tmp, self._cols, axis=1, out=out)
+
+
+class GameWindow:
+    """
+    Locates a window by title on a display and tracks its client rectangle (root coordinates) through the
+    connection's WindowRegistry, so the per-frame cost is a non-blocking check of the event queue.
+    """
+
+    def __init__(self, display: str, name: str):
+        from x11_input import X11Input
+
+        self.x11 = X11Input(display)
+        self.name = name
+        self.window_id: int | None = None
+
+    def geometry(self) -> tuple[int, int, int, int]:
+        """Return the cached (x, y, width, height) of the window, refreshed after it moves, resizes or is replaced."""
+        registry = self.x11.windows
+        geom = registry.geometry(self.window_id) if self.window_id is not None else None
+        if geom is None:  # First call, or the window was destroyed (e.g. the game restarted)
+            self.window_id = registry.find(self.name)
+            if self.window_id is None:
+                raise RuntimeError(f"Window '{self.name}' not found on display {self.x11.display_str}")
+            geom = registry.geometry(self.window_id)
+            if geom is None:
+                raise RuntimeError(f"Window '{self.name}' disappeared on display {self.x11.display_str}")
+        return geom
+
+    def close(self) -> None:
+        self.x11.close()
+
+
+@dataclass(frozen=True)
+class GrabStats:
+    """Class for storing the grabber throughput since start()."""
+    frames: int
+    fps: float
+    grab_ms_mean: float
+    grab_ms_max: float
+
+
+class FrameGrabber:
+    """
+    Ring-buffered frame grabber for one X display.
+
+    The mss handle is bound to the thread that first grabs, so either call grab() from one thread or use
+    start()/stop() to grab on the background thread. Frames are BGRA, as delivered by the X server.
+    """
+
+    def __init__(self, display: str, capacity: int = CAPACITY, monitor: dict | None = None, window: str | None = None, region: tuple[int, int, int, int] | None = None, out_size: tuple[int, int] | None = None, backend: str = "mss", fbdir: str | None = None, timing: CaptureStats | None = None):
+        """
+        Args:
+            display: The X display, e.g. ":90"
+            capacity: Frames kept in the ring buffer
+            monitor: mss monitor dict to grab (default: the full virtual screen); ignored when `window` is set
+            window: Title of the window to grab (e.g. the instance desktop name); only its client rectangle is grabbed
+            region: (x, y, w, h) sub-region to grab, relative to the window (or to the monitor without a window)
+            out_size: (width, height) to downscale each frame to while copying into the ring
+            backend: "mss" (X requests over XShm) or "xwd" (the memory-mapped Xvfb framebuffer in `fbdir`)
+            fbdir: The -fbdir directory of the display's Xvfb; required for backend="xwd"
+            timing: Stats to record the grab/convert stages into (default: a new CaptureStats, see `timing`)
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown capture backend '{backend}'. Supported: {', '.join(BACKENDS)}")
+        if backend == "xwd" and not fbdir:
+            raise ValueError("backend='xwd' needs the Xvfb -fbdir directory")
+        self.display = display
+        self.backend = backend
+        self.fbdir = fbdir
+        self.capacity = capacity
+        self._monitor = monitor
+        self._window_name = window
+        self._window: GameWindow | None = None
+        self.region = region
+        self.out_size = out_size
+        self._rect: tuple[int, int, int, int] | None = None  # Grabbed rectangle in root coordinates
+        self._resampler: Resampler | None = None
+        self._sct = None
+        self._fb = None  # XwdFramebuffer for backend="xwd"
+        self._owner: int | None = None
+        self.frames: np.ndarray | None = None  # (capacity, H, W, 4) uint8, allocated on the first grab
+        self.t_ns = np.zeros(capacity, dtype=np.int64)  # time.monotonic_ns() at the start of each grab
+        self.seqs = np.full(capacity, -1, dtype=np.int64)  # Sequence number stored in each slot (-1 = empty)
+        self.seq = -1  # Sequence number of the newest frame
+        self._grab_ns_total = 0
+        self._grab_ns_max = 0
+        self._started_ns = 0
+        self._frames_since_start = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._new_frame = threading.Condition()
+        self.error: BaseException | None = None  # Set if the background thread died
+        self._m_frames: metrics.Counter | None = None  # Registered on open, so merely constructing stays side-effect free
+        self._m_grab: metrics.Histogram | None = None
+        self.timing = timing if timing is not None else CaptureStats(name=display)  # Per-stage histograms and deadlines
+
+    def _open(self) -> None:
+        if self.backend == "xwd":
+            from xwd_capture import XwdFramebuffer
+
+            self._fb = XwdFramebuffer.for_fbdir(self.fbdir)
+            full = {"left": 0, "top": 0, "width": self._fb.width, "height": self._fb.height}
+        else:
+            from mss import mss
+
+            self._sct = mss(display=self.display)
+            full = dict(self._sct.monitors[0])  # full virtual screen
+        self._owner = threading.get_ident()
+        self._m_frames = metrics.counter("dsr_capture_frames_total", "Frames grabbed", display=self.display)
+        self._m_grab = metrics.histogram("dsr_capture_grab_seconds", "Grab + convert time per frame", display=self.display)
+        if not self._started_ns:
+            self._started_ns = time.monotonic_ns()
+        if self._window_name is not None:
+            self._window = GameWindow(self.display, self._window_name)
+        elif self._monitor is None:
+            self._monitor = full
+        self._update_rect()
+
+    def _update_rect(self) -> None:
+        """Recompute the grabbed rectangle; reallocate the ring or the resampler only if its size changed."""
+        if self._window is not None:
+            x, y, w, h = self._window.geometry()
+        else:
+            x, y, w, h = int(self._monitor["left"]), int(self._monitor["top"]), int(self._monitor["width"]), int(self._monitor["height"])
+        if self.region is not None:
+            rx, ry, rw, rh = self.region
+            x, y, w, h = x + rx, y + ry, min(rw, w - rx), min(rh, h - ry)
+        if w <= 0 or h <= 0:
+            raise RuntimeError(f"Capture region {self.region} lies outside the {w}x{h} source")
+        rect = (x, y, w, h)
+        if rect == self._rect:
+            return
+        old = self._rect
+        self._rect = rect
+        self._grab_monitor = {"left": x, "top": y, "width": w, "height": h}
+        if old is not None and old[2:] == rect[2:]:
+            return  # Moved but same size
+        if self.out_size is not None:
+            out_w, out_h = self.out_size
+            self._resampler = Resampler(h, w, out_h, out_w)
+        else:
+            out_w, out_h = w, h
+        if self.frames is None or self.frames.shape[1:3] != (out_h, out_w):
+            self.seqs[:] = -1  # The frames of the old ring are gone; get()/latest() must not hand out the zeros
+            self.frames = np.zeros((self.capacity, out_h, out_w, 4), dtype=np.uint8)
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        if self.frames is None:
+            raise RuntimeError("No frame grabbed yet")
+        return self.frames.shape[1:]
+
+    @traced("FrameGrabber.grab", "capture")
+    def grab(self) -> int:
+        """
+        Grab one frame into the next ring slot
+        Returns:
+            The sequence number of the new frame
+        """
+        if self._owner is None:
+            self._open()
+        elif self._owner != threading.get_ident():
+            raise RuntimeError("FrameGrabber.grab() must be called from the thread that opened the display")
+
+        t0 = time.monotonic_ns()
+        if self._window is not None:
+            self._update_rect()  # Cached until the window reports a ConfigureNotify
+        if self._fb is not None:
+            x, y, w, h = self._rect
+            src = self._fb.view[y:y + h, x:x + w]  # View of the live framebuffer; the copy below is the only read
+        else:
+            shot = self._sct.grab(self._grab_monitor)
+            src = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        t1 = time.monotonic_ns()
+        seq = self.seq + 1
+        slot = seq % self.capacity
+        self.seqs[slot] = -1  # Mark the slot as being written for concurrent get()
+        if self._resampler is not None:
+            self._resampler(src, self.frames[slot])
+        else:
+            np.copyto(self.frames[slot], src)
+        self.t_ns[slot] = t0
+        self.seqs[slot] = seq
+        t2 = time.monotonic_ns()
+        self.timing.record("grab", t1 - t0)
+        self.timing.record("convert", t2 - t1)
+        self.timing.frame()
+        dt = t2 - t0
+        self._m_frames.inc()
+        self._m_grab.observe(dt / 1e9)
+        self._grab_ns_total += dt
+        self._grab_ns_max = max(self._grab_ns_max, dt)
+        self._frames_since_start += 1
+        with self._new_frame:
+            self.seq = seq
+            self._new_frame.notify_all()
+        return seq
+
+    def latest(self) -> tuple[int, int, np.ndarray] | None:
+        """
+        Returns:
+            (seq, t_ns, frame view) of the newest frame, or None before the first grab (and after a resize dropped it).
+            The view stays valid until `capacity - 1` more frames are grabbed.
+        """
+        seq = self.seq
+        if seq < 0:
+            return None
+        slot = seq % self.capacity
+        if self.seqs[slot] != seq:
+            return None
+        return seq, int(self.t_ns[slot]), self.frames[slot]
+
+    def get(self, seq: int) -> tuple[int, np.ndarray] | None:
+        """
+        Returns:
+            (t_ns, frame view) of frame `seq`, or None if it was not grabbed yet or was already overwritten
+        """
+        slot = seq % self.capacity
+        if self.frames is None or self.seqs[slot] != seq:
+            return None
+        return int(self.t_ns[slot]), self.frames[slot]
+
+    def wait(self, after_seq: int, timeout: float | None = None) -> int:
+        """Block until a frame newer than `after_seq` is available; returns the newest sequence number."""
+        with self._new_frame:
+            self._new_frame.wait_for(lambda: self.seq > after_seq or self.error is not None, timeout=timeout)
+            return self.seq
+
+    def _run(self, fps: float | None) -> None:
+        interval_ns = int(1e9 / fps) if fps else 0
+        next_t = time.monotonic_ns()
+        skipped = 0
+        try:
+            while not self._stop.is_set():
+                if interval_ns:
+                    self.timing.tick(next_t, skipped=skipped)
+                self.grab()
+                if interval_ns:
+                    next_t += interval_ns
+                    sleep_ns = next_t - time.monotonic_ns()
+                    skipped = 0
+                    if sleep_ns > 0:
+                        self._stop.wait(sleep_ns / 1e9)
+                    elif -sleep_ns >= interval_ns:
+                        skipped = -sleep_ns // interval_ns  # Fell behind by whole ticks; skip them
+                        next_t += skipped * interval_ns
+        except Exception as e:
+            self.error = e
+            with self._new_frame:
+                self._new_frame.notify_all()  # Wake wait() callers so they can notice
+        finally:
+            self._close_sct()
+
+    def start(self, fps: float | None = None) -> "FrameGrabber":
+        """Grab continuously on a background thread, at `fps` or as fast as possible if None."""
+        if self._thread is None:
+            if self._owner is not None:
+                raise RuntimeError("start() can't be used after grabbing from another thread")
+            self._stop.clear()
+            self.error = None
+            self._started_ns = time.monotonic_ns()
+            self._frames_since_start = self._grab_ns_total = self._grab_ns_max = 0
+            self.timing.reset()
+            self.timing.target_fps = fps
+            self._thread = threading.Thread(target=self._run, args=(fps,), name=f"FrameGrabber{self.display}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> GrabStats:
+        n = self._frames_since_start
+        elapsed = (time.monotonic_ns() - self._started_ns) / 1e9 if self._started_ns else 0.0
+        return GrabStats(frames=n, fps=n / elapsed if elapsed > 0 else 0.0, grab_ms_mean=self._grab_ns_total / n / 1e6 if n else 0.0, grab_ms_max=self._grab_ns_max / 1e6)
+
+    def _close_sct(self) -> None:
+        if self._window is not None:
+            self._window.close()
+            self._window = None
+        if self._sct is not None:
+            try:
+                self._sct.close()
+            except Exception:
+                pass
+            self._sct = None
+        if self._fb is not None:
+            self._fb.close()
+            self._fb = None
+        self._owner = None
+
+    def close(self) -> None:
+        self.stop()
+        if self._owner == threading.get_ident():
+            self._close_sct()
+
+    def __enter__(self) -> "FrameGrabber":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
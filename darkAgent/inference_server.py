@@ -0,0 +1,404 @@
+"""
+Batched SCOPE inference for many instance workers: one server process owns every policy and answers the workers'
+requests in batches.
+
+Each client (one per instance worker) has a slot in a shared-memory block: it writes its preprocessed frame into
+the slot and sends a small message over its pipe; the server gathers pending requests until every connected client
+is waiting, max_batch is reached or the oldest request has waited max_wait_us, then runs the DCT of the whole batch as
+two matmuls against cached DCT bases (SCOPE.dct_topk), and the sparsification and projections of every policy in the
+batch as one stacked matmul (SCOPE.project with per-sample weights). Logits go back into the slots.
+
+Policies are registered by the clients (ES workers each evaluate their own chromosome); requests are batched across
+policies as long as they share k and p.
+
+The server reports batch sizes, queue latency (request sent to batch start) and compute time per batch through
+stats() and the metrics registry (metrics.py).
+
+Usage:
+    server = InferenceServer(frame_shape=(96, 128), max_clients=8).start()
+    client = server.client(0)                       # Picklable; hand it to a worker process,
+    ctx.Process(target=worker, args=(client,)).start()
+    server.handed_off(0)                            # then drop this process's end of its pipe
+    ...in the worker:
+        client.set_policy(chromosome, k=16, p=50, output_size=len(ACTION_NAMES))
+        logits = client.infer(gray_frame)
+    server.stop()
+    Benchmark with simulated workers:
+        python3 /root/darkAgent/inference_server.py --clients 8 --requests 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection, wait
+
+import numpy as np
+
+from capture_stats import LatencyHistogram
+
+MAX_BATCH = 64
+MAX_WAIT_US = 500  # How long the oldest request may wait for others to join its batch
+MAX_OUTPUTS = 64  # Logits per slot
+START_METHOD = "spawn"
+
+
+class _Slots:
+    """Views of the shared block: one request frame and one logits row per client."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, max_clients: int, frame_shape: tuple[int, int]):
+        h, w = frame_shape
+        self.frames = np.ndarray((max_clients, h, w), dtype=np.float32, buffer=shm.buf)
+        self.logits = np.ndarray((max_clients, MAX_OUTPUTS), dtype=np.float32, buffer=shm.buf, offset=self.frames.nbytes)
+
+    @staticmethod
+    def nbytes(max_clients: int, frame_shape: tuple[int, int]) -> int:
+        h, w = frame_shape
+        return max_clients * (h * w + MAX_OUTPUTS) * 4
+
+
+class InferenceClient:
+    """One worker's handle on the server. Not thread-safe: one request at a time."""
+
+    def __init__(self, index: int, conn: Connection, shm_name: str, max_clients: int, frame_shape: tuple[int, int]):
+        self.index = index
+        self.conn = conn
+        self.shm_name = shm_name
+        self.max_clients = max_clients
+        self.frame_shape = frame_shape
+        self.policy_id: int | None = None
+        self.output_size = 0
+        self._shm: shared_memory.SharedMemory | None = None
+        self._slots: _Slots | None = None
+
+    def __getstate__(self) -> dict:
+        state = dict(self.__dict__)
+        state["_shm"] = state["_slots"] = None  # Attached again in the receiving process
+        return state
+
+    def _attach(self) -> _Slots:
+        if self._slots is None:
+            # Spawned processes share the creator's resource tracker, which already tracks the block
+            self._shm = shared_memory.SharedMemory(name=self.shm_name)
+            self._slots = _Slots(self._shm, self.max_clients, self.frame_shape)
+        return self._slots
+
+    def _call(self, msg: tuple):
+        self.conn.send(msg)
+        status, payload = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Inference server: {payload}")
+        return payload
+
+    def set_policy(self, chromosome, k: int, p: int, output_size: int) -> int:
+        """
+        Register the policy this client's requests run through (replaces the previous one)
+        Returns:
+            The server's id of the policy
+        """
+        if output_size > MAX_OUTPUTS:
+            raise ValueError(f"At most {MAX_OUTPUTS} outputs are supported, got {output_size}")
+        self.policy_id = self._call(("policy", np.asarray(chromosome, dtype=np.float64), k, p, output_size))
+        self.output_size = output_size
+        return self.policy_id
+
+    def infer(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Logits of the registered policy for one preprocessed (H, W) frame
+        Returns:
+            A (output_size,) copy of the logits
+        """
+        if self.policy_id is None:
+            raise RuntimeError("set_policy() must be called before infer()")
+        slots = self._attach()
+        np.copyto(slots.frames[self.index], frame, casting="same_kind")
+        self._call(("infer", self.policy_id, time.monotonic_ns()))
+        return slots.logits[self.index, : self.output_size].copy()
+
+    def stats(self) -> dict:
+        return self._call(("stats",))
+
+    def close(self) -> None:
+        try:
+            self.conn.send(("close",))
+        except (BrokenPipeError, OSError):
+            pass
+        self.conn.close()
+        if self._shm is not None:
+            del self._slots
+            self._slots = None
+            self._shm.close()
+
+
+class _Policy:
+    __slots__ = ("k", "p", "output_size", "w1", "w2", "bias")
+
+    def __init__(self, chromosome: np.ndarray, k: int, p: int, output_size: int, frame_shape: tuple[int, int]):
+        from SCOPE import compute_chromosome_size
+
+        if not 1 <= k <= min(frame_shape):
+            raise ValueError(f"k must be in [1, {min(frame_shape)}] for {frame_shape[0]}x{frame_shape[1]} frames, got {k}")
+        if not 0 <= p <= 100:
+            raise ValueError(f"p must be a percentile in [0, 100], got {p}")
+        if len(chromosome) != compute_chromosome_size(k, output_size):
+            raise ValueError(f"Chromosome has {len(chromosome)} values, expected {compute_chromosome_size(k, output_size)}")
+        self.k, self.p, self.output_size = k, p, output_size
+        self.w1 = chromosome[:k].reshape(1, k)
+        self.w2 = chromosome[k:k + k * output_size].reshape(k, output_size)
+        self.bias = chromosome[k + k * output_size:].reshape(1, output_size)
+
+
+class _Server:
+    """The loop running in the server process."""
+
+    def __init__(self, conns: list[Connection], shm_name: str, max_clients: int, frame_shape: tuple[int, int], max_batch: int, max_wait_us: int):
+        import metrics
+
+        self.shm = shared_memory.SharedMemory(name=shm_name)
+        self.slots = _Slots(self.shm, max_clients, frame_shape)
+        self.conns = {c: i for i, c in enumerate(conns)}
+        self.max_batch = max_batch
+        self.max_wait_ns = max_wait_us * 1000
+        self.policies: dict[int, _Policy] = {}
+        self.client_policy: dict[int, int] = {}
+        self._next_policy = 0
+        self.pending: dict[int, tuple[int, int]] = {}  # Client index -> (policy id, request t_ns)
+        self.batch_sizes = LatencyHistogram()  # Values are request counts, not ns
+        self.queue_ns = LatencyHistogram()
+        self.compute_ns = LatencyHistogram()
+        self.requests = 0
+        self.m_batches = metrics.counter("dsr_inference_batches_total", "Batches run")
+        self.m_requests = metrics.counter("dsr_inference_requests_total", "Requests answered")
+        self.m_batch = metrics.histogram("dsr_inference_batch_size", "Requests per batch", buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+        self.m_queue = metrics.histogram("dsr_inference_queue_seconds", "Request sent to batch start")
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batch_sizes.count,
+            "policies": len(self.policies),
+            "batch_size": self.batch_sizes.summary(scale=1),
+            "queue_ms": self.queue_ns.summary(),
+            "compute_ms": self.compute_ns.summary(),
+        }
+
+    def _handle(self, conn: Connection, msg: tuple) -> None:
+        i = self.conns[conn]
+        cmd = msg[0]
+        if cmd == "infer":
+            if msg[1] not in self.policies:
+                conn.send(("error", f"Unknown policy id {msg[1]}"))
+                return
+            self.pending[i] = (msg[1], msg[2])
+        elif cmd == "policy":
+            try:
+                policy = _Policy(*msg[1:], frame_shape=self.slots.frames.shape[1:])
+            except ValueError as e:
+                conn.send(("error", str(e)))
+                return
+            old = self.client_policy.get(i)
+            if old is not None:
+                del self.policies[old]
+            pid = self._next_policy
+            self._next_policy += 1
+            self.policies[pid] = policy
+            self.client_policy[i] = pid
+            conn.send(("ok", pid))
+        elif cmd == "stats":
+            conn.send(("ok", self.stats()))
+        elif cmd == "close":
+            del self.conns[conn]
+            conn.close()
+            self.pending.pop(i, None)
+            pid = self.client_policy.pop(i, None)
+            if pid is not None:
+                del self.policies[pid]
+
+    def _run_batch(self) -> None:
+        from SCOPE import dct_topk, project
+
+        t0 = time.monotonic_ns()
+        batch = sorted(self.pending.items())
+        self.pending = {}
+        for _, (_, t_req) in batch:
+            self.queue_ns.record(t0 - t_req)
+            self.m_queue.observe((t0 - t_req) / 1e9)
+        failed: dict[int, str] = {}  # Client index -> error, for groups whose compute raised
+        groups: dict[tuple[int, int], list[tuple[int, _Policy]]] = {}
+        for i, (pid, _) in batch:
+            pol = self.policies[pid]
+            groups.setdefault((pol.k, pol.p), []).append((i, pol))
+        for (k, p), members in groups.items():
+            try:
+                idx = np.fromiter((i for i, _ in members), dtype=np.intp, count=len(members))
+                coeffs = dct_topk(self.slots.frames[idx], k)  # One pair of matmuls for the whole group
+                pols = [pol for _, pol in members]
+                if all(pol is pols[0] for pol in pols):
+                    w1, w2, bias = pols[0].w1, pols[0].w2, pols[0].bias
+                    logits = project(coeffs, p, w1, w2, bias)
+                    self.slots.logits[idx, : logits.shape[1]] = logits
+                else:
+                    out = max(pol.output_size for pol in pols)
+                    w1 = np.stack([pol.w1 for pol in pols])
+                    w2 = np.zeros((len(pols), k, out))
+                    bias = np.zeros((len(pols), 1, out))
+                    for j, pol in enumerate(pols):
+                        w2[j, :, : pol.output_size] = pol.w2
+                        bias[j, :, : pol.output_size] = pol.bias
+                    self.slots.logits[idx, :out] = project(coeffs, p, w1, w2, bias)
+            except Exception as e:  # One bad group must not take the server, or the other clients, down with it
+                for i, _ in members:
+                    failed[i] = f"Inference failed: {type(e).__name__}: {e}"
+        self.compute_ns.record(time.monotonic_ns() - t0)
+        self.batch_sizes.record(len(batch))
+        self.requests += len(batch)
+        self.m_batches.inc()
+        self.m_requests.inc(len(batch))
+        self.m_batch.observe(len(batch))
+        by_index = {i: c for c, i in self.conns.items()}
+        for i, _ in batch:
+            conn = by_index.get(i)
+            if conn is not None:
+                conn.send(("error", failed[i]) if i in failed else ("ok", None))
+
+    def run(self) -> None:
+        first_ns = 0
+        while self.conns:
+            timeout = None
+            if self.pending:
+                timeout = max(0.0, (first_ns + self.max_wait_ns - time.monotonic_ns()) / 1e9)
+            for conn in wait(list(self.conns), timeout):
+                try:
+                    msg = conn.recv()
+                except EOFError:
+                    msg = ("close",)  # The client process went away
+                had_pending = bool(self.pending)
+                self._handle(conn, msg)
+                if self.pending and not had_pending:
+                    first_ns = self.pending[next(iter(self.pending))][1]
+            if not self.pending:
+                continue
+            everyone = len(self.pending) >= len(self.client_policy)  # Every client with a policy is waiting
+            if everyone or len(self.pending) >= self.max_batch or time.monotonic_ns() >= first_ns + self.max_wait_ns:
+                self._run_batch()
+
+    def close(self) -> None:
+        del self.slots
+        self.shm.close()
+
+
+def _server_main(conns: list[Connection], shm_name: str, max_clients: int, frame_shape: tuple[int, int], max_batch: int, max_wait_us: int) -> None:
+    server = _Server(conns, shm_name, max_clients, frame_shape, max_batch, max_wait_us)
+    try:
+        server.run()
+    finally:
+        server.close()
+
+
+class InferenceServer:
+    """
+    Owner of the shared block and of the server process. Create it in the trainer, hand client(i) to worker i.
+    """
+
+    def __init__(self, frame_shape: tuple[int, int], max_clients: int, max_batch: int = MAX_BATCH, max_wait_us: int = MAX_WAIT_US):
+        """
+        Args:
+            frame_shape: (H, W) of the preprocessed frames
+            max_clients: Number of client slots
+            max_batch: Upper bound of requests per batch
+            max_wait_us: How long the oldest pending request may wait for a fuller batch
+        """
+        self.frame_shape = tuple(frame_shape)
+        self.max_clients = max_clients
+        self.max_batch = max_batch
+        self.max_wait_us = max_wait_us
+        self.shm = shared_memory.SharedMemory(create=True, size=_Slots.nbytes(max_clients, self.frame_shape))
+        ctx = mp.get_context(START_METHOD)
+        pairs = [ctx.Pipe() for _ in range(max_clients)]
+        self._server_conns = [s for s, _ in pairs]
+        self._clients = [InferenceClient(i, c, self.shm.name, max_clients, self.frame_shape) for i, (_, c) in enumerate(pairs)]
+        self._proc = ctx.Process(target=_server_main, args=(self._server_conns, self.shm.name, max_clients, self.frame_shape, max_batch, max_wait_us), name="InferenceServer", daemon=True)
+
+    def start(self) -> "InferenceServer":
+        self._proc.start()
+        for conn in self._server_conns:
+            conn.close()  # Owned by the server process now
+        return self
+
+    def client(self, index: int) -> InferenceClient:
+        return self._clients[index]
+
+    def handed_off(self, index: int) -> None:
+        """
+        Close this process's copy of client(index)'s pipe once the worker process it was given to has started, so
+        the server sees the pipe close when that worker dies without calling close()
+        """
+        self._clients[index].conn.close()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Close every client handle still held here and wait for the server to exit."""
+        for c in self._clients:
+            if not c.conn.closed:
+                c.close()
+        self._proc.join(timeout)
+        if self._proc.is_alive():
+            self._proc.terminate()
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self) -> "InferenceServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+
+def _bench_worker(client: InferenceClient, requests: int, k: int, p: int, output_size: int, seed: int) -> None:
+    from SCOPE import compute_chromosome_size
+
+    rng = np.random.default_rng(seed)
+    client.set_policy(rng.standard_normal(compute_chromosome_size(k, output_size)), k, p, output_size)
+    frame = rng.random(client.frame_shape, dtype=np.float32)
+    for _ in range(requests):
+        client.infer(frame)
+    client.close()
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Benchmark the batched inference server with simulated workers.")
+    p.add_argument("--clients", type=int, default=8, help="Worker processes (default: 8).")
+    p.add_argument("--requests", type=int, default=1000, help="Requests per worker (default: 1000).")
+    p.add_argument("--size", default="128x96", help="Preprocessed frame size WxH (default: 128x96).")
+    p.add_argument("--k", type=int, default=16, help="SCOPE DCT block size (default: 16).")
+    p.add_argument("--p", type=int, default=50, help="SCOPE sparsification percentile (default: 50).")
+    p.add_argument("--max-wait-us", type=int, default=MAX_WAIT_US, help=f"Batching deadline (default: {MAX_WAIT_US}).")
+    return p.parse_args()
+
+
+def main() -> None:
+    from frame_grabber import parse_size
+    from input_actions import ACTION_NAMES
+
+    args = parse_args()
+    w, h = parse_size(args.size)
+    ctx = mp.get_context(START_METHOD)
+    with InferenceServer((h, w), args.clients + 1, max_wait_us=args.max_wait_us) as server:  # The last slot reads the stats
+        t0 = time.perf_counter()
+        workers = [ctx.Process(target=_bench_worker, args=(server.client(i), args.requests, args.k, args.p, len(ACTION_NAMES), i)) for i in range(args.clients)]
+        for i, wp in enumerate(workers):
+            wp.start()
+            server.handed_off(i)
+        for wp in workers:
+            wp.join()
+        dt = time.perf_counter() - t0
+        stats = server.client(args.clients).stats()
+    total = args.clients * args.requests
+    print(f"{args.clients} clients x {args.requests} requests in {dt:.2f}s = {total / dt:.0f} inferences/s")
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
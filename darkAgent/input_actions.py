@@ -15,6 +15,10 @@ KEY_SPACE = "space"
 KEY_SHIFT = "Shift_L"
 KEY_HEAL = "r"
 
+# Keys that may stay down from one action to the next (continuous movement); any other input is re-pressed so the
+# game sees a new press for every roll, attack, heal, ...
+MOVEMENT_KEYS: Tuple[str, ...] = (KEY_W, KEY_A, KEY_S, KEY_D)
+
 # Mouse action
 MouseAction = Literal["left_click", "right_click"]
 
@@ -48,6 +52,58 @@ ACTIONS: Dict[str, ActionSpec] = {
 }
 
 
+ACTION_NAMES: Tuple[str, ...] = tuple(ACTIONS)  # Index order of the actions (used by recorded episodes and policies)
+ACTION_INDEX: Dict[str, int] = {name: i for i, name in enumerate(ACTION_NAMES)}
+
+MOUSE_BUTTONS: Dict[str, int] = {"left_click": 1, "right_click": 3}  # X11 button numbers
+
+
 def get_action(name: str) -> ActionSpec | None:
     return ACTIONS.get(name)
 
+
+@dataclass(frozen=True)
+class CompiledAction:
+    """Class for storing an action resolved to one display's keycodes and mouse buttons."""
+    name: str
+    index: int
+    keycodes: Tuple[int, ...]  # Pressed in order, released in reverse
+    buttons: Tuple[int, ...]  # Pressed after the keys, released before them
+
+
+class ActionTable:
+    """
+    ACTIONS resolved once per display, so executing an action is only integers handed to XTEST.
+
+    Usage:
+        table = ActionTable(x11)
+        a = table["roll_fwd"]            # or table[9]
+        x11.press_codes(a.keycodes, a.buttons)
+        x11.release_codes(a.keycodes, a.buttons)
+    """
+
+    def __init__(self, x11, actions: Dict[str, ActionSpec] = ACTIONS):
+        """
+        Args:
+            x11: An X11Input (anything with keycode(key) -> int)
+            actions: The action space to compile (default: ACTIONS)
+        """
+        compiled = []
+        for i, (name, spec) in enumerate(actions.items()):
+            keycodes = tuple(x11.keycode(k) for k in spec.keys)
+            buttons = (MOUSE_BUTTONS[spec.mouse],) if spec.mouse else ()
+            compiled.append(CompiledAction(name=name, index=i, keycodes=keycodes, buttons=buttons))
+        self.by_index: Tuple[CompiledAction, ...] = tuple(compiled)
+        self.by_name: Dict[str, CompiledAction] = {a.name: a for a in compiled}
+
+    def __getitem__(self, key: str | int) -> CompiledAction:
+        if isinstance(key, str):
+            return self.by_name[key]
+        return self.by_index[key]
+
+    def __len__(self) -> int:
+        return len(self.by_index)
+
+    def __iter__(self):
+        return iter(self.by_index)
+
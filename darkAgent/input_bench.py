@@ -0,0 +1,220 @@
+"""
+Latency benchmark for X11Input: time from issuing an action to the X server delivering its events.
+
+A second X connection maps a private input-only window over the whole screen, gives it the keyboard focus and
+timestamps the key and button events delivered to it, so the measured latency covers the injecting client, the server
+and event delivery. The window also keeps the injected events away from whatever runs on the display (e.g. the game
+of a live instance); the previous focus is restored at the end. Three ways of sending a roll
+(w + space down, then up) and an attack (left button) are compared:
+    per_event_sync   hold_key()/release_key()/hold_left(): one round-trip per event (the pre-batching path)
+    batched_sync     press()/release(sync=True): one write and one round-trip per half of the action
+    batched_flush    press()/release(): one write per half, no round-trip
+
+Runs against an existing display, or starts a private Xvfb stand-in with --xvfb.
+
+Usage:
+    python3 /root/darkAgent/input_bench.py --xvfb --iters 500
+    python3 /root/darkAgent/input_bench.py --display :90 --json /root/captures/input_bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from Xlib import X, display as xdisplay
+
+from capture_bench import XVFB_DISPLAY_NUM, start_xvfb
+from x11_input import X11Input
+
+ROLL_KEYS = ("w", "space")
+ATTACK_BUTTONS = (1,)
+WAIT_S = 2.0  # Give up on an iteration if its events do not arrive within this time
+
+
+class EventListener:
+    """
+    Timestamps every key/button event delivered to a private full-screen InputOnly window, on its own connection and
+    thread. The window is override-redirect (no window manager involved) and stacked on top, so it receives the
+    buttons wherever the pointer is, and it holds the keyboard focus until close().
+    """
+
+    def __init__(self, display_str: str):
+        self.disp = xdisplay.Display(display_str)
+        screen = self.disp.screen()
+        focus = self.disp.get_input_focus()
+        self._saved_focus = (focus.focus, focus.revert_to)  # Given back by close(), e.g. to the game window
+        self.window = screen.root.create_window(
+            0, 0, screen.width_in_pixels, screen.height_in_pixels, 0, 0, X.InputOnly, X.CopyFromParent,
+            override_redirect=True, event_mask=X.KeyPressMask | X.KeyReleaseMask | X.ButtonPressMask | X.ButtonReleaseMask,
+        )
+        self.window.map()
+        self.disp.sync()  # Mapped (viewable) before it can take the focus
+        self.window.set_input_focus(X.RevertToParent, X.CurrentTime)
+        self.disp.sync()
+        self.events: queue.SimpleQueue[tuple[int, int]] = queue.SimpleQueue()  # (event type, perf_counter_ns)
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="EventListener", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            while not self._stop:
+                ev = self.disp.next_event()  # Blocks until the server delivers something
+                self.events.put((ev.type, time.perf_counter_ns()))
+        except Exception:
+            pass  # Connection closed by close()
+
+    def wait_for(self, n: int) -> int | None:
+        """Wait for n more events; returns the arrival time of the last one, or None on timeout."""
+        t = None
+        for _ in range(n):
+            try:
+                _, t = self.events.get(timeout=WAIT_S)
+            except queue.Empty:
+                return None
+        return t
+
+    def drain(self) -> None:
+        while True:
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                return
+
+    def close(self) -> None:
+        self._stop = True
+        try:
+            self.disp.set_input_focus(*self._saved_focus, X.CurrentTime)
+        except Exception:
+            pass  # The previously focused window is gone
+        try:
+            self.window.destroy()
+            self.disp.sync()
+        except Exception:
+            pass
+        try:
+            self.disp.close()
+        except Exception:
+            pass
+
+
+def _per_event_sync(x11: X11Input, keys: tuple[str, ...], buttons: tuple[int, ...], down: bool) -> None:
+    if down:
+        for k in keys:
+            x11.hold_key(k)
+        if buttons:
+            x11.hold_left()
+    else:
+        if buttons:
+            x11.release_left()
+        for k in reversed(keys):
+            x11.release_key(k)
+
+
+def _batched(sync: bool) -> Callable[[X11Input, tuple[str, ...], tuple[int, ...], bool], None]:
+    def send(x11: X11Input, keys: tuple[str, ...], buttons: tuple[int, ...], down: bool) -> None:
+        if down:
+            x11.press(keys, buttons, sync=sync)
+        else:
+            x11.release(keys, buttons, sync=sync)
+    return send
+
+
+MODES = {
+    "per_event_sync": _per_event_sync,
+    "batched_sync": _batched(True),
+    "batched_flush": _batched(False),
+}
+
+
+def bench_mode(x11: X11Input, listener: EventListener, send, keys: tuple[str, ...], buttons: tuple[int, ...], iters: int) -> dict[str, float]:
+    """
+    Send each half of the action `iters` times
+    Returns:
+        p50/p99 of the time the send call took (issue) and until the last event arrived (delivered), in microseconds
+    """
+    n = len(keys) + len(buttons)
+    issue, delivered = [], []
+    timeouts = 0
+    listener.drain()
+    for i in range(iters * 2):
+        down = i % 2 == 0
+        t0 = time.perf_counter_ns()
+        send(x11, keys, buttons, down)
+        t1 = time.perf_counter_ns()
+        t_last = listener.wait_for(n)
+        if t_last is None:
+            timeouts += 1
+            listener.drain()
+            continue
+        issue.append(t1 - t0)
+        delivered.append(t_last - t0)
+    a, d = np.asarray(issue, dtype=np.int64), np.asarray(delivered, dtype=np.int64)
+    return {
+        "samples": int(a.size),
+        "timeouts": timeouts,
+        "issue_p50_us": float(np.percentile(a, 50)) / 1e3 if a.size else 0.0,
+        "issue_p99_us": float(np.percentile(a, 99)) / 1e3 if a.size else 0.0,
+        "delivered_p50_us": float(np.percentile(d, 50)) / 1e3 if d.size else 0.0,
+        "delivered_p99_us": float(np.percentile(d, 99)) / 1e3 if d.size else 0.0,
+    }
+
+
+def run_benchmarks(display: str, iters: int) -> dict[str, dict[str, float]]:
+    listener = EventListener(display)
+    try:
+        with X11Input(display) as x11:
+            results = {}
+            for action, keys, buttons in (("roll", ROLL_KEYS, ()), ("attack", (), ATTACK_BUTTONS)):
+                for mode, send in MODES.items():
+                    results[f"{action}/{mode}"] = bench_mode(x11, listener, send, keys, buttons, iters)
+            return results
+    finally:
+        listener.close()
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Benchmark X11Input action latency.")
+    src = p.add_mutually_exclusive_group()
+    src.add_argument("--display", default=None, help="X11 DISPLAY to inject into (default: $DISPLAY).")
+    src.add_argument("--xvfb", action="store_true", help="Start a private Xvfb as the stand-in display.")
+    p.add_argument("--iters", type=int, default=300, help="Actions per mode (default: 300).")
+    p.add_argument("--json", type=Path, default=None, help="Also write the results to this JSON file.")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    xvfb = None
+    if args.xvfb:
+        xvfb = start_xvfb()
+        display = f":{XVFB_DISPLAY_NUM}"
+    else:
+        display = args.display or os.environ.get("DISPLAY", ":99")
+    try:
+        results = run_benchmarks(display, args.iters)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+
+    print(f"display {display}")
+    print(f"{'action/mode':<22} {'issue p50':>10} {'issue p99':>10} {'deliv p50':>10} {'deliv p99':>10} {'timeouts':>9}  (us)")
+    for name, r in results.items():
+        print(f"{name:<22} {r['issue_p50_us']:>10.1f} {r['issue_p99_us']:>10.1f} {r['delivered_p50_us']:>10.1f} {r['delivered_p99_us']:>10.1f} {r['timeouts']:>9d}")
+    if args.json is not None:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print("Wrote:", args.json)
+
+
+if __name__ == "__main__":
+    main()
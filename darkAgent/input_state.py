@@ -0,0 +1,111 @@
+"""
+Held-input state machine on top of X11Input: tracks which keys and buttons are down and, for each next action, sends
+only the transitions from the current state.
+
+An action is "held until the next one": apply("move_fwd") twice sends one press of w; apply("roll_fwd") after it
+keeps w down and only presses space. Movement keys (input_actions.MOVEMENT_KEYS) carry over between actions; any
+other input that both actions use is released and pressed again, because the game reacts to the press edge (two
+rolls in a row need two presses of space). apply(None) lets go of everything.
+
+Everything still held is released on close(), on leaving the `with` block (also on errors) and at interpreter exit.
+
+Usage:
+    with X11Input(":90") as x11, InputState(x11) as state:
+        state.apply("move_fwd")
+        state.apply("roll_fwd")    # space down; w stays down
+        state.apply(None)          # all up
+"""
+
+from __future__ import annotations
+
+import atexit
+import time
+
+import metrics
+
+from input_actions import MOVEMENT_KEYS, MOUSE_BUTTONS, ActionSpec, ActionTable, CompiledAction
+from x11_input import X11Input
+
+
+class InputState:
+    """
+    Current keys/buttons down on one display and the minimal events to reach the next action. Not thread-safe;
+    use it from the thread that drives the agent.
+    """
+
+    def __init__(self, x11: X11Input, table: ActionTable | None = None, hold_keys: tuple[str, ...] = MOVEMENT_KEYS):
+        """
+        Args:
+            x11: The connection to inject on
+            table: Compiled actions for x11's display (default: compiled from input_actions.ACTIONS)
+            hold_keys: Keys that stay down across consecutive actions instead of being re-pressed
+        """
+        self.x11 = x11
+        self.table = table if table is not None else ActionTable(x11)
+        self.hold_codes = frozenset(x11.keycode(k) for k in hold_keys)
+        self.keys: list[int] = []  # Keycodes down, in press order
+        self.buttons: list[int] = []
+        self.events_sent = 0
+        self.events_naive = 0  # What a full press-all/release-all cycle per action would have sent
+        self._m_events = metrics.counter("dsr_input_events_total", "Input events sent", display=x11.display_str)
+        self._m_apply = metrics.histogram("dsr_input_apply_seconds", "Time to send an action's transitions", display=x11.display_str)
+        atexit.register(self.release_all)
+
+    def _resolve(self, action: str | int | CompiledAction | ActionSpec | None) -> tuple[tuple[int, ...], tuple[int, ...]]:
+        if action is None:
+            return (), ()
+        if isinstance(action, ActionSpec):
+            return tuple(self.x11.keycode(k) for k in action.keys), ((MOUSE_BUTTONS[action.mouse],) if action.mouse else ())
+        a = action if isinstance(action, CompiledAction) else self.table[action]
+        return a.keycodes, a.buttons
+
+    def apply(self, action: str | int | CompiledAction | ActionSpec | None, *, sync: bool = False) -> int:
+        """
+        Move from the current input state to `action`, sending releases before presses in one batch
+        Args:
+            action: Action name, index, CompiledAction or ActionSpec; None releases everything
+            sync: Wait until the server processed the events
+        Returns:
+            The number of events sent
+        """
+        keys, buttons = self._resolve(action)
+        self.events_naive += 2 * (len(keys) + len(buttons))
+        # Held inputs to let go of: anything the next action does not use, plus shared non-movement inputs (re-pressed)
+        up_keys = [kc for kc in self.keys if kc not in keys or kc not in self.hold_codes]
+        up_buttons = list(self.buttons)
+        kept = [kc for kc in self.keys if kc not in up_keys]
+        down_keys = [kc for kc in keys if kc not in kept]
+        n = len(up_keys) + len(up_buttons) + len(down_keys) + len(buttons)
+        if n:
+            t0 = time.perf_counter()
+            self.x11.queue_codes(up_keys, up_buttons, False)
+            self.x11.queue_codes(down_keys, buttons, True)
+            self.x11.flush(sync)
+            self._m_apply.observe(time.perf_counter() - t0)
+            self._m_events.inc(n)
+        self.keys = kept + down_keys
+        self.buttons = list(buttons)
+        self.events_sent += n
+        return n
+
+    def release_all(self, sync: bool = True) -> None:
+        """Release every key and button still down."""
+        if not (self.keys or self.buttons):
+            return
+        try:
+            self.x11.release_codes(self.keys, self.buttons, sync=sync)
+        finally:
+            self.events_sent += len(self.keys) + len(self.buttons)
+            self.keys, self.buttons = [], []
+
+    def close(self) -> None:
+        try:
+            self.release_all()
+        finally:
+            atexit.unregister(self.release_all)
+
+    def __enter__(self) -> "InputState":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -72,28 +72,14 @@ def _execute_action(x11: X11Input, a: MenuAction, hold_s: float) -> None:
     """
     Legacy semantics: hold all relevant inputs DOWN, sleep hold_s, then release.
     """
-    if a.mouse == "right_click":
-        # Modifiers (e.g. Shift) held while mouse button is held.
-        for k in a.keys:
-            x11.hold_key(k)
+    if a.mouse in ("left_click", "right_click"):
+        # Modifiers (e.g. Shift) held while mouse button is held; each half goes out as one batch.
+        button = 1 if a.mouse == "left_click" else 3
+        x11.press(a.keys, (button,))
         try:
-            x11.hold_right()
             time.sleep(hold_s)
-            x11.release_right()
         finally:
-            for k in reversed(list(a.keys)):
-                x11.release_key(k)
-        return
-    if a.mouse == "left_click":
-        for k in a.keys:
-            x11.hold_key(k)
-        try:
-            x11.hold_left()
-            time.sleep(hold_s)
-            x11.release_left()
-        finally:
-            for k in reversed(list(a.keys)):
-                x11.release_key(k)
+            x11.release(a.keys, (button,))
         return
 
     # Keyboard-only (single or combo)
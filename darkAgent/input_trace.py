@@ -0,0 +1,352 @@
+"""
+Record every event an X11Input sends to a compact binary trace, and replay traces on their recorded timing.
+
+A TraceRecorder attached to an X11Input logs each XTEST event as it is queued and each flush/sync as it is issued,
+with its time.monotonic_ns() timestamp. A trace file is a header (MAGIC, then the display name as a u16 length and
+UTF-8 bytes) followed by 10-byte records `<qBB`: t_ns, kind, code. kind is the X event type (KeyPress, KeyRelease,
+ButtonPress, ButtonRelease) with code the keycode or button, or FLUSH / SYNC marking the point where the queued
+events were written. Keycodes are stored as sent, so replay targets displays with the recording display's keymap
+(the instances of one container share it).
+
+Replay groups the events by the flush that sent them and sends each group on an absolute deadline, start + its
+flush time relative to the first: the events are queued ahead, the process sleeps until SPIN_US before the deadline
+(with the garbage collector off), spins out the rest and flushes. Deadlines never accumulate earlier groups' error.
+The error of a group is the time its flush is issued minus its deadline, the same point the recorder timestamps, so
+the flush's own duration (a round-trip for SYNC) is not counted as lag. replay_many() drives several displays at
+once, one process per display (no GIL shared between the spinning loops), all started on one common deadline.
+
+Usage:
+    with X11Input(":90") as x11, TraceRecorder(Path("/root/captures/run.trace"), x11):
+        agent.run()                                        # Everything x11 sends is recorded
+    python3 /root/darkAgent/input_trace.py record --display :90 --out /root/captures/run.trace --seconds 30
+    python3 /root/darkAgent/input_trace.py info /root/captures/run.trace
+    python3 /root/darkAgent/input_trace.py replay /root/captures/run.trace --display :90 :91 :92
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import multiprocessing as mp
+import random
+import struct
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Sequence
+
+import numpy as np
+from Xlib import X
+from Xlib.ext import xtest
+
+from capture_stats import LatencyHistogram
+from x11_input import X11Input
+
+MAGIC = b"DSRITRC\x01"
+RECORD = struct.Struct("<qBB")  # t_ns, kind, code
+RECORD_DTYPE = np.dtype([("t_ns", "<i8"), ("kind", "u1"), ("code", "u1")])  # Packed: same layout as RECORD
+FLUSH = 0  # Queued events written (X11Input.flush()); timestamped when issued
+SYNC = 1  # Queued events written and processed by the server (X11Input.flush(sync=True))
+EVENT_KINDS = {X.KeyPress: "key_down", X.KeyRelease: "key_up", X.ButtonPress: "button_down", X.ButtonRelease: "button_up"}
+WRITE_BYTES = 1 << 16  # Buffered records are written out once this much is pending
+SPIN_US = 200  # Busy-wait this close to a deadline instead of sleeping
+LEAD_MS = 100  # replay_many(): common start this long after every worker is ready
+START_METHOD = "spawn"
+
+
+class TraceRecorder:
+    """
+    Appends the events of one X11Input to a trace file while attached (x11.recorder). Records are buffered in memory
+    and written out in WRITE_BYTES chunks; the file appears under its final name on close().
+    """
+
+    def __init__(self, path: Path, x11: X11Input | None = None, display: str | None = None):
+        """
+        Args:
+            path: Trace file to write
+            x11: Attach to this X11Input now (its display is stored in the header)
+            display: Display name for the header when not attaching right away
+        """
+        self.path = path
+        self.count = 0
+        self._x11: X11Input | None = None
+        self._buf = bytearray()
+        name = (display or (x11.display_str if x11 is not None else "")).encode("utf-8")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = path.with_name(path.name + ".tmp")
+        self._f = open(self._tmp, "wb")
+        self._f.write(MAGIC + struct.pack("<H", len(name)) + name)
+        if x11 is not None:
+            self.attach(x11)
+
+    def attach(self, x11: X11Input) -> None:
+        if x11.recorder is not None and x11.recorder is not self:
+            raise RuntimeError(f"X11Input {x11.display_str} is already being recorded")
+        x11.recorder = self
+        self._x11 = x11
+
+    def detach(self) -> None:
+        if self._x11 is not None:
+            self._x11.recorder = None
+            self._x11 = None
+
+    def _append(self, kind: int, code: int, t_ns: int | None = None) -> None:
+        self._buf += RECORD.pack(time.monotonic_ns() if t_ns is None else t_ns, kind, code)
+        self.count += 1
+        if len(self._buf) >= WRITE_BYTES:
+            self._f.write(self._buf)
+            self._buf.clear()
+
+    def event(self, event_type: int, code: int) -> None:
+        """One queued XTEST event (X event type, keycode or button)."""
+        self._append(event_type, code)
+
+    def codes(self, keycodes: Sequence[int], buttons: Iterable[int], down: bool) -> None:
+        """The events of X11Input.queue_codes(), in the order it queues them."""
+        if down:
+            for kc in keycodes:
+                self._append(X.KeyPress, kc)
+            for b in buttons:
+                self._append(X.ButtonPress, b)
+        else:
+            for b in buttons:
+                self._append(X.ButtonRelease, b)
+            for kc in reversed(keycodes):
+                self._append(X.KeyRelease, kc)
+
+    def flush(self, sync: bool, t_ns: int | None = None) -> None:
+        """The queued events were written (and processed, with sync); t_ns is when the flush was issued."""
+        self._append(SYNC if sync else FLUSH, 0, t_ns)
+
+    def close(self) -> None:
+        if self._f.closed:
+            return
+        self.detach()
+        self._f.write(self._buf)
+        self._buf.clear()
+        self._f.close()
+        self._tmp.replace(self.path)
+
+    def __enter__(self) -> "TraceRecorder":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+@dataclass(frozen=True)
+class Trace:
+    """Class for storing a loaded input trace."""
+    display: str  # Display it was recorded on
+    records: np.ndarray  # RECORD_DTYPE, in recording order
+
+
+@dataclass(frozen=True)
+class Batch:
+    """Class for storing the events sent by one flush."""
+    t_ns: int  # When the recorded flush was issued
+    events: tuple[tuple[int, int], ...]  # (X event type, code)
+    sync: bool
+
+
+def read_trace(path: Path) -> Trace:
+    data = path.read_bytes()
+    if data[:len(MAGIC)] != MAGIC:
+        raise RuntimeError(f"{path} is not an input trace")
+    (n,) = struct.unpack_from("<H", data, len(MAGIC))
+    start = len(MAGIC) + 2 + n
+    body = len(data) - start
+    if body % RECORD.size:
+        raise RuntimeError(f"{path} is truncated ({body % RECORD.size} trailing bytes)")
+    display = data[len(MAGIC) + 2:start].decode("utf-8")
+    return Trace(display=display, records=np.frombuffer(data, dtype=RECORD_DTYPE, offset=start))
+
+
+def batches(records: np.ndarray) -> list[Batch]:
+    """Group the events by the flush that sent them; events left queued at the end form a last batch at their time."""
+    out = []
+    events: list[tuple[int, int]] = []
+    for t, kind, code in zip(records["t_ns"].tolist(), records["kind"].tolist(), records["code"].tolist()):
+        if kind in (FLUSH, SYNC):
+            out.append(Batch(t_ns=t, events=tuple(events), sync=kind == SYNC))
+            events = []
+        else:
+            events.append((kind, code))
+    if events:
+        out.append(Batch(t_ns=int(records["t_ns"][-1]), events=tuple(events), sync=False))
+    return out
+
+
+def replay(trace: Trace | list[Batch], x11: X11Input, start_ns: int | None = None, spin_us: int = SPIN_US) -> LatencyHistogram:
+    """
+    Send a trace's batches on their recorded timing
+    Args:
+        trace: A trace, or its batches()
+        x11: Display to send to (events go out directly, not through an attached recorder)
+        start_ns: time.monotonic_ns() at which the first batch is due (default: now)
+        spin_us: Busy-wait window before each deadline
+    Returns:
+        Histogram of the send error (flush issued - deadline, ns) per batch
+    """
+    todo = batches(trace.records) if isinstance(trace, Trace) else trace
+    hist = LatencyHistogram()
+    if not todo:
+        return hist
+    disp = x11.disp
+    spin_ns = spin_us * 1000
+    if start_ns is None:
+        start_ns = time.monotonic_ns()
+    offset = start_ns - todo[0].t_ns
+    gc_was_enabled = gc.isenabled()
+    gc.disable()  # A collection inside a spin would land on a deadline
+    try:
+        _send(todo, disp, offset, spin_ns, hist)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return hist
+
+
+def _send(todo: list[Batch], disp, offset: int, spin_ns: int, hist: LatencyHistogram) -> None:
+    clock = time.monotonic_ns
+    for batch in todo:
+        for kind, code in batch.events:
+            xtest.fake_input(disp, kind, code)  # Buffered by Xlib until the flush
+        deadline = batch.t_ns + offset
+        remaining = deadline - clock()
+        if remaining > spin_ns:
+            time.sleep((remaining - spin_ns) / 1e9)
+        now = clock()
+        while now < deadline:
+            now = clock()  # Spin out the last few hundred microseconds
+        if batch.sync:
+            disp.sync()
+        else:
+            disp.flush()
+        hist.record(now - deadline)
+
+
+def _worker(path: str, display: str, spin_us: int, conn) -> None:
+    """replay_many() process: connect, report ready, replay from the start time sent back, return the error summary."""
+    todo = batches(read_trace(Path(path)).records)
+    with X11Input(display) as x11:
+        conn.send("ready")
+        start_ns = conn.recv()
+        hist = replay(todo, x11, start_ns, spin_us)
+    conn.send({"display": display, "batches": len(todo), **hist.summary(scale=1e3)})
+
+
+def replay_many(jobs: Sequence[tuple[Path, str]], spin_us: int = SPIN_US, lead_ms: float = LEAD_MS) -> list[dict]:
+    """
+    Replay traces on several displays concurrently, one process per (trace, display), from one common start time
+    Returns:
+        Per job: display, batches and the send error summary in microseconds (count, mean, min, max, percentiles)
+    """
+    ctx = mp.get_context(START_METHOD)
+    procs, conns = [], []
+    try:
+        for path, display in jobs:
+            parent, child = ctx.Pipe()
+            p = ctx.Process(target=_worker, args=(str(path), display, spin_us, child), name=f"replay-{display}", daemon=True)
+            p.start()
+            child.close()
+            procs.append(p)
+            conns.append(parent)
+        for conn, (_, display) in zip(conns, jobs):
+            try:
+                conn.recv()  # "ready"
+            except EOFError:
+                raise RuntimeError(f"Replay worker for {display} failed to start") from None
+        start_ns = time.monotonic_ns() + int(lead_ms * 1e6)  # CLOCK_MONOTONIC is shared by every process
+        for conn in conns:
+            conn.send(start_ns)
+        results = []
+        for conn, (_, display) in zip(conns, jobs):
+            try:
+                results.append(conn.recv())
+            except EOFError:
+                raise RuntimeError(f"Replay worker for {display} died") from None
+        return results
+    finally:
+        for p in procs:
+            p.join(timeout=5.0)
+            if p.is_alive():
+                p.terminate()
+
+
+def record_random(x11: X11Input, path: Path, seconds: float, hz: float, seed: int = 0) -> int:
+    """Record a random agent-like session: one action per tick, held for part of the tick. Returns the event count."""
+    from action_scheduler import ActionScheduler
+    from input_actions import ActionTable
+
+    rng = random.Random(seed)
+    table = ActionTable(x11)
+    period = 1.0 / hz
+    with TraceRecorder(path, x11) as rec, ActionScheduler(x11, table) as sched:
+        t_end = time.monotonic() + seconds
+        deadline = time.monotonic()
+        while deadline < t_end:
+            sched.submit(table[rng.randrange(len(table))], hold_s=period * rng.uniform(0.2, 0.9))
+            deadline += period
+            time.sleep(max(0.0, deadline - time.monotonic()))
+        sched.wait_idle(timeout=1.0)
+        sched.release_all()
+        return rec.count
+
+
+def describe(trace: Trace) -> dict:
+    r = trace.records
+    kinds = r["kind"]
+    out = {"display": trace.display, "records": len(r), "batches": int(np.isin(kinds, (FLUSH, SYNC)).sum())}
+    out["duration_s"] = float(r["t_ns"][-1] - r["t_ns"][0]) / 1e9 if len(r) else 0.0
+    for kind, name in EVENT_KINDS.items():
+        out[name] = int((kinds == kind).sum())
+    return out
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Record X11Input traces and replay them on their recorded timing.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    rec = sub.add_parser("record", help="Record a random agent-like input session.")
+    rec.add_argument("--display", required=True, help="X11 DISPLAY to send to.")
+    rec.add_argument("--out", type=Path, required=True, help="Trace file to write.")
+    rec.add_argument("--seconds", type=float, default=10.0)
+    rec.add_argument("--hz", type=float, default=15.0, help="Actions per second (default: 15).")
+    rec.add_argument("--seed", type=int, default=0)
+    rep = sub.add_parser("replay", help="Replay traces, concurrently on several displays.")
+    rep.add_argument("traces", type=Path, nargs="+", help="One trace for every display, or one trace per display.")
+    rep.add_argument("--display", nargs="+", default=None, help="Displays to drive (default: each trace's own).")
+    rep.add_argument("--spin-us", type=int, default=SPIN_US, help=f"Busy-wait window before each deadline (default: {SPIN_US}).")
+    info = sub.add_parser("info", help="Summarize traces.")
+    info.add_argument("traces", type=Path, nargs="+")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.cmd == "record":
+        with X11Input(args.display) as x11:
+            n = record_random(x11, args.out, args.seconds, args.hz, args.seed)
+        print(f"Wrote {n} records to {args.out}")
+    elif args.cmd == "info":
+        for path in args.traces:
+            d = describe(read_trace(path))
+            print(f"{path}: " + " ".join(f"{k} {v:.3f}" if isinstance(v, float) else f"{k} {v}" for k, v in d.items()))
+    else:
+        displays = args.display or [read_trace(t).display for t in args.traces]
+        if len(args.traces) == 1:
+            jobs = [(args.traces[0], d) for d in displays]
+        elif len(args.traces) == len(displays):
+            jobs = list(zip(args.traces, displays))
+        else:
+            raise RuntimeError(f"Got {len(args.traces)} traces for {len(displays)} displays")
+        print(f"{'display':<10} {'batches':>8} {'mean':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'p99.9':>8} {'max':>8}  (send error, us)")
+        for r in replay_many(jobs, args.spin_us):
+            if not r["count"]:
+                print(f"{r['display']:<10} {r['batches']:>8d}  (empty trace)")
+                continue
+            print(f"{r['display']:<10} {r['batches']:>8d} {r['mean']:>8.1f} {r['p50']:>8.1f} {r['p90']:>8.1f} {r['p99']:>8.1f} {r['p99.9']:>8.1f} {r['max']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
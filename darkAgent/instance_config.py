@@ -25,6 +25,8 @@ class InstanceConfig:
     dsr_user_id: str | None
     dsr_save_root: str | None
     dsr_save_dir: str | None
+    capture_backend: str = "mss"  # "mss" (X requests) or "xwd" (the Xvfb framebuffer file in fbdir)
+    fbdir: str | None = None  # -fbdir directory of the instance's Xvfb
 
 
 def _load_config(path: Path = CONFIG_PATH) -> Dict[str, Any]:
@@ -96,4 +98,13 @@ def resolve_instance(instance_name: str, path: Path = CONFIG_PATH) -> InstanceCo
     dsr_save_dir = inst.get("dsr_save_dir")
     dsr_save_dir = dsr_save_dir.strip() if isinstance(dsr_save_dir, str) and dsr_save_dir.strip() else None
 
-    return InstanceConfig(name=instance_name, display=display, display_num=display_num, desktop_name=str(desktop_name), wineprefix=wineprefix, vnc_port=vnc_port, dsr_user_id=dsr_user_id, dsr_save_root=dsr_save_root, dsr_save_dir=dsr_save_dir)
+    fbdir = inst.get("fbdir")
+    fbdir = fbdir.strip() if isinstance(fbdir, str) and fbdir.strip() else None
+
+    capture_backend = inst.get("capture_backend", "mss")
+    if capture_backend not in ("mss", "xwd"):
+        raise RuntimeError(f"Instance '{instance_name}' has unknown capture_backend '{capture_backend}' in {path} (expected 'mss' or 'xwd')")
+    if capture_backend == "xwd" and fbdir is None:
+        raise RuntimeError(f"Instance '{instance_name}' uses capture_backend 'xwd' but has no 'fbdir' in {path}")
+
+    return InstanceConfig(name=instance_name, display=display, display_num=display_num, desktop_name=str(desktop_name), wineprefix=wineprefix, vnc_port=vnc_port, dsr_user_id=dsr_user_id, dsr_save_root=dsr_save_root, dsr_save_dir=dsr_save_dir, capture_backend=capture_backend, fbdir=fbdir)
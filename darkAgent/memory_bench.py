@@ -0,0 +1,108 @@
+"""
+Benchmark for memory_tools against the fake game process (fake_game.py), so it runs without Wine.
+
+Measures process discovery, module base lookup, single-field reads, pointer-chain resolution and full snapshots
+(sequential and batched), reporting ops/s and p50/p99 latency.
+
+Usage:
+    python3 /root/darkAgent/memory_bench.py
+    python3 /root/darkAgent/memory_bench.py --iters 20000 --json /root/captures/memory_bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from fake_game import spawn_fake_game
+from memory_offsets import ASYLUM_DEMON_OFFSETS, OFF_HP, OFF_STRUCT_PTR
+from memory_tools import PROC_SUBSTR, BatchReader, find_game_pid, module_base, read_pointer_chain, read_snapshot, read_snapshot_batched, read_typed, read_typed_offset, setup_memory_reader
+
+
+def bench(fn: Callable[[], object], iters: int, warmup: int = 10) -> dict[str, float]:
+    """
+    Times `fn` call by call
+    Args:
+        fn: The operation to time
+        iters: Number of timed calls
+        warmup: Number of untimed calls first
+    Returns:
+        ops/s and p50/p99/max latency in microseconds
+    """
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(iters, dtype=np.int64)
+    clock = time.perf_counter_ns
+    for i in range(iters):
+        t0 = clock()
+        fn()
+        samples[i] = clock() - t0
+    total_s = samples.sum() / 1e9
+    return {
+        "iters": iters,
+        "ops_per_s": iters / total_s if total_s > 0 else float("inf"),
+        "p50_us": float(np.percentile(samples, 50)) / 1e3,
+        "p99_us": float(np.percentile(samples, 99)) / 1e3,
+        "max_us": float(samples.max()) / 1e3,
+    }
+
+
+def run_benchmarks(iters: int, slow_iters: int) -> dict[str, dict[str, float]]:
+    """Spawn a fake game and run every benchmark against it."""
+    proc = spawn_fake_game(tick_hz=60.0)
+    try:
+        pid, base, basex_ptrloc, baseb_ptrloc, boss_static_base = setup_memory_reader(scan_signatures=False)
+        if pid != proc.pid:
+            raise RuntimeError(f"Found PID {pid} instead of the fake game {proc.pid}; is the real game running?")
+        results: dict[str, dict[str, float]] = {}
+        results["find_game_pid"] = bench(lambda: find_game_pid(PROC_SUBSTR, PROC_SUBSTR), slow_iters, warmup=2)
+        results["module_base"] = bench(lambda: module_base(pid, PROC_SUBSTR), slow_iters, warmup=2)
+
+        with open(f"/proc/{pid}/mem", "rb", buffering=0) as mem:
+            basex = read_typed(mem, basex_ptrloc, "u64")
+            struct_base = read_typed_offset(mem, basex, OFF_STRUCT_PTR, "u64")
+            boss_root = read_typed(mem, boss_static_base, "u64")
+            results["read_u64"] = bench(lambda: read_typed(mem, basex_ptrloc, "u64"), iters)
+            results["read_i32_hp"] = bench(lambda: read_typed_offset(mem, struct_base, OFF_HP, "i32"), iters)
+            results["player_hp_chain"] = bench(lambda: read_typed_offset(mem, read_typed_offset(mem, read_typed(mem, basex_ptrloc, "u64"), OFF_STRUCT_PTR, "u64"), OFF_HP, "i32"), iters)
+            results["boss_hp_chain"] = bench(lambda: read_pointer_chain(mem, boss_root, ASYLUM_DEMON_OFFSETS, "i32"), iters)
+            results["snapshot"] = bench(lambda: read_snapshot(mem, basex_ptrloc, baseb_ptrloc, boss_static_base), iters)
+
+        reader = BatchReader(pid)
+        try:
+            results["snapshot_batched"] = bench(lambda: read_snapshot_batched(reader, basex_ptrloc, baseb_ptrloc, boss_static_base), iters)
+        finally:
+            reader.close()
+        return results
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Benchmark memory_tools against the fake game process.")
+    p.add_argument("--iters", type=int, default=10000, help="Iterations for the read benchmarks (default: 10000).")
+    p.add_argument("--slow-iters", type=int, default=200, help="Iterations for the /proc scanning benchmarks (default: 200).")
+    p.add_argument("--json", type=Path, default=None, help="Also write the results to this JSON file.")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    results = run_benchmarks(args.iters, args.slow_iters)
+    print(f"{'benchmark':<18} {'ops/s':>12} {'p50 us':>10} {'p99 us':>10} {'max us':>10}")
+    for name, r in results.items():
+        print(f"{name:<18} {r['ops_per_s']:>12.0f} {r['p50_us']:>10.1f} {r['p99_us']:>10.1f} {r['max_us']:>10.1f}")
+    if args.json is not None:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print("Wrote:", args.json)
+
+
+if __name__ == "__main__":
+    main()
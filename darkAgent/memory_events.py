@@ -0,0 +1,251 @@
+"""
+Event stream over the game memory: polls every value in memory_offsets.py and emits typed, timestamped events only
+when something changed (player damaged/healed, max HP changed, boss damaged, death count incremented, boss chain
+became null/non-null).
+
+Subscribers either register a callback (called from the watcher thread) or consume the asyncio iterator.
+
+Usage:
+    Print the events of an instance:
+        python3 /root/darkAgent/memory_events.py --instance dsr-1
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable
+
+from memory_tools import MemorySnapshot, read_snapshot, setup_memory_reader
+
+POLL_HZ = 120.0
+
+
+@dataclass(frozen=True)
+class MemoryEvent:
+    """Base class for the events. `t_ns` is the time.monotonic_ns() of the poll that detected the change."""
+    t_ns: int
+
+
+@dataclass(frozen=True)
+class PlayerDamaged(MemoryEvent):
+    delta: int  # HP lost (positive)
+    hp: int
+
+
+@dataclass(frozen=True)
+class PlayerHealed(MemoryEvent):
+    delta: int  # HP gained (positive)
+    hp: int
+
+
+@dataclass(frozen=True)
+class PlayerMaxHpChanged(MemoryEvent):
+    old: int
+    new: int
+
+
+@dataclass(frozen=True)
+class BossDamaged(MemoryEvent):
+    delta: int  # Boss HP lost (positive)
+    hp: int
+
+
+@dataclass(frozen=True)
+class BossHealed(MemoryEvent):
+    delta: int  # Boss HP gained (positive), e.g. after the player died and the fight reset
+    hp: int
+
+
+@dataclass(frozen=True)
+class DeathCountIncremented(MemoryEvent):
+    delta: int
+    deaths: int
+
+
+@dataclass(frozen=True)
+class BossChainChanged(MemoryEvent):
+    present: bool  # True when the boss pointer chain became non-null (boss loaded)
+    hp: int | None
+
+
+def diff_snapshots(prev: MemorySnapshot, cur: MemorySnapshot) -> list[MemoryEvent]:
+    """
+    Computes the events between two consecutive snapshots
+    Args:
+        prev: The previous snapshot
+        cur: The current snapshot
+    Returns:
+        The events in a fixed order (player, deaths, boss chain, boss)
+    """
+    t = cur.t_ns
+    events: list[MemoryEvent] = []
+    if prev.hp is not None and cur.hp is not None and cur.hp != prev.hp:
+        if cur.hp < prev.hp:
+            events.append(PlayerDamaged(t_ns=t, delta=prev.hp - cur.hp, hp=cur.hp))
+        else:
+            events.append(PlayerHealed(t_ns=t, delta=cur.hp - prev.hp, hp=cur.hp))
+    if prev.hp_max is not None and cur.hp_max is not None and cur.hp_max != prev.hp_max:
+        events.append(PlayerMaxHpChanged(t_ns=t, old=prev.hp_max, new=cur.hp_max))
+    if prev.deaths is not None and cur.deaths is not None and cur.deaths > prev.deaths:
+        events.append(DeathCountIncremented(t_ns=t, delta=cur.deaths - prev.deaths, deaths=cur.deaths))
+    if (prev.boss_hp is None) != (cur.boss_hp is None):
+        events.append(BossChainChanged(t_ns=t, present=cur.boss_hp is not None, hp=cur.boss_hp))
+    elif prev.boss_hp is not None and cur.boss_hp is not None and cur.boss_hp != prev.boss_hp:
+        if cur.boss_hp < prev.boss_hp:
+            events.append(BossDamaged(t_ns=t, delta=prev.boss_hp - cur.boss_hp, hp=cur.boss_hp))
+        else:
+            events.append(BossHealed(t_ns=t, delta=cur.boss_hp - prev.boss_hp, hp=cur.boss_hp))
+    return events
+
+
+class MemoryWatcher:
+    """
+    Polls the game memory on a background thread and dispatches change events to subscribers.
+    """
+
+    def __init__(self, mem, basex_ptrloc: int, baseb_ptrloc: int, boss_static_base: int, poll_hz: float = POLL_HZ):
+        self.mem = mem
+        self.ptrlocs = (basex_ptrloc, baseb_ptrloc, boss_static_base)
+        self.poll_hz = poll_hz
+        self.last: MemorySnapshot | None = None
+        self._callbacks: list[Callable[[MemoryEvent], None]] = []
+        self.callback_errors = 0  # Exceptions raised by subscriber callbacks (logged and skipped)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._owns_mem = False
+
+    @classmethod
+    def for_instance(cls, instance: str | None = None, poll_hz: float = POLL_HZ) -> "MemoryWatcher":
+        """Create a watcher that owns its /proc/<pid>/mem handle for the given instance."""
+        pid, _, basex_ptrloc, baseb_ptrloc, boss_static_base = setup_memory_reader(instance=instance)
+        mem = open(f"/proc/{pid}/mem", "rb", buffering=0)
+        watcher = cls(mem, basex_ptrloc, baseb_ptrloc, boss_static_base, poll_hz=poll_hz)
+        watcher._owns_mem = True
+        return watcher
+
+    def subscribe(self, callback: Callable[[MemoryEvent], None]) -> Callable[[], None]:
+        """
+        Register a callback for every event. Callbacks run on the watcher thread and must not block.
+        Returns:
+            A function that unsubscribes the callback
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+
+        return unsubscribe
+
+    async def events(self, maxsize: int = 0) -> AsyncIterator[MemoryEvent]:
+        """
+        Async iterator over the events, delivered on the calling event loop.
+
+        Example:
+            async for ev in watcher.events():
+                if isinstance(ev, PlayerDamaged): ...
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[MemoryEvent] = asyncio.Queue(maxsize=maxsize)
+
+        def _put(ev: MemoryEvent) -> None:
+            if not queue.full():
+                queue.put_nowait(ev)
+
+        def _forward(ev: MemoryEvent) -> None:
+            try:
+                loop.call_soon_threadsafe(_put, ev)
+            except RuntimeError:
+                unsubscribe()  # The loop closed before this generator was finalized
+
+        unsubscribe = self.subscribe(_forward)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            unsubscribe()
+
+    def poll_once(self) -> list[MemoryEvent]:
+        """Read one snapshot, dispatch and return the events since the previous poll."""
+        cur = read_snapshot(self.mem, *self.ptrlocs)
+        prev, self.last = self.last, cur
+        if prev is None:
+            return []
+        events = diff_snapshots(prev, cur)
+        if events:
+            with self._lock:
+                callbacks = list(self._callbacks)
+            for ev in events:
+                for cb in callbacks:
+                    try:
+                        cb(ev)
+                    except Exception:
+                        # One failing subscriber must not stop the watcher thread for the others
+                        self.callback_errors += 1
+                        print(f"memory_events: callback {cb!r} failed on {ev}", file=sys.stderr)
+                        traceback.print_exc()
+        return events
+
+    def _run(self) -> None:
+        dt_ns = int(1e9 / self.poll_hz)
+        next_t = time.monotonic_ns()
+        while not self._stop.is_set():
+            self.poll_once()
+            next_t += dt_ns
+            sleep_ns = next_t - time.monotonic_ns()
+            if sleep_ns > 0:
+                self._stop.wait(sleep_ns / 1e9)
+            else:
+                next_t = time.monotonic_ns()  # Fell behind; don't try to catch up with a burst of polls
+
+    def start(self) -> "MemoryWatcher":
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="MemoryWatcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._owns_mem:
+            self.mem.close()
+
+    def __enter__(self) -> "MemoryWatcher":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Print DSR memory change events for an instance.")
+    p.add_argument("--instance", required=True, help="Instance name from /root/config/dsr_instances.json (e.g. dsr-1).")
+    p.add_argument("--hz", type=float, default=POLL_HZ, help=f"Polling rate (default: {POLL_HZ:g}).")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    with MemoryWatcher.for_instance(args.instance, poll_hz=args.hz) as watcher:
+        watcher.subscribe(lambda ev: print(f"{ev.t_ns / 1e9:.3f} {ev}", flush=True))
+        try:
+            while True:
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
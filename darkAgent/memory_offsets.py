@@ -16,3 +16,9 @@ OFF_DEATH_NUM = 0x98  # Offset to the Death Count value
 
 # Obtaining the Asylum Demon
 ASYLUM_DEMON_OFFSETS = [0x8, 0x28, 0x3E8]  # The pointer chain that was manually extracted for the health of the Asylum Demon
+
+# Array-of-bytes signatures for locating the pointer locations above on other game builds (see aob_scanner.py).
+# Each entry is (pattern, offset of the rel32 operand in the pattern, length of the instruction) for a `mov rax, [rip+rel32]`.
+BASEX_AOB = ("48 8B 05 ?? ?? ?? ?? 48 39 48 68 0F 94 C0 C3", 3, 7)  # mov rax,[BaseX]; cmp [rax+68],rcx
+BASEB_AOB = ("48 8B 05 ?? ?? ?? ?? 45 33 ED 48 8B F1 48 85 C0", 3, 7)  # mov rax,[BaseB]; xor r13d,r13d
+BOSS_BASE_AOB = None  # No signature known yet, the hardcoded RVA is always used
@@ -5,8 +5,8 @@ Test script for the memory reader
 # Import statements
 import argparse
 
-from memory_tools import *
-from memory_offsets import *
+from memory_tools import read_pointer_chain, read_typed, read_typed_offset, setup_memory_reader
+from memory_offsets import ASYLUM_DEMON_OFFSETS, OFF_DEATH_NUM, OFF_HP, OFF_HPMAX, OFF_STRUCT_PTR
 import time
 
 POLL_HZ = 60.0
@@ -3,14 +3,18 @@ Tools for reading a specific memmory offset in the game by using process ID and
 """
 
 # Import statements
+import errno
 import os
 import re
 import struct
+import time
+from dataclasses import dataclass
 from typing import Callable, Dict
 
-from memory_offsets import *
+from memory_offsets import ASYLUM_DEMON_OFFSETS, BASEB_PTRLOC_RVA, BASEX_PTRLOC_RVA, BOSS_BASE_PTRLOC_RVA, OFF_DEATH_NUM, OFF_HP, OFF_STRUCT_PTR
 
 from instance_config import resolve_instance
+from tracing import traced
 
 PROC_SUBSTR = "DarkSoulsRemastered.exe"  # Substring for finding the game process
 
@@ -62,6 +66,38 @@ def find_game_pid(substr: str, maps_needle: str, wineprefix: str | None = None)
     raise RuntimeError(f"Could not find process containing '{substr}' with module in maps")
 
 
+def find_game_pids(substr: str, maps_needle: str) -> Dict[str | None, int]:
+    """
+    Finds every game process with a single pass over /proc, keyed by the WINEPREFIX in its environment
+    Args:
+        substr: Substring for finding the game process. e.g. "DarkSoulsRemastered.exe"
+        maps_needle: Substring for finding the module in the maps e.g. "DarkSoulsRemastered.exe"
+    Returns:
+        A mapping from WINEPREFIX (None if unset) to the process ID of the game process running in it
+    """
+    out: Dict[str | None, int] = {}
+    for d in os.listdir("/proc"):
+        if not d.isdigit():
+            continue
+        pid = int(d)
+        try:
+            cmd = open(f"/proc/{pid}/cmdline", "rb").read().decode(errors="ignore")
+            if substr not in cmd:
+                continue
+            with open(f"/proc/{pid}/maps", "r", encoding="utf-8", errors="ignore") as f:
+                if not any(maps_needle.lower() in line.lower() for line in f):
+                    continue
+            wineprefix = None
+            for kv in _read_proc_environ(pid).split(b"\0"):
+                if kv.startswith(b"WINEPREFIX="):
+                    wineprefix = kv[len(b"WINEPREFIX="):].decode("utf-8", errors="ignore")
+                    break
+            out.setdefault(wineprefix, pid)
+        except Exception:
+            pass
+    return out
+
+
 
 def module_base(pid: int, needle: str) -> int:
     """
@@ -82,6 +118,65 @@ def module_base(pid: int, needle: str) -> int:
     raise RuntimeError("Could not find module base in maps")
 
 
+@dataclass(frozen=True)
+class MapRegion:
+    """Class for storing a single mapping line of /proc/<pid>/maps."""
+    start: int
+    end: int
+    perms: str
+    path: str
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
+
+    @property
+    def readable(self) -> bool:
+        return self.perms.startswith("r")
+
+    @property
+    def writable(self) -> bool:
+        return len(self.perms) > 1 and self.perms[1] == "w"
+
+
+def read_maps(pid: int) -> list[MapRegion]:
+    """
+    Parses /proc/<pid>/maps into a list of regions
+    Args:
+        pid: The process ID of the game process. e.g. 1234
+    Returns:
+        The mapped regions of the process in address order
+    """
+    regions = []
+    with open(f"/proc/{pid}/maps", "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            parts = line.split(maxsplit=5)
+            if len(parts) < 5:
+                continue
+            start_s, _, end_s = parts[0].partition("-")
+            path = parts[5].strip() if len(parts) > 5 else ""
+            regions.append(MapRegion(start=int(start_s, 16), end=int(end_s, 16), perms=parts[1], path=path))
+    return regions
+
+
+def module_regions(pid: int, needle: str) -> list[MapRegion]:
+    """
+    Returns every readable region that lies inside the module's mapped span, including the anonymous
+    regions Wine places between the module's sections
+    Args:
+        pid: The process ID of the game process. e.g. 1234
+        needle: The substring to search for in the maps. e.g. "DarkSoulsRemastered.exe"
+    Returns:
+        The readable regions of the module. If the module is not mapped, raises a RuntimeError
+    """
+    regions = read_maps(pid)
+    named = [r for r in regions if needle in r.path]
+    if not named:
+        raise RuntimeError("Could not find module regions in maps")
+    lo, hi = named[0].start, named[-1].end
+    return [r for r in regions if r.start >= lo and r.end <= hi and r.readable]
+
+
 def read_exact(mem, addr: int, n: int) -> bytes:
     """
     Reads exactly n bytes from the memory at the given address
@@ -172,11 +267,162 @@ def read_pointer_chain(mem, base_addr: int, offsets: list[int], final_type: str)
     return read_typed_offset(mem, current_ptr, offsets[-1], final_type)
 
 
-def setup_memory_reader(instance: str | None = None) -> tuple[int, int, int, int, int]:
+@dataclass(frozen=True)
+class MemorySnapshot:
+    """Class for storing one poll of every value defined in memory_offsets.py. A field is None while its pointer is null or unreadable."""
+    t_ns: int  # time.monotonic_ns() at the start of the poll
+    hp: int | None
+    hp_max: int | None
+    deaths: int | None
+    boss_hp: int | None  # None while the boss pointer chain is null (boss not loaded)
+
+
+@traced("read_snapshot", "memory")
+def read_snapshot(mem, basex_ptrloc: int, baseb_ptrloc: int, boss_static_base: int) -> MemorySnapshot:
+    """
+    Reads HP, max HP, death count and boss HP in one pass. HP and max HP are adjacent and read with a single 8-byte read.
+    Args:
+        mem: The memory object
+        basex_ptrloc, baseb_ptrloc, boss_static_base: The pointer locations returned by setup_memory_reader
+    Returns:
+        The snapshot of the values
+    """
+    t_ns = time.monotonic_ns()
+    hp = hp_max = deaths = boss_hp = None
+    try:
+        basex = u64(mem, basex_ptrloc)
+        struct_base = u64(mem, basex + OFF_STRUCT_PTR) if basex else 0
+        if struct_base:
+            hp, hp_max = struct.unpack("<ii", read_exact(mem, struct_base + OFF_HP, 8))
+    except (OSError, RuntimeError):
+        pass
+    try:
+        game_data_struct_base = u64(mem, baseb_ptrloc)
+        if game_data_struct_base:
+            deaths = i32(mem, game_data_struct_base + OFF_DEATH_NUM)
+    except (OSError, RuntimeError):
+        pass
+    try:
+        boss_root_ptr = u64(mem, boss_static_base)
+        if boss_root_ptr:
+            boss_hp = read_pointer_chain(mem, boss_root_ptr, ASYLUM_DEMON_OFFSETS, "i32")
+    except (OSError, RuntimeError):
+        pass
+    return MemorySnapshot(t_ns=t_ns, hp=hp, hp_max=hp_max, deaths=deaths, boss_hp=boss_hp)
+
+
+class BatchReader:
+    """
+    Reads many (address, size) ranges of one process through a persistent /proc/<pid>/mem descriptor with pread(2),
+    one syscall per range and no seeks.
+
+    process_vm_readv(2) can read scattered ranges in one call, but called through ctypes it measured ~2.8 us per call
+    against ~1.3 us per pread here, which cancels the gain for the 1-3 ranges a pointer-chain level has.
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.fd = os.open(f"/proc/{pid}/mem", os.O_RDONLY)
+
+    @traced("BatchReader.read", "memory")
+    def read(self, reqs: list[tuple[int, int]]) -> list[bytes | None]:
+        """
+        Reads the ranges
+        Args:
+            reqs: The (address, size) pairs to read
+        Returns:
+            The bytes of each range, or None for a null address or a range that could not be read
+        """
+        out: list[bytes | None] = []
+        for addr, size in reqs:
+            b = None
+            if addr:  # Null pointers are never readable
+                try:
+                    b = os.pread(self.fd, size, addr)
+                except OSError as e:
+                    if e.errno == errno.ESRCH:
+                        raise
+                if len(b or b"") != size:
+                    b = None
+            out.append(b)
+        return out
+
+    def alive(self) -> bool:
+        return os.path.exists(f"/proc/{self.pid}")
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+@traced("read_snapshot_batched", "memory")
+def read_snapshot_batched(reader: BatchReader, basex_ptrloc: int, baseb_ptrloc: int, boss_static_base: int) -> MemorySnapshot:
+    """
+    Same as read_snapshot, but walks all pointer chains level by level through a BatchReader
+    (one pread per pointer instead of a seek + read pair, and no exception handling per value).
+    Args:
+        reader: The batch reader of the game process
+        basex_ptrloc, baseb_ptrloc, boss_static_base: The pointer locations returned by setup_memory_reader
+    Returns:
+        The snapshot of the values
+    """
+    t_ns = time.monotonic_ns()
+
+    def ptr(b: bytes | None) -> int:
+        return struct.unpack("<Q", b)[0] if b is not None else 0
+
+    # Level 1: the static pointers
+    basex, game_data, boss_root = (ptr(b) for b in reader.read([(basex_ptrloc, 8), (baseb_ptrloc, 8), (boss_static_base, 8)]))
+    # Level 2: the player struct pointer, the death count and the first boss link
+    boss_offsets = ASYLUM_DEMON_OFFSETS
+    b_struct, b_deaths, b_boss = reader.read([(basex + OFF_STRUCT_PTR if basex else 0, 8), (game_data + OFF_DEATH_NUM if game_data else 0, 4), (boss_root + boss_offsets[0] if boss_root else 0, 8)])
+    struct_base, boss_ptr = ptr(b_struct), ptr(b_boss)
+    deaths = struct.unpack("<i", b_deaths)[0] if b_deaths is not None else None
+    # Level 3+: HP and max HP in one range, and the rest of the boss chain
+    b_hp, b_boss = reader.read([(struct_base + OFF_HP if struct_base else 0, 8), (boss_ptr + boss_offsets[1] if boss_ptr else 0, 8 if len(boss_offsets) > 2 else 4)])
+    hp, hp_max = struct.unpack("<ii", b_hp) if b_hp is not None else (None, None)
+    for i in range(2, len(boss_offsets)):
+        boss_ptr = ptr(b_boss)
+        last = i == len(boss_offsets) - 1
+        b_boss = reader.read([(boss_ptr + boss_offsets[i] if boss_ptr else 0, 4 if last else 8)])[0]
+    boss_hp = struct.unpack("<i", b_boss)[0] if b_boss is not None else None
+    return MemorySnapshot(t_ns=t_ns, hp=hp, hp_max=hp_max, deaths=deaths, boss_hp=boss_hp)
+
+
+def pointer_locations(pid: int, scan_signatures: bool = False) -> tuple[int, int, int, int]:
+    """
+    Resolves the module base and the pointer locations for a game process
+    Args:
+        pid: The process ID of the game process
+        scan_signatures: Opt in to the RVAs found by the AOB signatures (cached per game build) instead of the verified
+            ones in memory_offsets.py, which are still used for any signature that is missing or not found. Check a
+            build with aob_scanner.compare_rvas() (or its CLI) before relying on the signatures.
+    Returns:
+        The base address, pointer location of the baseX pointer, pointer location of the baseB pointer, and static base for the boss
+    """
+    base = module_base(pid, PROC_SUBSTR)  # Find the base address of the module
+    rvas: Dict[str, int] = {}
+    if scan_signatures:
+        from aob_scanner import resolve_rvas  # Imported here since aob_scanner builds on this module
+
+        with open(f"/proc/{pid}/mem", "rb", buffering=0) as mem:
+            rvas = resolve_rvas(mem, pid, base)
+    basex_ptrloc = base + rvas.get("BASEX_PTRLOC_RVA", BASEX_PTRLOC_RVA)  # Find the pointer location of the baseX pointer
+    baseb_ptrloc = base + rvas.get("BASEB_PTRLOC_RVA", BASEB_PTRLOC_RVA)  # Find the pointer location of the baseB pointer
+    boss_static_base = base + rvas.get("BOSS_BASE_PTRLOC_RVA", BOSS_BASE_PTRLOC_RVA)  # Find the static base for the boss
+    return base, basex_ptrloc, baseb_ptrloc, boss_static_base
+
+
+def setup_memory_reader(instance: str | None = None, scan_signatures: bool = False) -> tuple[int, int, int, int, int]:
     """
     Sets up the memory reader by finding the process ID, base address, and pointer location of the baseX pointer
     Args:
         instance: If provided, target that instance by selecting the game PID whose environment matches the instance WINEPREFIX.
+        scan_signatures: Opt in to the RVAs found by the AOB signatures (cached per game build) instead of the verified
+            ones in memory_offsets.py, which are still used for any signature that is missing or not found. Check a
+            build with aob_scanner.compare_rvas() (or its CLI) before relying on the signatures.
     Returns:
         The process ID, base address, pointer location of the baseX pointer, pointer location of the baseB pointer, and static base for the boss
     """
@@ -187,8 +433,5 @@ def setup_memory_reader(instance: str | None = None) -> tuple[int, int, int, int
             raise RuntimeError(f"Instance '{instance}' is missing 'wineprefix' in /root/config/dsr_instances.json")
         wineprefix = inst.wineprefix
     pid = find_game_pid(PROC_SUBSTR, PROC_SUBSTR, wineprefix=wineprefix)  # Find the process ID of the game process
-    base = module_base(pid, PROC_SUBSTR)  # Find the base address of the module
-    basex_ptrloc = base + BASEX_PTRLOC_RVA  # Find the pointer location of the baseX pointer
-    baseb_ptrloc = base + BASEB_PTRLOC_RVA  # Find the pointer location of the baseB pointer
-    boss_static_base = base + BOSS_BASE_PTRLOC_RVA  # Find the static base for the boss
+    base, basex_ptrloc, baseb_ptrloc, boss_static_base = pointer_locations(pid, scan_signatures=scan_signatures)
     return pid, base, basex_ptrloc, baseb_ptrloc, boss_static_base
@@ -0,0 +1,407 @@
+"""
+Container-wide metrics: counters, gauges and histograms kept in shared memory by every process and rendered as
+Prometheus text by a scraper that reads all of them, so one scrape covers every instance worker, grabber and
+aggregator in the container.
+
+Each process owns one block, /dev/shm/dsr_metrics.<component>.<pid>: a JSON description of its metrics followed by
+float64 value slots. Updates are plain stores into the process's own block (no locks, no syscalls); a metric is
+meant to be updated by one thread, so give per-thread or per-instance series their own labels. The scraper only
+reads the blocks; blocks of processes that are gone are removed when scraped. The module-level counter(), gauge()
+and histogram() never raise: if the block cannot be created or is full, the metric still works but is not exported.
+
+Histograms use fixed upper bounds (seconds for latencies, as Prometheus expects) and are exported with cumulative
+`_bucket{le=...}`, `_sum` and `_count` series.
+
+Usage:
+    steps = metrics.counter("dsr_env_steps_total", "Env steps", instance="dsr-1")
+    read = metrics.histogram("dsr_memory_read_seconds", "Snapshot read latency", instance="dsr-1")
+    steps.inc(); read.observe(dt_s)
+
+    Serve everything for Prometheus, or write it for the node_exporter textfile collector:
+        python3 /root/darkAgent/metrics.py serve --port 9108
+        python3 /root/darkAgent/metrics.py textfile --out /var/lib/node_exporter/dsr.prom --interval 15
+        python3 /root/darkAgent/metrics.py dump
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import json
+import math
+import os
+import struct
+import sys
+import threading
+import time
+from bisect import bisect_left
+from multiprocessing import shared_memory
+from pathlib import Path
+
+SHM_DIR = Path("/dev/shm")
+SHM_PREFIX = "dsr_metrics."
+META_SIZE = 64 * 1024  # Bytes reserved for the JSON description at the start of a block
+SLOTS = 8192  # float64 values per process
+HEADER = struct.Struct("<QQ")  # (length of the JSON description, generation)
+LATENCY_BUCKETS = (50e-6, 100e-6, 250e-6, 500e-6, 1e-3, 2.5e-3, 5e-3, 10e-3, 25e-3, 50e-3, 100e-3, 250e-3, 1.0)
+PORT = 9108
+
+
+def _label_key(labels: dict[str, str]) -> tuple[tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Counter:
+    """Monotonic counter."""
+
+    __slots__ = ("_v", "_i")
+
+    def __init__(self, values: memoryview, slot: int):
+        self._v = values
+        self._i = slot
+
+    def inc(self, n: float = 1.0) -> None:
+        self._v[self._i] += n
+
+    @property
+    def value(self) -> float:
+        return self._v[self._i]
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    __slots__ = ()
+
+    def set(self, v: float) -> None:
+        self._v[self._i] = v
+
+    def dec(self, n: float = 1.0) -> None:
+        self._v[self._i] -= n
+
+
+class Histogram:
+    """Fixed-bucket histogram; slots are the per-bucket counts (the last one is +Inf), then sum, then count."""
+
+    __slots__ = ("_v", "_i", "bounds", "_sum", "_count")
+
+    def __init__(self, values: memoryview, slot: int, bounds: tuple[float, ...]):
+        self._v = values
+        self._i = slot
+        self.bounds = bounds
+        self._sum = slot + len(bounds) + 1
+        self._count = self._sum + 1
+
+    def observe(self, v: float) -> None:
+        values = self._v
+        values[self._i + bisect_left(self.bounds, v)] += 1  # Bucket le=bound includes the bound itself
+        values[self._sum] += v
+        values[self._count] += 1
+
+    @property
+    def count(self) -> int:
+        return int(self._v[self._count])
+
+
+class Registry:
+    """The metrics block of one process."""
+
+    def __init__(self, component: str | None = None, slots: int = SLOTS):
+        """
+        Args:
+            component: Label identifying the process kind (default: the script name)
+            slots: Capacity in float64 values
+        """
+        name = component or Path(sys.argv[0] or "").stem
+        self.component = "".join(c if c.isalnum() or c in "-_" else "_" for c in name).strip("-_") or "python"
+        self.pid = os.getpid()
+        name = f"{SHM_PREFIX}{self.component}.{self.pid}"
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=META_SIZE + slots * 8)
+        except FileExistsError:
+            # Left by a killed process whose pid we now have (collect() had not removed it yet): its owner is gone
+            (SHM_DIR / name).unlink(missing_ok=True)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=META_SIZE + slots * 8)
+        self.values = self.shm.buf[META_SIZE:].cast("d")
+        self._capacity = slots
+        self._next = 0
+        self._metrics: dict[tuple, object] = {}
+        self._meta: list[dict] = []
+        self._generation = 0
+        self._lock = threading.Lock()  # Registration only; updates never lock
+
+    def _register(self, kind: str, name: str, help: str, labels: dict[str, str], n_slots: int, extra: dict | None = None):
+        key = (name, _label_key(labels))
+        with self._lock:
+            m = self._metrics.get(key)
+            if m is not None:
+                return m
+            if self._next + n_slots > self._capacity:
+                raise RuntimeError(f"Metrics block of {self.component} is full ({self._capacity} slots)")
+            slot = self._next
+            self._next += n_slots
+            entry = {"name": name, "type": kind, "help": help, "labels": dict(_label_key(labels)), "slot": slot}
+            if extra:
+                entry.update(extra)
+            self._meta.append(entry)
+            blob = json.dumps({"component": self.component, "pid": self.pid, "metrics": self._meta}).encode("utf-8")
+            if HEADER.size + len(blob) > META_SIZE:
+                raise RuntimeError(f"Metrics description of {self.component} exceeds {META_SIZE} bytes")
+            self._generation += 1
+            self.shm.buf[HEADER.size:HEADER.size + len(blob)] = blob
+            HEADER.pack_into(self.shm.buf, 0, len(blob), self._generation)  # Readers see the new length last
+            m = _make(kind, self.values, slot, extra)
+            self._metrics[key] = m
+            return m
+
+    def counter(self, name: str, help: str = "", **labels) -> Counter:
+        return self._register("counter", name, help, labels, 1)
+
+    def gauge(self, name: str, help: str = "", **labels) -> Gauge:
+        return self._register("gauge", name, help, labels, 1)
+
+    def histogram(self, name: str, help: str = "", buckets: tuple[float, ...] = LATENCY_BUCKETS, **labels) -> Histogram:
+        bounds = tuple(sorted(buckets))
+        return self._register("histogram", name, help, labels, len(bounds) + 3, {"buckets": list(bounds)})
+
+    def close(self) -> None:
+        self._metrics.clear()
+        self.values.release()
+        self.shm.close()
+        if os.getpid() != self.pid:
+            return  # Inherited through a fork: only unmap, the block belongs to the parent
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _make(kind: str, values: memoryview, slot: int, extra: dict | None):
+    if kind == "counter":
+        return Counter(values, slot)
+    if kind == "gauge":
+        return Gauge(values, slot)
+    return Histogram(values, slot, tuple(extra["buckets"]))
+
+
+_default: Registry | None = None
+_default_lock = threading.Lock()
+_warned = False
+
+
+def registry(component: str | None = None) -> Registry:
+    """The block of this process, created on first use (and again in a forked child)."""
+    global _default
+    reg = _default
+    if reg is None or reg.pid != os.getpid():
+        with _default_lock:
+            if _default is None or _default.pid != os.getpid():
+                _default = Registry(component)
+                atexit.register(_default.close)
+            reg = _default
+    return reg
+
+
+def _after_fork() -> None:
+    """In a forked child: create a block of its own on first use; the parent's is only unmapped at exit."""
+    global _default, _default_lock
+    _default = None
+    _default_lock = threading.Lock()  # May have been held by another thread of the parent
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _detached(kind: str, name: str, error: Exception, n_slots: int, extra: dict | None = None):
+    """A metric backed by private memory, so nobody scrapes it: returned when registration fails (warned once)."""
+    global _warned
+    if not _warned:
+        _warned = True
+        print(f"metrics: {name} and later failed registrations are not exported ({error})", file=sys.stderr)
+    return _make(kind, memoryview(bytearray(n_slots * 8)).cast("d"), 0, extra)
+
+
+# Metrics must never take down the component they instrument: these fall back to detached metrics on any failure
+
+
+def counter(name: str, help: str = "", **labels) -> Counter:
+    try:
+        return registry().counter(name, help, **labels)
+    except (OSError, RuntimeError) as e:
+        return _detached("counter", name, e, 1)
+
+
+def gauge(name: str, help: str = "", **labels) -> Gauge:
+    try:
+        return registry().gauge(name, help, **labels)
+    except (OSError, RuntimeError) as e:
+        return _detached("gauge", name, e, 1)
+
+
+def histogram(name: str, help: str = "", buckets: tuple[float, ...] = LATENCY_BUCKETS, **labels) -> Histogram:
+    try:
+        return registry().histogram(name, help, buckets, **labels)
+    except (OSError, RuntimeError) as e:
+        bounds = tuple(sorted(buckets))
+        return _detached("histogram", name, e, len(bounds) + 3, {"buckets": list(bounds)})
+
+
+# Scraping
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_block(path: Path) -> tuple[dict, list[float]] | None:
+    """(description, values) of one block file, or None if it is not a complete metrics block."""
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None
+    if len(data) < META_SIZE:
+        return None
+    n, _ = HEADER.unpack_from(data, 0)
+    try:
+        meta = json.loads(data[HEADER.size:HEADER.size + n])
+    except (ValueError, UnicodeDecodeError):
+        return None
+    count = (len(data) - META_SIZE) // 8
+    return meta, list(struct.unpack_from(f"<{count}d", data, META_SIZE))
+
+
+def collect(shm_dir: Path = SHM_DIR, cleanup: bool = True) -> list[tuple[dict, list[float]]]:
+    """Every live metrics block; blocks of exited processes are unlinked when `cleanup` is set."""
+    blocks = []
+    for path in sorted(shm_dir.glob(SHM_PREFIX + "*")):
+        try:
+            pid = int(path.name.rsplit(".", 1)[1])
+        except (IndexError, ValueError):
+            continue
+        if not _pid_alive(pid):
+            if cleanup:
+                path.unlink(missing_ok=True)  # Left behind by a crashed process
+            continue
+        block = read_block(path)
+        if block is not None:
+            blocks.append(block)
+    return blocks
+
+
+def _fmt_value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(int(v)) if v == int(v) and abs(v) < 2 ** 53 else repr(v)
+
+
+def _fmt_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    esc = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels.keys(), esc)) + "}"
+
+
+def render(blocks: list[tuple[dict, list[float]]]) -> str:
+    """Prometheus text exposition of the blocks; every series gets `component` and `pid` labels."""
+    families: dict[str, dict] = {}
+    for meta, values in blocks:
+        base = {"component": meta["component"], "pid": str(meta["pid"])}
+        for m in meta["metrics"]:
+            fam = families.setdefault(m["name"], {"type": m["type"], "help": m["help"], "lines": []})
+            labels = {**base, **m["labels"]}
+            slot = m["slot"]
+            if m["type"] != "histogram":
+                fam["lines"].append(f"{m['name']}{_fmt_labels(labels)} {_fmt_value(values[slot])}")
+                continue
+            bounds = m["buckets"]
+            cum = 0.0
+            for j, le in enumerate(list(bounds) + [math.inf]):
+                cum += values[slot + j]
+                fam["lines"].append(f"{m['name']}_bucket{_fmt_labels({**labels, 'le': _fmt_value(le) if math.isinf(le) else repr(le)})} {_fmt_value(cum)}")
+            fam["lines"].append(f"{m['name']}_sum{_fmt_labels(labels)} {_fmt_value(values[slot + len(bounds) + 1])}")
+            fam["lines"].append(f"{m['name']}_count{_fmt_labels(labels)} {_fmt_value(values[slot + len(bounds) + 2])}")
+    out = []
+    for name in sorted(families):
+        fam = families[name]
+        if fam["help"]:
+            out.append(f"# HELP {name} {fam['help']}")
+        out.append(f"# TYPE {name} {fam['type']}")
+        out.extend(fam["lines"])
+    return "\n".join(out) + "\n"
+
+
+def scrape(shm_dir: Path = SHM_DIR) -> str:
+    return render(collect(shm_dir))
+
+
+def write_textfile(path: Path, shm_dir: Path = SHM_DIR) -> None:
+    """Atomically replace `path` with the current scrape."""
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(scrape(shm_dir), encoding="utf-8")
+    tmp.replace(path)
+
+
+def make_server(host: str = "127.0.0.1", port: int = PORT, shm_dir: Path = SHM_DIR):
+    """ThreadingHTTPServer answering GET /metrics with scrape(); call serve_forever() (or use port=0 for tests)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # ~30 ms of imports only the exporter needs
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = scrape(shm_dir).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args) -> None:
+            pass  # One line per scrape is noise
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Export the DSR metrics of every process in the container.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    serve = sub.add_parser("serve", help="Serve Prometheus text over HTTP")
+    serve.add_argument("--host", default="127.0.0.1", help="Address to bind (default: 127.0.0.1).")
+    serve.add_argument("--port", type=int, default=PORT, help=f"Port (default: {PORT}).")
+    text = sub.add_parser("textfile", help="Write Prometheus text to a file periodically")
+    text.add_argument("--out", type=Path, required=True, help="Output file.")
+    text.add_argument("--interval", type=float, default=15.0, help="Seconds between writes; 0 writes once (default: 15).")
+    sub.add_parser("dump", help="Print one scrape")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.cmd == "serve":
+        server = make_server(args.host, args.port)
+        print(f"Serving metrics on http://{args.host}:{server.server_address[1]}/metrics")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    elif args.cmd == "textfile":
+        while True:
+            write_textfile(args.out)
+            if args.interval <= 0:
+                break
+            time.sleep(args.interval)
+    else:
+        sys.stdout.write(scrape())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Streaming recorder: the capture thread only copies raw frames into a preallocated buffer pool and enqueues them, while
+a writer thread streams them out, so encoding never runs inside the capture loop.
+
+Backends:
+- "ffmpeg": raw BGRA frames are piped to ffmpeg and encoded to `recording.mp4` (ffmpeg encodes on its own threads).
+- "npz": frames are gathered into fixed-size chunks and a bounded thread pool writes each chunk as a compressed
+  `chunk_<n>.npz` (frames + capture timestamps).
+- "auto": ffmpeg when it is on PATH, npz otherwise.
+
+When the pool is exhausted (the writer fell behind), frames are dropped and counted instead of blocking the capture.
+GIFs are an optional post-process that streams frames from the recording one at a time (write_gif).
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from capture_stats import CaptureStats
+
+QUEUE_SIZE = 64  # Frames buffered between the capture and the writer
+CHUNK_FRAMES = 48  # Frames per npz chunk
+WORKERS = 2  # npz chunk writers
+
+
+@dataclass(frozen=True)
+class RecordStats:
+    """Class for storing the outcome of a recording."""
+    backend: str
+    frames_submitted: int
+    frames_dropped: int  # Frames the capture thread could not enqueue because the pool was full
+    frames_written: int
+    seconds: float  # From the first to the last submitted frame
+    achieved_fps: float  # Frames written per second of recording
+    target_fps: float
+
+
+def _ffmpeg_cmd(out_path: Path, width: int, height: int, fps: float) -> list[str]:
+    return [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "rawvideo", "-pix_fmt", "bgra", "-s", f"{width}x{height}", "-framerate", f"{fps:g}", "-i", "-",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+        str(out_path),
+    ]
+
+
+def _write_chunk(path: Path, frames: np.ndarray, t_ns: np.ndarray, stats: CaptureStats) -> None:
+    buf = io.BytesIO()
+    with stats.stage("encode"):
+        np.savez_compressed(buf, frames=frames, t_ns=t_ns)
+    with stats.stage("write"):
+        tmp = path.with_suffix(".tmp.npz")
+        tmp.write_bytes(buf.getbuffer())
+        tmp.replace(path)
+
+
+class Recorder:
+    """
+    Producer/consumer recorder for fixed-shape (H, W, 4) uint8 BGRA frames.
+    """
+
+    def __init__(self, out_dir: Path, fps: float, frame_shape: tuple[int, int, int], backend: str = "auto", queue_size: int = QUEUE_SIZE, chunk_frames: int = CHUNK_FRAMES, workers: int = WORKERS, stats: CaptureStats | None = None):
+        if backend == "auto":
+            backend = "ffmpeg" if shutil.which("ffmpeg") else "npz"
+        if backend not in ("ffmpeg", "npz"):
+            raise ValueError(f"Unknown backend '{backend}'. Supported: auto, ffmpeg, npz")
+        self.out_dir = out_dir
+        self.fps = fps
+        self.backend = backend
+        self.frame_shape = tuple(frame_shape)
+        self.chunk_frames = chunk_frames
+        self.stats = stats if stats is not None else CaptureStats(name=str(out_dir), target_fps=fps)  # submit/encode/write stages
+        self._pool = np.empty((queue_size, *self.frame_shape), dtype=np.uint8)
+        self._free: queue.SimpleQueue[int] = queue.SimpleQueue()
+        for i in range(queue_size):
+            self._free.put(i)
+        self._pending: queue.SimpleQueue[tuple[int, int] | None] = queue.SimpleQueue()
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self._first_ns = 0
+        self._last_ns = 0
+        self._error: BaseException | None = None
+
+        out_dir.mkdir(parents=True, exist_ok=True)
+        self._proc: subprocess.Popen | None = None
+        if backend == "ffmpeg":
+            h, w = self.frame_shape[:2]
+            self.out_path = out_dir / "recording.mp4"
+            self._proc = subprocess.Popen(_ffmpeg_cmd(self.out_path, w, h, fps), stdin=subprocess.PIPE)
+        else:
+            self.out_path = out_dir
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="RecorderChunk")
+            # Chunk buffers are recycled; one more than the workers so the writer can fill while they compress
+            self._chunks: queue.SimpleQueue[tuple[np.ndarray, np.ndarray]] = queue.SimpleQueue()
+            for _ in range(workers + 1):
+                self._chunks.put((np.empty((chunk_frames, *self.frame_shape), dtype=np.uint8), np.empty(chunk_frames, dtype=np.int64)))
+            self._futures: list[Future] = []
+        self._thread = threading.Thread(target=self._run, name="RecorderWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, frame: np.ndarray, t_ns: int) -> bool:
+        """
+        Copy a frame into the pool and enqueue it; never blocks
+        Args:
+            frame: The (H, W, 4) uint8 frame
+            t_ns: Its capture timestamp
+        Returns:
+            False if the frame was dropped because the writer fell behind
+        """
+        t0 = time.monotonic_ns()
+        self.submitted += 1
+        if not self._first_ns:
+            self._first_ns = t_ns
+        self._last_ns = t_ns
+        try:
+            idx = self._free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return False
+        np.copyto(self._pool[idx], frame)
+        self._pending.put((idx, t_ns))
+        self.stats.record("submit", time.monotonic_ns() - t0)
+        return True
+
+    def _run(self) -> None:
+        chunk: tuple[np.ndarray, np.ndarray] | None = None
+        n = 0
+        chunk_idx = 0
+        try:
+            while True:
+                item = self._pending.get()
+                if item is None:
+                    break
+                idx, t_ns = item
+                if self._proc is not None:
+                    with self.stats.stage("encode"):  # Blocks while ffmpeg is busy encoding
+                        self._proc.stdin.write(memoryview(self._pool[idx]).cast("B"))
+                else:
+                    if chunk is None:
+                        chunk = self._chunks.get()  # Waits only if every worker is still compressing
+                    np.copyto(chunk[0][n], self._pool[idx])
+                    chunk[1][n] = t_ns
+                    n += 1
+                    if n == self.chunk_frames:
+                        self._flush_chunk(chunk, n, chunk_idx)
+                        chunk, n, chunk_idx = None, 0, chunk_idx + 1
+                self._free.put(idx)
+                self.written += 1
+            if chunk is not None and n:
+                self._flush_chunk(chunk, n, chunk_idx)
+        except BaseException as e:
+            self._error = e
+            # Keep draining so submit() sees free buffers and close() does not hang
+            while (item := self._pending.get()) is not None:
+                self._free.put(item[0])
+
+    def _flush_chunk(self, chunk: tuple[np.ndarray, np.ndarray], n: int, chunk_idx: int) -> None:
+        frames, t_ns = chunk
+        fut = self._executor.submit(_write_chunk, self.out_dir / f"chunk_{chunk_idx:05d}.npz", frames[:n], t_ns[:n], self.stats)
+        fut.add_done_callback(lambda _: self._chunks.put(chunk))
+        self._futures.append(fut)
+
+    def close(self) -> RecordStats:
+        """Flush everything, finish the output and return the stats."""
+        self._pending.put(None)
+        self._thread.join()
+        if self._proc is not None:
+            self._proc.stdin.close()
+            rc = self._proc.wait()
+            if rc != 0 and self._error is None:
+                self._error = RuntimeError(f"ffmpeg exited with rc={rc}")
+        else:
+            for fut in self._futures:
+                fut.result()
+            self._executor.shutdown()
+        if self._error is not None:
+            raise RuntimeError(f"Recording failed: {self._error}") from self._error
+
+        seconds = (self._last_ns - self._first_ns) / 1e9 + (1.0 / self.fps if self.submitted else 0.0)
+        stats = RecordStats(backend=self.backend, frames_submitted=self.submitted, frames_dropped=self.dropped, frames_written=self.written, seconds=seconds, achieved_fps=self.written / seconds if seconds > 0 else 0.0, target_fps=self.fps)
+        (self.out_dir / "recording.json").write_text(json.dumps(asdict(stats), indent=2) + "\n", encoding="utf-8")
+        return stats
+
+    def __enter__(self) -> "Recorder":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def iter_recording(run_dir: Path) -> Iterator[np.ndarray]:
+    """
+    Stream the frames of a recording one at a time, from the npz chunks or by decoding recording.mp4
+    Args:
+        run_dir: The directory passed to Recorder
+    Returns:
+        An iterator of (H, W, 4) uint8 BGRA frames
+    """
+    chunks = sorted(run_dir.glob("chunk_*.npz"))
+    if chunks:
+        for p in chunks:
+            with np.load(p) as data:
+                yield from data["frames"]
+        return
+
+    mp4 = run_dir / "recording.mp4"
+    if not mp4.is_file():
+        raise RuntimeError(f"No recording found in {run_dir}")
+    probe = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=width,height", "-of", "csv=p=0", str(mp4)], capture_output=True, text=True, check=True)
+    w, h = (int(v) for v in probe.stdout.strip().split(","))
+    proc = subprocess.Popen(["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", str(mp4), "-f", "rawvideo", "-pix_fmt", "bgra", "-"], stdout=subprocess.PIPE)
+    frame_bytes = w * h * 4
+    try:
+        while True:
+            buf = proc.stdout.read(frame_bytes)
+            if len(buf) < frame_bytes:
+                break
+            yield np.frombuffer(buf, dtype=np.uint8).reshape(h, w, 4)
+    finally:
+        proc.stdout.close()
+        proc.wait()
+
+
+def write_gif(frames: Iterable[np.ndarray], out_path: Path, fps: float) -> int:
+    """
+    Write an animated GIF frame by frame, holding only the current frame in memory.
+
+    Each frame gets its own adaptive palette (local color table), like the previous per-frame quantization.
+    Args:
+        frames: (H, W, 4) uint8 BGRA frames
+        out_path: Output GIF path
+        fps: Playback rate
+    Returns:
+        The number of frames written
+    """
+    from PIL import GifImagePlugin, Image
+
+    duration_ms = max(1, int(round(1000.0 / fps)))
+    n = 0
+    with open(out_path, "wb") as fp:
+        for frame in frames:
+            h, w = frame.shape[:2]
+            im = Image.frombuffer("RGB", (w, h), np.ascontiguousarray(frame), "raw", "BGRX", 0, 1).convert("P", palette=Image.ADAPTIVE, colors=256)
+            if n == 0:
+                header, _ = GifImagePlugin.getheader(im, info={"loop": 0, "duration": duration_ms})
+                for chunk in header:
+                    fp.write(chunk)
+            for chunk in GifImagePlugin.getdata(im, duration=duration_ms, disposal=2, include_color_table=True):
+                fp.write(chunk)
+            n += 1
+        if n == 0:
+            raise RuntimeError("No frames to write")
+        fp.write(b";")  # GIF trailer
+    return n
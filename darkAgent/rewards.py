@@ -0,0 +1,193 @@
+"""
+Shaped rewards and episode fitness from memory-snapshot time series (player HP, max HP, deaths and boss HP as read
+through memory_offsets.py), computed with NumPy over whole arrays.
+
+One kernel, step_terms(), turns the readings at two consecutive times into the reward terms of that step, element-
+wise. Offline it runs once over a whole recorded episode (prev = x[:-1], cur = x[1:]); online, RewardTracker runs it
+on the (N,) readings of N instances per tick. Both paths therefore agree exactly.
+
+Terms of a step (values stored as MISSING, i.e. unreadable, contribute nothing):
+    dealt       boss HP removed (boss HP going up, e.g. after a reset, counts as 0)
+    taken       player HP lost; on a death step the HP the player had left
+    died        the death count went up
+    boss_kill   the boss HP reached 0 from above
+    heal        a heal was used: HP went up from above 0 without a death (HP restored by respawning is not a heal)
+    alive_s     seconds survived: the step's duration while the player is alive
+A step is terminal (done) on a death or a boss kill.
+
+Usage:
+    rewards, dones = compute_rewards(t_ns, hp, hp_max, deaths, boss_hp)   # Offline, whole arrays
+    fitness = episode_fitness(t_ns, hp, hp_max, deaths, boss_hp)          # Summary of one episode
+    tracker = RewardTracker(n=4)
+    r, done = tracker.update(mem, t_ns)                                   # Online, (N, 4) readings per tick
+    python3 /root/darkAgent/rewards.py --bench 5000000
+    python3 /root/darkAgent/rewards.py --store /root/episodes             # Fitness of every recorded episode
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+import numpy as np
+
+MISSING = np.iinfo(np.int32).min  # Stored for memory values that could not be read (as in episode_store, dsr_env)
+
+
+@dataclass(frozen=True)
+class RewardWeights:
+    """Class for storing the weight of each reward term."""
+    dealt: float = 1.0 / 100  # Per boss HP removed
+    taken: float = -1.0 / 100  # Per player HP lost
+    died: float = -1.0
+    boss_kill: float = 5.0
+    heal: float = -0.1  # Per heal used; healing is limited, so an unnecessary one costs a little
+    alive_s: float = 0.01  # Per second survived
+
+
+DEFAULT_WEIGHTS = RewardWeights()
+
+
+def step_terms(prev_t: np.ndarray, prev_hp: np.ndarray, prev_deaths: np.ndarray, prev_boss: np.ndarray, cur_t: np.ndarray, cur_hp: np.ndarray, cur_deaths: np.ndarray, cur_boss: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Reward terms of the steps prev -> cur, elementwise (arrays of any equal shape)
+    Args:
+        *_t: time.monotonic_ns() of the readings
+        *_hp, *_deaths, *_boss: int32 readings, MISSING when unreadable
+    Returns:
+        The terms described in the module docstring: dealt, taken, heal, alive_s (float64) and died, boss_kill (bool)
+    """
+    hp_ok = (prev_hp != MISSING) & (cur_hp != MISSING)
+    died = (prev_deaths != MISSING) & (cur_deaths != MISSING) & (cur_deaths > prev_deaths)
+    d_hp = np.where(hp_ok, cur_hp.astype(np.int64) - prev_hp, 0)
+    taken = np.where(died, np.where(prev_hp != MISSING, np.maximum(prev_hp, 0), 0), np.maximum(-d_hp, 0))
+    heal = hp_ok & ~died & (prev_hp > 0) & (d_hp > 0)  # From 0 HP it is a respawn, whichever step the death counter moved on
+    boss_ok = (prev_boss != MISSING) & (cur_boss != MISSING)
+    dealt = np.where(boss_ok, np.maximum(prev_boss.astype(np.int64) - cur_boss, 0), 0)
+    boss_kill = boss_ok & (prev_boss > 0) & (cur_boss == 0)
+    alive = ~died & (cur_hp != MISSING) & (cur_hp > 0)
+    alive_s = np.where(alive, (cur_t - prev_t) * 1e-9, 0.0)
+    return {"dealt": dealt, "taken": taken, "died": died, "boss_kill": boss_kill, "heal": heal, "alive_s": alive_s}
+
+
+def combine(terms: dict[str, np.ndarray], weights: RewardWeights = DEFAULT_WEIGHTS) -> tuple[np.ndarray, np.ndarray]:
+    """Weighted sum of the terms -> (float32 rewards, bool dones)."""
+    w = asdict(weights)
+    reward = sum(w[k] * terms[k] for k in w)
+    return np.asarray(reward, dtype=np.float32), terms["died"] | terms["boss_kill"]
+
+
+def compute_rewards(t_ns: np.ndarray, hp: np.ndarray, hp_max: np.ndarray, deaths: np.ndarray, boss_hp: np.ndarray, weights: RewardWeights = DEFAULT_WEIGHTS) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Rewards of a whole recorded episode
+    Args:
+        t_ns, hp, hp_max, deaths, boss_hp: (T,) columns as stored by episode_store (hp_max is not used by the terms)
+        weights: Term weights
+    Returns:
+        (rewards, dones) of shape (T,): entry i is the step from reading i - 1 to i; entry 0 is 0 / False
+    """
+    rewards = np.zeros(len(t_ns), dtype=np.float32)
+    dones = np.zeros(len(t_ns), dtype=bool)
+    if len(t_ns) > 1:
+        terms = step_terms(t_ns[:-1], hp[:-1], deaths[:-1], boss_hp[:-1], t_ns[1:], hp[1:], deaths[1:], boss_hp[1:])
+        rewards[1:], dones[1:] = combine(terms, weights)
+    return rewards, dones
+
+
+def episode_fitness(t_ns: np.ndarray, hp: np.ndarray, hp_max: np.ndarray, deaths: np.ndarray, boss_hp: np.ndarray, weights: RewardWeights = DEFAULT_WEIGHTS) -> dict[str, float]:
+    """Totals of every term over an episode, plus the return (sum of rewards) used as its fitness."""
+    out = {"steps": float(len(t_ns)), "return": 0.0, "dealt": 0.0, "taken": 0.0, "died": 0.0, "boss_kill": 0.0, "heal": 0.0, "alive_s": 0.0}
+    if len(t_ns) > 1:
+        terms = step_terms(t_ns[:-1], hp[:-1], deaths[:-1], boss_hp[:-1], t_ns[1:], hp[1:], deaths[1:], boss_hp[1:])
+        rewards, _ = combine(terms, weights)
+        out["return"] = float(rewards.sum(dtype=np.float64))
+        for k, v in terms.items():
+            out[k] = float(v.sum())
+    return out
+
+
+class RewardTracker:
+    """
+    Online rewards for N instances: keeps the previous readings and applies step_terms() to each new tick.
+    """
+
+    def __init__(self, n: int = 1, weights: RewardWeights = DEFAULT_WEIGHTS):
+        self.weights = weights
+        self.prev_t = np.zeros(n, dtype=np.int64)
+        self.prev = np.full((n, 4), MISSING, dtype=np.int32)  # hp, hp_max, deaths, boss_hp
+        self.returns = np.zeros(n, dtype=np.float64)  # Of the running episodes
+        self._started = np.zeros(n, dtype=bool)
+
+    def reset(self, mem: np.ndarray, t_ns: np.ndarray, which: np.ndarray | None = None) -> None:
+        """Start new episodes at these readings (all instances, or those where `which` is True)."""
+        sel = slice(None) if which is None else which
+        self.prev[sel] = mem[sel]
+        self.prev_t[sel] = t_ns[sel]
+        self.returns[sel] = 0.0
+        self._started[sel] = True
+
+    def update(self, mem: np.ndarray, t_ns: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Account one tick
+        Args:
+            mem: (N, 4) int32 readings (hp, hp_max, deaths, boss_hp), MISSING when unreadable
+            t_ns: (N,) times of the readings
+        Returns:
+            (rewards float32 (N,), dones bool (N,)); an instance's first reading gives 0 / False
+        """
+        p, c = self.prev, mem
+        terms = step_terms(self.prev_t, p[:, 0], p[:, 2], p[:, 3], t_ns, c[:, 0], c[:, 2], c[:, 3])
+        rewards, dones = combine(terms, self.weights)
+        rewards[~self._started] = 0.0
+        dones &= self._started
+        self.returns += rewards
+        self.prev[:] = mem
+        self.prev_t[:] = t_ns
+        self._started[:] = True
+        return rewards, dones
+
+
+def _synthetic(n: int, seed: int = 0) -> tuple[np.ndarray, ...]:
+    """A long random HP/boss trace in the shape of the recorded columns, for the benchmark."""
+    rng = np.random.default_rng(seed)
+    t_ns = np.cumsum(rng.integers(15_000_000, 18_000_000, n)).astype(np.int64)
+    hp = rng.integers(0, 500, n).astype(np.int32)
+    hp_max = np.full(n, 500, dtype=np.int32)
+    deaths = np.cumsum(rng.random(n) < 0.001).astype(np.int32)
+    boss_hp = rng.integers(0, 3000, n).astype(np.int32)
+    boss_hp[rng.random(n) < 0.01] = MISSING
+    return t_ns, hp, hp_max, deaths, boss_hp
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Compute rewards and fitness over recorded episodes.")
+    p.add_argument("--store", type=Path, default=None, help="Episode store root: print the fitness of every episode.")
+    p.add_argument("--bench", type=int, default=0, metavar="STEPS", help="Time compute_rewards on a synthetic trace of this length.")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.bench:
+        cols = _synthetic(args.bench)
+        compute_rewards(*cols)  # Warm-up
+        t0 = time.perf_counter()
+        compute_rewards(*cols)
+        dt = time.perf_counter() - t0
+        print(f"compute_rewards: {args.bench} steps in {dt * 1e3:.1f} ms = {args.bench / dt / 1e6:.1f} M steps/s")
+    if args.store is not None:
+        from episode_store import EpisodeStore
+
+        store = EpisodeStore(args.store)
+        try:
+            for ep in range(len(store)):
+                f = episode_fitness(*(store.column(ep, c) for c in ("t_ns", "hp", "hp_max", "deaths", "boss_hp")))
+                print(f"ep {ep:5d} steps {f['steps']:7.0f} return {f['return']:9.3f} dealt {f['dealt']:7.0f} taken {f['taken']:7.0f} deaths {f['died']:3.0f} kills {f['boss_kill']:2.0f} heals {f['heal']:4.0f} alive {f['alive_s']:8.1f}s")
+        finally:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
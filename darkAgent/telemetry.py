@@ -0,0 +1,315 @@
+"""
+Multi-instance telemetry aggregator: reads the game memory of every instance in `/root/config/dsr_instances.json` from
+one process and publishes a consolidated table to shared memory.
+
+Each tick walks every instance's pointer chains level by level through one persistent /proc/<pid>/mem descriptor
+per instance (see memory_tools.BatchReader); /proc is only scanned, once for all instances, while some instance has no
+game process yet. At ~15 us per instance, dozens of instances fit on a single core. Readers attach to the shared table
+without talking to the aggregator; a seqlock keeps their view consistent.
+
+Usage:
+    Run the aggregator with a live view:
+        python3 /root/darkAgent/telemetry.py run --view
+    Attach a view to an already running aggregator:
+        python3 /root/darkAgent/telemetry.py view
+"""
+
+from __future__ import annotations
+
+import argparse
+import curses
+import time
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import metrics
+from instance_config import load_instances, resolve_instance
+from memory_tools import PROC_SUBSTR, BatchReader, find_game_pids, pointer_locations, read_snapshot_batched
+
+SHM_NAME = "dsr_telemetry"  # Name of the shared memory block (/dev/shm/dsr_telemetry)
+MAX_INSTANCES = 64
+TICK_HZ = 30.0
+RESCAN_S = 2.0  # How often to look for game processes of instances that have none
+MISSING = np.iinfo(np.int32).min  # Stored for values that could not be read
+READ_TIMEOUT_S = 1.0  # A write takes well under a millisecond; seq odd for this long means the writer died mid-write
+READ_BACKOFF_S = 50e-6  # Readers sleep this long between checks while a write is in progress
+
+HEADER_DTYPE = np.dtype([("seq", "<u8"), ("count", "<u4"), ("tick_hz", "<f4"), ("t_ns", "<i8")])
+ROW_DTYPE = np.dtype([
+    ("instance", "S32"),
+    ("pid", "<i4"),
+    ("hp", "<i4"),
+    ("hp_max", "<i4"),
+    ("deaths", "<i4"),
+    ("boss_hp", "<i4"),
+    ("latency_us", "<f4"),  # Time spent reading this instance's snapshot
+    ("t_ns", "<i8"),  # time.monotonic_ns() of the last successful read
+])
+
+
+class TelemetryTable:
+    """
+    Shared-memory table of one header and MAX_INSTANCES rows.
+
+    The writer bumps `seq` to an odd value before updating and to an even value after, readers retry until they see
+    the same even `seq` before and after copying (seqlock), so neither side ever takes a lock.
+    """
+
+    def __init__(self, create: bool, name: str = SHM_NAME, max_instances: int = MAX_INSTANCES):
+        size = HEADER_DTYPE.itemsize + ROW_DTYPE.itemsize * max_instances
+        if create:
+            try:
+                old = shared_memory.SharedMemory(name=name)
+                old.close()
+                old.unlink()  # Left over from a crashed aggregator
+            except FileNotFoundError:
+                pass
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Python < 3.13 registers attached blocks with the resource tracker, which would unlink it on exit
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.owner = create
+        self.header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        self.rows = np.ndarray((max_instances,), dtype=ROW_DTYPE, buffer=self.shm.buf, offset=HEADER_DTYPE.itemsize)
+        if create:
+            self.header[0] = (0, 0, 0.0, 0)
+
+    def begin_write(self) -> None:
+        self.header["seq"] += 1
+
+    def end_write(self) -> None:
+        self.header["t_ns"] = time.monotonic_ns()
+        self.header["seq"] += 1
+
+    def read(self, timeout_s: float = READ_TIMEOUT_S) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns a consistent copy of (header, rows[:count])
+        Args:
+            timeout_s: Give up if a write stays in progress this long
+        Raises:
+            RuntimeError: The writer left the table mid-write (e.g. the aggregator died between begin and end)
+        """
+        deadline = None
+        while True:
+            seq = int(self.header["seq"][0])
+            if not seq & 1:
+                header = self.header.copy()
+                rows = self.rows[: int(header["count"][0])].copy()
+                if int(self.header["seq"][0]) == seq:
+                    return header[0], rows
+                continue  # Torn by a write that started meanwhile; the writer is alive, retry right away
+            if deadline is None:
+                deadline = time.monotonic() + timeout_s
+            elif time.monotonic() >= deadline:
+                raise RuntimeError(f"Telemetry table {self.shm.name} has been mid-write for {timeout_s:g}s; is the aggregator still running?")
+            time.sleep(READ_BACKOFF_S)  # Write in progress
+
+    def close(self) -> None:
+        del self.header, self.rows  # Release the views before closing the buffer
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+@dataclass
+class _InstanceReader:
+    """Class for storing the per-instance state of the aggregator."""
+    name: str
+    wineprefix: str | None
+    pid: int = 0
+    reader: BatchReader | None = None
+    ptrlocs: tuple[int, int, int] = (0, 0, 0)
+    m_read: metrics.Histogram | None = None
+    m_exits: metrics.Counter | None = None
+
+    def attach(self, pid: int) -> None:
+        _, basex_ptrloc, baseb_ptrloc, boss_static_base = pointer_locations(pid)
+        self.pid = pid
+        self.reader = BatchReader(pid)
+        self.ptrlocs = (basex_ptrloc, baseb_ptrloc, boss_static_base)
+
+    def detach(self) -> None:
+        if self.reader is not None:
+            self.reader.close()
+        self.pid = 0
+        self.reader = None
+
+
+class TelemetryAggregator:
+    """
+    Reads every instance's game memory each tick and publishes the rows to the shared table.
+    """
+
+    def __init__(self, instance_names: list[str] | None = None, tick_hz: float = TICK_HZ):
+        names = sorted(load_instances().keys()) if instance_names is None else instance_names
+        if len(names) > MAX_INSTANCES:
+            raise RuntimeError(f"At most {MAX_INSTANCES} instances are supported, got {len(names)}")
+        self.instances = [_InstanceReader(name=n, wineprefix=resolve_instance(n).wineprefix) for n in names]
+        for inst in self.instances:
+            inst.m_read = metrics.histogram("dsr_memory_read_seconds", "Snapshot read latency", instance=inst.name)
+            inst.m_exits = metrics.counter("dsr_game_exits_total", "Game processes that went away (crashes and restarts)", instance=inst.name)
+        self.tick_hz = tick_hz
+        self.table = TelemetryTable(create=True)
+        self.table.header["count"] = len(self.instances)
+        self.table.header["tick_hz"] = tick_hz
+        for i, inst in enumerate(self.instances):
+            self.table.rows[i] = (inst.name.encode("utf-8")[:32], 0, MISSING, MISSING, MISSING, MISSING, 0.0, 0)
+        self._last_scan = 0.0
+
+    def _rescan(self) -> None:
+        """Attach instances without a game process, with one pass over /proc for all of them."""
+        self._last_scan = time.monotonic()
+        pids = find_game_pids(PROC_SUBSTR, PROC_SUBSTR)
+        for inst in self.instances:
+            if inst.reader is None and inst.wineprefix in pids:
+                try:
+                    inst.attach(pids[inst.wineprefix])
+                except Exception:
+                    inst.detach()
+
+    def tick(self) -> None:
+        if any(i.reader is None for i in self.instances) and time.monotonic() - self._last_scan >= RESCAN_S:
+            self._rescan()
+
+        # Read everything first so the seqlock write window stays short
+        results = []
+        for inst in self.instances:
+            if inst.reader is None:
+                results.append(None)
+                continue
+            t0 = time.perf_counter_ns()
+            try:
+                snap = read_snapshot_batched(inst.reader, *inst.ptrlocs)
+            except OSError:
+                snap = None
+            if snap is None or (snap.hp is None and snap.deaths is None and not inst.reader.alive()):
+                inst.detach()  # The game process exited
+                inst.m_exits.inc()
+                results.append(None)
+                continue
+            dt_ns = time.perf_counter_ns() - t0
+            inst.m_read.observe(dt_ns / 1e9)
+            results.append((snap, dt_ns / 1e3))
+
+        rows = self.table.rows
+        self.table.begin_write()
+        for i, (inst, res) in enumerate(zip(self.instances, results)):
+            rows["pid"][i] = inst.pid
+            if res is None:
+                continue
+            snap, latency_us = res
+            rows["hp"][i] = MISSING if snap.hp is None else snap.hp
+            rows["hp_max"][i] = MISSING if snap.hp_max is None else snap.hp_max
+            rows["deaths"][i] = MISSING if snap.deaths is None else snap.deaths
+            rows["boss_hp"][i] = MISSING if snap.boss_hp is None else snap.boss_hp
+            rows["latency_us"][i] = latency_us
+            rows["t_ns"][i] = snap.t_ns
+        self.table.end_write()
+
+    def run(self, on_tick=None) -> None:
+        dt = 1.0 / self.tick_hz
+        next_t = time.perf_counter()
+        while True:
+            self.tick()
+            if on_tick is not None:
+                on_tick()
+            next_t += dt
+            sleep_s = next_t - time.perf_counter()
+            if sleep_s > 0:
+                time.sleep(sleep_s)
+            else:
+                next_t = time.perf_counter()
+
+    def close(self) -> None:
+        for inst in self.instances:
+            inst.detach()
+        self.table.close()
+
+
+def format_table(header, rows: np.ndarray) -> list[str]:
+    """Format the shared table as text lines."""
+    def fmt(v: int) -> str:
+        return "-" if v == MISSING else str(int(v))
+
+    age_ms = (time.monotonic_ns() - int(header["t_ns"])) / 1e6 if header["t_ns"] else float("nan")
+    lines = [f"DSR telemetry | {len(rows)} instances | {float(header['tick_hz']):.0f} Hz | updated {age_ms:.0f} ms ago", f"{'instance':<12} {'pid':>7} {'hp':>6} {'max':>6} {'deaths':>6} {'boss':>7} {'read us':>8}"]
+    for r in rows:
+        name = bytes(r["instance"]).decode("utf-8", errors="ignore")
+        pid = str(int(r["pid"])) if r["pid"] else "-"
+        lines.append(f"{name:<12} {pid:>7} {fmt(r['hp']):>6} {fmt(r['hp_max']):>6} {fmt(r['deaths']):>6} {fmt(r['boss_hp']):>7} {float(r['latency_us']):>8.1f}")
+    return lines
+
+
+def _view_loop(table: TelemetryTable, step=None) -> None:
+    """Curses view of the shared table; `step` is called between redraws (used to drive the aggregator in-process)."""
+    def _run(stdscr) -> None:
+        curses.curs_set(0)
+        stdscr.timeout(0)
+        while True:
+            if step is not None:
+                step()
+            else:
+                time.sleep(0.1)
+            header, rows = table.read()
+            stdscr.erase()
+            for row, line in enumerate(format_table(header, rows)[: max(0, curses.LINES - 1)]):
+                stdscr.addstr(row, 0, line[: max(0, curses.COLS - 1)])
+            stdscr.refresh()
+            if stdscr.getch() in (ord("q"), ord("Q")):
+                return
+
+    curses.wrapper(_run)
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Aggregate DSR memory telemetry for all instances into shared memory.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run", help="Run the aggregator")
+    run.add_argument("--instances", help="Comma-separated instance names (default: all in the config).")
+    run.add_argument("--hz", type=float, default=TICK_HZ, help=f"Tick rate (default: {TICK_HZ:g}).")
+    run.add_argument("--view", action="store_true", help="Show the curses view while running.")
+    view = sub.add_parser("view", help="Attach a view to a running aggregator")
+    view.add_argument("--once", action="store_true", help="Print the table once instead of the curses view.")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.cmd == "view":
+        table = TelemetryTable(create=False)
+        try:
+            if args.once:
+                print("\n".join(format_table(*table.read())))
+            else:
+                _view_loop(table)
+        finally:
+            table.close()
+        return
+
+    names = [n.strip() for n in args.instances.split(",") if n.strip()] if args.instances else None
+    agg = TelemetryAggregator(names, tick_hz=args.hz)
+    try:
+        if args.view:
+            dt = 1.0 / args.hz
+
+            def step() -> None:
+                t0 = time.perf_counter()
+                agg.tick()
+                sleep_s = dt - (time.perf_counter() - t0)
+                if sleep_s > 0:
+                    time.sleep(sleep_s)
+
+            _view_loop(agg.table, step=step)
+        else:
+            agg.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agg.close()
+
+
+if __name__ == "__main__":
+    main()
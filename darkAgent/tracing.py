@@ -0,0 +1,220 @@
+"""
+Span tracing for the agent stack, exported as Chrome trace JSON (chrome://tracing, https://ui.perfetto.dev).
+
+Spans are (name, category, start, end) records appended to a ring buffer owned by the recording thread, so recording
+takes no lock; when a ring is full the oldest spans are overwritten. export_chrome() collects the rings of every
+thread of this process into one file.
+
+Tracing is switched on by the DSR_TRACE environment variable, read at import:
+    DSR_TRACE=1               record; call export_chrome() yourself
+    DSR_TRACE=/tmp/t_{pid}.json   record and write the trace there at exit ({pid} is replaced)
+and the ring size (spans per thread) by DSR_TRACE_CAPACITY. A forked child (e.g. a zygote worker) starts with empty
+rings and exports its own file.
+
+Hot paths are instrumented with @traced, which decides at decoration (import) time: with tracing off it returns the
+function itself, so instrumented code costs nothing. span() is a context manager for ad-hoc blocks; even a no-op
+`with` costs a few hundred ns here, so keep it out of per-event loops.
+
+Usage:
+    @traced("grab", "capture")
+    def grab(self): ...
+
+    with span("episode", "env"):
+        run_episode()
+    export_chrome(Path("/root/captures/trace.json"))
+"""
+
+from __future__ import annotations
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterator, TypeVar
+
+CAPACITY = int(os.environ.get("DSR_TRACE_CAPACITY", "65536"))  # Spans kept per thread
+_SETTING = os.environ.get("DSR_TRACE", "")
+ENABLED = _SETTING not in ("", "0")
+
+F = TypeVar("F", bound=Callable)
+
+
+class _Ring:
+    """Fixed-size span buffer of one thread; only that thread writes to it."""
+
+    __slots__ = ("tid", "thread_name", "spans", "n", "capacity")
+
+    def __init__(self, capacity: int):
+        t = threading.current_thread()
+        self.tid = threading.get_native_id()
+        self.thread_name = t.name
+        self.spans: list[tuple[str, str, int, int] | None] = [None] * capacity
+        self.n = 0  # Spans ever recorded; the newest is at (n - 1) % capacity
+        self.capacity = capacity
+
+    def add(self, name: str, cat: str, t0: int, t1: int) -> None:
+        self.spans[self.n % self.capacity] = (name, cat, t0, t1)
+        self.n += 1
+
+    def ordered(self) -> list[tuple[str, str, int, int]]:
+        n, cap = self.n, self.capacity
+        if n <= cap:
+            return self.spans[:n]
+        i = n % cap
+        return self.spans[i:] + self.spans[:i]
+
+
+_local = threading.local()
+_rings: list[_Ring] = []
+_rings_lock = threading.Lock()
+
+
+def _ring() -> _Ring:
+    try:
+        return _local.ring
+    except AttributeError:
+        ring = _local.ring = _Ring(CAPACITY)
+        with _rings_lock:
+            _rings.append(ring)
+        return ring
+
+
+def record(name: str, cat: str, t0: int, t1: int) -> None:
+    """Add a span measured elsewhere (time.perf_counter_ns() timestamps)."""
+    if ENABLED:
+        _ring().add(name, cat, t0, t1)
+
+
+def traced(name: str | None = None, cat: str = "agent") -> Callable[[F], F]:
+    """
+    Decorator recording a span per call
+    Args:
+        name: Span name (default: the function's qualified name)
+        cat: Category, shown as a filter in the trace viewers
+    Returns:
+        The function itself when tracing is off at decoration time, else a recording wrapper
+    """
+    def decorate(fn: F) -> F:
+        if not ENABLED:
+            return fn
+        span_name = name or fn.__qualname__
+        clock = time.perf_counter_ns
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _ring().add(span_name, cat, t0, clock())
+        return wrapper  # type: ignore[return-value]
+    return decorate
+
+
+class _Span:
+    __slots__ = ("name", "cat", "t0")
+
+    def __init__(self, name: str, cat: str):
+        self.name = name
+        self.cat = cat
+
+    def __enter__(self) -> "_Span":
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _ring().add(self.name, self.cat, self.t0, time.perf_counter_ns())
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, cat: str = "agent") -> _Span | _NullSpan:
+    """Context manager recording the enclosed block as one span."""
+    return _Span(name, cat) if ENABLED else _NULL_SPAN
+
+
+def spans() -> Iterator[tuple[int, str, tuple[str, str, int, int]]]:
+    """(tid, thread name, span) of every span still held, oldest first per thread."""
+    with _rings_lock:
+        rings = list(_rings)
+    for ring in rings:
+        for s in ring.ordered():
+            yield ring.tid, ring.thread_name, s
+
+
+def dropped() -> int:
+    """Spans overwritten because a ring was full."""
+    with _rings_lock:
+        return sum(max(0, r.n - r.capacity) for r in _rings)
+
+
+def clear() -> None:
+    with _rings_lock:
+        for ring in _rings:
+            ring.spans = [None] * ring.capacity
+            ring.n = 0
+
+
+def chrome_events() -> list[dict]:
+    """The held spans as Chrome trace "complete" events (timestamps in microseconds), plus thread-name metadata."""
+    pid = os.getpid()
+    events: list[dict] = []
+    names: dict[int, str] = {}
+    for tid, thread_name, (name, cat, t0, t1) in spans():
+        names[tid] = thread_name
+        events.append({"name": name, "cat": cat, "ph": "X", "ts": t0 / 1e3, "dur": (t1 - t0) / 1e3, "pid": pid, "tid": tid})
+    for tid, thread_name in names.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}})
+    return events
+
+
+def export_chrome(path: Path) -> int:
+    """
+    Write the held spans as a Chrome trace JSON file (atomically)
+    Returns:
+        The number of spans written
+    """
+    events = chrome_events()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ns"}), encoding="utf-8")
+    tmp.replace(path)
+    return sum(1 for e in events if e["ph"] == "X")
+
+
+def _export_at_exit() -> None:
+    with _rings_lock:
+        if not any(r.n for r in _rings):
+            return  # Nothing traced in this process (e.g. a helper process that only imported us)
+    export_chrome(Path(_SETTING.replace("{pid}", str(os.getpid()))))
+
+
+def _after_fork() -> None:
+    """In a forked child: start from empty rings and export (again) at this process's exit."""
+    global _local, _rings, _rings_lock
+    _local = threading.local()
+    _rings = []
+    _rings_lock = threading.Lock()  # May have been held by another thread of the parent
+    if _SETTING != "1":
+        atexit.unregister(_export_at_exit)
+        atexit.register(_export_at_exit)
+
+
+if ENABLED:
+    os.register_at_fork(after_in_child=_after_fork)
+    if _SETTING != "1":
+        atexit.register(_export_at_exit)
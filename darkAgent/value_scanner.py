@@ -0,0 +1,225 @@
+"""
+Cheat-Engine style value scanner for discovering new memory offsets (stamina, position, other bosses, ...).
+
+A first scan reads every writable region of the game process into NumPy snapshots and keeps the addresses holding a
+value (or every aligned address for an unknown value). Each narrowing pass re-reads the remaining regions and applies
+one vectorized comparison against the previous snapshot (changed, unchanged, increased, decreased or equal to a value).
+Candidate sets are stored as packed address bitmaps (one bit per aligned slot).
+
+Usage:
+    Start an interactive scan for a 32-bit integer:
+        python3 /root/darkAgent/value_scanner.py --instance dsr-1 --type i32
+    Commands inside the prompt:
+        first [value]   first scan (omit the value for an unknown initial value)
+        eq <value>      keep addresses equal to value
+        changed | unchanged | inc | dec
+        list [n]        print up to n candidates (default: 20)
+        quit
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+
+import numpy as np
+
+from memory_tools import PROC_SUBSTR, find_game_pid, read_maps
+from instance_config import resolve_instance
+
+CHUNK_SIZE = 64 * 1024 * 1024  # Bytes read from /proc/<pid>/mem per request
+SKIP_PATHS = ("[vvar]", "[vsyscall]", "[vdso]")  # Kernel-provided regions that can't or shouldn't be read
+
+# Supported value types and their little-endian NumPy dtypes
+SCAN_TYPES = {"i32": "<i4", "u32": "<u4", "i64": "<i8", "u64": "<u8", "f32": "<f4", "f64": "<f8"}
+
+# Narrowing modes and their vectorized comparison of (new, old)
+NARROW_MODES = {
+    "changed": lambda new, old: new != old,
+    "unchanged": lambda new, old: new == old,
+    "inc": lambda new, old: new > old,
+    "dec": lambda new, old: new < old,
+}
+
+
+@dataclass
+class _RegionScan:
+    """Class for storing the scan state of a single writable region."""
+    start: int
+    size: int
+    snapshot: np.ndarray  # Values of the last pass (one per aligned slot)
+    spare: np.ndarray  # Second buffer, swapped with snapshot each pass to avoid reallocating
+    bitmap: np.ndarray  # Packed candidate bits (little bit order), one per slot
+    count: int  # Number of candidates in the bitmap
+
+
+class ValueScanner:
+    """
+    Scan/narrow state over the writable memory of one game process.
+    """
+
+    def __init__(self, mem, pid: int, type_str: str = "i32", align: int | None = None, tol: float = 0.0):
+        if type_str not in SCAN_TYPES:
+            raise ValueError(f"Unknown type_str '{type_str}'. Supported: {sorted(SCAN_TYPES.keys())}")
+        self.mem = mem
+        self.pid = pid
+        self.dtype = np.dtype(SCAN_TYPES[type_str])
+        self.align = align or self.dtype.itemsize
+        if self.align != self.dtype.itemsize:
+            raise ValueError("Only natural alignment is supported (align == size of the type)")
+        self.tol = float(tol)
+        self.regions: list[_RegionScan] = []
+
+    @property
+    def count(self) -> int:
+        return sum(r.count for r in self.regions)
+
+    def _read_into(self, start: int, out: np.ndarray) -> np.ndarray:
+        """Reads the region into `out` chunk by chunk; returns a mask of slots that were readable."""
+        raw = out.view(np.uint8)
+        ok = np.ones(out.size, dtype=bool)
+        step = self.dtype.itemsize
+        for off in range(0, raw.size, CHUNK_SIZE):
+            end = min(off + CHUNK_SIZE, raw.size)
+            try:
+                self.mem.seek(start + off)
+                n = self.mem.readinto(memoryview(raw)[off:end])
+            except OSError:
+                n = 0
+            if n != end - off:
+                ok[(off + n) // step:end // step] = False
+        return ok
+
+    def _equals(self, values: np.ndarray, value: float) -> np.ndarray:
+        if self.dtype.kind == "f":
+            return np.abs(values - value) <= self.tol
+        return values == self.dtype.type(value)
+
+    def first_scan(self, value: float | None = None) -> int:
+        """
+        Snapshots every writable region and keeps the slots equal to `value` (or every slot if value is None)
+        Args:
+            value: The current value, or None for an unknown initial value
+        Returns:
+            The number of candidates
+        """
+        self.regions = []
+        for region in read_maps(self.pid):
+            if not (region.readable and region.writable) or region.path in SKIP_PATHS:
+                continue
+            slots = region.size // self.dtype.itemsize
+            if slots == 0:
+                continue
+            snapshot = np.empty(slots, dtype=self.dtype)
+            ok = self._read_into(region.start, snapshot)
+            mask = ok if value is None else ok & self._equals(snapshot, value)
+            count = int(np.count_nonzero(mask))
+            if count == 0:
+                continue
+            bitmap = np.packbits(mask, bitorder="little")
+            self.regions.append(_RegionScan(start=region.start, size=slots, snapshot=snapshot, spare=np.empty_like(snapshot), bitmap=bitmap, count=count))
+        return self.count
+
+    def narrow(self, mode: str, value: float | None = None) -> int:
+        """
+        Re-reads the candidate regions and keeps the slots that satisfy the comparison
+        Args:
+            mode: "changed", "unchanged", "inc", "dec" or "eq"
+            value: The value to compare against for "eq"
+        Returns:
+            The number of candidates left
+        """
+        if mode == "eq":
+            if value is None:
+                raise ValueError("Mode 'eq' requires a value")
+        elif mode not in NARROW_MODES:
+            raise ValueError(f"Unknown mode '{mode}'. Supported: {sorted(NARROW_MODES.keys()) + ['eq']}")
+
+        kept: list[_RegionScan] = []
+        for r in self.regions:
+            new = r.spare
+            ok = self._read_into(r.start, new)
+            mask = np.unpackbits(r.bitmap, count=r.size, bitorder="little").view(bool) & ok
+            if mode == "eq":
+                mask &= self._equals(new, value)
+            else:
+                mask &= NARROW_MODES[mode](new, r.snapshot)
+            r.count = int(np.count_nonzero(mask))
+            if r.count == 0:
+                continue  # Drop the region and its buffers
+            r.bitmap = np.packbits(mask, bitorder="little")
+            r.snapshot, r.spare = new, r.snapshot
+            kept.append(r)
+        self.regions = kept
+        return self.count
+
+    def candidates(self, limit: int | None = None) -> list[tuple[int, float]]:
+        """
+        Returns the candidate addresses with their last snapshot value
+        Args:
+            limit: Maximum number of candidates to return
+        Returns:
+            A list of (address, value) pairs in address order
+        """
+        out: list[tuple[int, float]] = []
+        for r in self.regions:
+            idx = np.flatnonzero(np.unpackbits(r.bitmap, count=r.size, bitorder="little"))
+            if limit is not None:
+                idx = idx[: limit - len(out)]
+            vals = r.snapshot[idx]
+            out.extend((r.start + int(i) * self.dtype.itemsize, vals[j].item()) for j, i in enumerate(idx))
+            if limit is not None and len(out) >= limit:
+                break
+        return out
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Interactive value scanner over DSR process memory.")
+    p.add_argument("--instance", help="Instance name from /root/config/dsr_instances.json (e.g. dsr-1).")
+    p.add_argument("--type", default="i32", choices=sorted(SCAN_TYPES.keys()), help="Value type to scan for (default: i32).")
+    p.add_argument("--tol", type=float, default=0.0, help="Tolerance for float equality (default: 0).")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    wineprefix = resolve_instance(args.instance).wineprefix if args.instance else None
+    pid = find_game_pid(PROC_SUBSTR, PROC_SUBSTR, wineprefix=wineprefix)
+
+    def parse_value(text: str) -> float:
+        if args.type.startswith("f"):
+            return float(text)
+        v, info = int(text), np.iinfo(SCAN_TYPES[args.type])
+        if not info.min <= v <= info.max:
+            raise ValueError(f"{v} is out of range for {args.type} ({info.min}..{info.max})")
+        return v
+
+    with open(f"/proc/{pid}/mem", "rb", buffering=0) as mem:
+        scanner = ValueScanner(mem, pid, args.type, tol=args.tol)
+        print(f"PID {pid} | type {args.type} | commands: first [v], eq v, changed, unchanged, inc, dec, list [n], quit")
+        while True:
+            try:
+                line = input("> ").split()
+            except EOFError:
+                break
+            if not line:
+                continue
+            cmd, rest = line[0], line[1:]
+            try:
+                if cmd in ("quit", "q"):
+                    break
+                if cmd == "first":
+                    n = scanner.first_scan(parse_value(rest[0]) if rest else None)
+                elif cmd == "list":
+                    for addr, val in scanner.candidates(int(rest[0]) if rest else 20):
+                        print(f"  0x{addr:X}  {val}")
+                    continue
+                else:
+                    n = scanner.narrow(cmd, parse_value(rest[0]) if rest else None)
+                print(f"{n} candidates")
+            except (ValueError, IndexError) as e:
+                print(f"error: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,28 @@ from __future__ import annotations
 
 import time
 from dataclasses import dataclass
-from typing import Iterable
-from Xlib import X, XK, display as xdisplay
+from typing import Iterable, Sequence
+from Xlib import X, XK, Xatom, display as xdisplay
 from Xlib.ext import xtest
 
+from tracing import traced
+
+
+# Common aliases for key names
+KEY_ALIASES = {
+    "esc": "Escape",
+    "escape": "Escape",
+    "enter": "Return",
+    "return": "Return",
+    "space": "space",
+    "backspace": "BackSpace",
+    "tab": "Tab",
+    "left": "Left",
+    "right": "Right",
+    "up": "Up",
+    "down": "Down",
+}
+
 
 @dataclass(frozen=True)
 class FoundWindow:
@@ -28,11 +46,146 @@ def _decode_prop_value(v) -> str | None:
     return s or None
 
 
+class WindowRegistry:
+    """
+    Cache of window titles and geometries for one display, kept fresh by X events instead of re-walking the tree.
+
+    The first scan takes the window list from the root's _NET_CLIENT_LIST when a window manager provides it, and
+    otherwise walks the tree once. Every known window then reports creation/destruction (SubstructureNotify),
+    moves/resizes (StructureNotify) and title changes (PropertyChange), and the root reports changes to
+    _NET_CLIENT_LIST. Lookups only drain events already queued on the connection, so they cost no round-trip
+    unless something changed. A name that is not cached triggers a rescan at most every RESCAN_S seconds.
+    X11Input.flush() drains the queue too, so a session that sends input but never looks a window up does not pile
+    up events.
+
+    Events are read from the X11Input connection, so nothing else should consume events on it.
+    """
+
+    RESCAN_S = 1.0
+    EVENT_MASK = X.SubstructureNotifyMask | X.StructureNotifyMask | X.PropertyChangeMask
+
+    def __init__(self, x11: "X11Input"):
+        self.x11 = x11
+        self.disp = x11.disp
+        # Atoms interned once
+        self._net_client_list = self.disp.intern_atom("_NET_CLIENT_LIST")
+        self._name_atoms = {Xatom.WM_NAME, x11._net_wm_name}
+        self._names: dict[int, str | None] = {}  # Window id -> title
+        self._by_name: dict[str, int] = {}
+        self._geometry: dict[int, tuple[int, int, int, int]] = {}
+        self._last_scan = 0.0
+        self.root_id = int(x11.root.id)
+        x11.root.change_attributes(event_mask=X.SubstructureNotifyMask | X.PropertyChangeMask)
+        self.scan()
+
+    def _client_list(self) -> list | None:
+        try:
+            prop = self.x11.root.get_full_property(self._net_client_list, Xatom.WINDOW)
+        except Exception:
+            return None
+        if prop is None or not len(prop.value):
+            return None
+        return [self.x11._get_window(int(wid)) for wid in prop.value]
+
+    def _track(self, w) -> None:
+        wid = int(w.id)
+        try:
+            w.change_attributes(event_mask=self.EVENT_MASK)
+        except Exception:
+            return
+        self._set_name(wid, self.x11._window_name(w))
+
+    def _set_name(self, wid: int, name: str | None) -> None:
+        old = self._names.get(wid)
+        if old is not None and self._by_name.get(old) == wid:
+            del self._by_name[old]
+        self._names[wid] = name
+        if name is not None:
+            self._by_name.setdefault(name, wid)
+
+    def _forget(self, wid: int) -> None:
+        name = self._names.pop(wid, None)
+        self._geometry.pop(wid, None)
+        if name is not None and self._by_name.get(name) == wid:
+            del self._by_name[name]
+            # Another window with the same title may still exist
+            for other, n in self._names.items():
+                if n == name:
+                    self._by_name[name] = other
+                    break
+
+    def scan(self) -> None:
+        """Rebuild the cache from _NET_CLIENT_LIST, or from one walk of the tree."""
+        self._names.clear()
+        self._by_name.clear()
+        self._geometry.clear()
+        windows = self._client_list()
+        if windows is None:
+            windows = self.x11._walk_tree()
+        for w in windows:
+            self._track(w)
+        self._last_scan = time.monotonic()
+
+    def process_events(self) -> None:
+        """Apply every queued event to the cache; never blocks."""
+        disp = self.disp
+        while disp.pending_events():
+            ev = disp.next_event()
+            t = ev.type
+            if t == X.CreateNotify:
+                self._track(ev.window)
+            elif t == X.DestroyNotify:
+                self._forget(int(ev.window.id))
+            elif t in (X.ConfigureNotify, X.ReparentNotify, X.UnmapNotify, X.MapNotify):
+                self._geometry.pop(int(ev.window.id), None)  # Recomputed on the next geometry() call
+            elif t == X.PropertyNotify:
+                wid = int(ev.window.id)
+                if wid == self.root_id and ev.atom == self._net_client_list:
+                    self.scan()
+                elif ev.atom in self._name_atoms and wid in self._names:
+                    self._set_name(wid, self.x11._window_name(ev.window))
+
+    def find(self, name: str, *, rescan_on_miss: bool = True) -> int | None:
+        """
+        Window id of the first window titled `name`
+        Args:
+            name: Exact title
+            rescan_on_miss: If not cached, rescan (at most every RESCAN_S seconds) before giving up
+        Returns:
+            The window id, or None
+        """
+        self.process_events()
+        wid = self._by_name.get(name)
+        if wid is None and rescan_on_miss and time.monotonic() - self._last_scan >= self.RESCAN_S:
+            self.scan()
+            wid = self._by_name.get(name)
+        return wid
+
+    def geometry(self, window_id: int) -> tuple[int, int, int, int] | None:
+        """Cached (x, y, width, height) in root coordinates; None if the window is gone."""
+        self.process_events()
+        if window_id not in self._names:
+            return None
+        geom = self._geometry.get(window_id)
+        if geom is None:
+            try:
+                geom = self.x11.window_geometry(window_id)
+            except Exception:
+                self._forget(window_id)
+                return None
+            self._geometry[window_id] = geom
+        return geom
+
+
 class X11Input:
     """
     Minimal X11 input injector (keys + mouse) via the XTEST extension.
 
     Designed to work inside the DSR container, targeting an instance's Xorg display (e.g. ':90').
+
+    The hold_*/release_* helpers sync after every event (one round-trip each). For the hot loop, use the batched
+    API instead: press()/release() queue every event of an action and flush them in one write, and only wait for the
+    server when called with sync=True.
     """
 
     def __init__(self, display_str: str):
@@ -43,6 +196,17 @@ class X11Input:
             raise RuntimeError(f"XTEST extension not available on display {display_str}")
 
         self.root = self.disp.screen().root
+        self._keycodes: dict[str, int] = {}  # Key name -> keycode; the keyboard mapping is fixed for the session
+        self._net_wm_name = self.disp.intern_atom("_NET_WM_NAME")  # Interned once, not per lookup
+        self._windows: WindowRegistry | None = None
+        self.recorder = None  # An input_trace.TraceRecorder while one is attached: every event sent is logged to it
+
+    @property
+    def windows(self) -> "WindowRegistry":
+        """The display's window registry, created on first use (see WindowRegistry)."""
+        if self._windows is None:
+            self._windows = WindowRegistry(self)
+        return self._windows
 
     def close(self) -> None:
         try:
@@ -68,8 +232,7 @@ class X11Input:
 
         # _NET_WM_NAME (UTF-8)
         try:
-            atom = self.disp.intern_atom("_NET_WM_NAME")
-            prop = w.get_full_property(atom, X.AnyPropertyType)
+            prop = w.get_full_property(self._net_wm_name, X.AnyPropertyType)
             if prop is not None:
                 out = _decode_prop_value(prop.value)
                 if out:
@@ -82,12 +245,18 @@ class X11Input:
     def find_window_by_name(self, name: str) -> FoundWindow | None:
         """
         Return the first window whose title matches exactly `name`.
+
+        Served from the window registry: after the first call this is a dict lookup plus draining pending events.
         """
         target = name.strip()
         if not target:
             return None
+        wid = self.windows.find(target)
+        return FoundWindow(window_id=wid, name=target) if wid is not None else None
 
-        # DFS over the window tree.
+    def _walk_tree(self) -> list:
+        """Every window below the root, by DFS (one query_tree round-trip per window)."""
+        out = []
         stack = [self.root]
         seen = set()
         while stack:
@@ -99,23 +268,28 @@ class X11Input:
             if wid in seen:
                 continue
             seen.add(wid)
-
-            wname = self._window_name(w)
-            if wname == target:
-                return FoundWindow(window_id=wid, name=wname)
-
+            if w is not self.root:
+                out.append(w)
             try:
                 qt = w.query_tree()
                 # Children order isn't important; push all.
                 stack.extend(qt.children)
             except Exception:
                 continue
-
-        return None
+        return out
 
     def _get_window(self, window_id: int):
         return self.disp.create_resource_object("window", window_id)
 
+    def window_geometry(self, window_id: int) -> tuple[int, int, int, int]:
+        """
+        Return the client rectangle (x, y, width, height) of a window in root coordinates.
+        """
+        w = self._get_window(window_id)
+        geom = w.get_geometry()
+        origin = self.root.translate_coords(w, 0, 0)
+        return int(origin.x), int(origin.y), int(geom.width), int(geom.height)
+
     def focus_window_by_name(self, name: str, *, allow_fallback: bool = True) -> FoundWindow | None:
         """
         Try to focus a window titled `name`. If not found and allow_fallback=True,
@@ -147,21 +321,7 @@ class X11Input:
         if not k:
             raise ValueError("Empty key name")
 
-        # Common aliases
-        aliases = {
-            "esc": "Escape",
-            "escape": "Escape",
-            "enter": "Return",
-            "return": "Return",
-            "space": "space",
-            "backspace": "BackSpace",
-            "tab": "Tab",
-            "left": "Left",
-            "right": "Right",
-            "up": "Up",
-            "down": "Down",
-        }
-        k = aliases.get(k, k)
+        k = KEY_ALIASES.get(k, k)
 
         keysym = XK.string_to_keysym(k)
         if keysym == 0 and len(k) == 1:
@@ -171,56 +331,147 @@ class X11Input:
         return keysym
 
     def _keycode_for_key(self, key: str) -> int:
+        keycode = self._keycodes.get(key)
+        if keycode is not None:
+            return keycode
         keysym = self._keysym_for_key(key)
         keycode = self.disp.keysym_to_keycode(keysym)
         if not keycode:
             raise RuntimeError(f"Could not resolve keycode for key '{key}' on display {self.display_str}")
+        self._keycodes[key] = keycode
         return keycode
 
+    def keycode(self, key: str) -> int:
+        """Resolve a key name (or alias) to this display's keycode; cached after the first lookup."""
+        return self._keycode_for_key(key)
+
     def _fake_key(self, event_type: int, key: str) -> None:
         keycode = self._keycode_for_key(key)
         xtest.fake_input(self.disp, event_type, keycode)
+        if self.recorder is not None:
+            self.recorder.event(event_type, keycode)
 
+    @traced("X11Input.hold_key", "input")
     def hold_key(self, key: str) -> None:
         self._fake_key(X.KeyPress, key)
-        self.disp.sync()
+        self.flush(sync=True)
 
+    @traced("X11Input.release_key", "input")
     def release_key(self, key: str) -> None:
         self._fake_key(X.KeyRelease, key)
-        self.disp.sync()
+        self.flush(sync=True)
 
-    def tap_combo(self, keys: Iterable[str], *, hold_s: float = 0.05) -> None:
+    def tap_combo(self, keys: Iterable[str], *, hold_s: float = 0.05, sync: bool = False) -> None:
         keys_list = [k for k in keys if str(k).strip()]
         if not keys_list:
             return
 
         # Press in-order; release reverse-order.
-        for k in keys_list:
-            self.hold_key(k)
+        self.press(keys_list, sync=sync)
         if hold_s > 0:
             time.sleep(hold_s)
-        for k in reversed(keys_list):
-            self.release_key(k)
+        self.release(keys_list, sync=sync)
+
+    # Batched input: events are queued in Xlib's output buffer and sent with one flush
+
+    def queue_key(self, key: str, down: bool) -> None:
+        """Queue a key event without sending it; see flush()."""
+        self._fake_key(X.KeyPress if down else X.KeyRelease, key)
+
+    def queue_button(self, button: int, down: bool) -> None:
+        """Queue a mouse button event without sending it; see flush()."""
+        self._fake_button(X.ButtonPress if down else X.ButtonRelease, button)
+
+    @traced("X11Input.flush", "input")
+    def flush(self, sync: bool = False) -> None:
+        """
+        Send the queued events
+        Args:
+            sync: Also wait until the server has processed them (one round-trip); otherwise return right after the write
+        Once the window registry exists, also applies the X events queued for it (see WindowRegistry).
+        """
+        recorder = self.recorder
+        t_ns = time.monotonic_ns() if recorder is not None else 0  # Recorded as issued, before the write
+        if sync:
+            self.disp.sync()
+        else:
+            self.disp.flush()
+        if recorder is not None:
+            recorder.flush(sync, t_ns)
+        if self._windows is not None:
+            self._windows.process_events()  # Keep the registry's event queue bounded when no lookup comes
+
+    def press(self, keys: Iterable[str] = (), buttons: Iterable[int] = (), *, sync: bool = False) -> None:
+        """Keys down in order, then buttons down, sent as one batch."""
+        self.press_codes([self._keycode_for_key(k) for k in keys], buttons, sync=sync)
+
+    def release(self, keys: Iterable[str] = (), buttons: Iterable[int] = (), *, sync: bool = False) -> None:
+        """Buttons up, then keys up in reverse order (mirror of press()), sent as one batch."""
+        self.release_codes([self._keycode_for_key(k) for k in keys], buttons, sync=sync)
+
+    def queue_codes(self, keycodes: Sequence[int], buttons: Iterable[int], down: bool) -> None:
+        """
+        Queue events for resolved keycodes and buttons without sending them; see flush()
+        Args:
+            keycodes: Pressed in order, or released in reverse order
+            buttons: Pressed after the keys, or released before them
+            down: Press or release
+        """
+        disp = self.disp
+        if self.recorder is not None:
+            buttons = tuple(buttons)  # Iterated again by the recorder
+        if down:
+            for kc in keycodes:
+                xtest.fake_input(disp, X.KeyPress, kc)
+            for b in buttons:
+                xtest.fake_input(disp, X.ButtonPress, b)
+        else:
+            for b in buttons:
+                xtest.fake_input(disp, X.ButtonRelease, b)
+            for kc in reversed(keycodes):
+                xtest.fake_input(disp, X.KeyRelease, kc)
+        if self.recorder is not None:
+            self.recorder.codes(keycodes, buttons, down)
+
+    def press_codes(self, keycodes: Sequence[int], buttons: Iterable[int] = (), *, sync: bool = False) -> None:
+        """press() for already resolved keycodes (see input_actions.ActionTable): no name lookups at all."""
+        self.queue_codes(keycodes, buttons, True)
+        self.flush(sync)
+
+    def release_codes(self, keycodes: Sequence[int], buttons: Iterable[int] = (), *, sync: bool = False) -> None:
+        """release() for already resolved keycodes."""
+        self.queue_codes(keycodes, buttons, False)
+        self.flush(sync)
+
+    def send_action(self, keys: Iterable[str] = (), buttons: Iterable[int] = (), *, hold_s: float = 0.0, sync: bool = False) -> None:
+        """press(), hold for hold_s, release(): two writes to the server instead of one round-trip per event."""
+        keys, buttons = tuple(keys), tuple(buttons)
+        self.press(keys, buttons, sync=sync)
+        if hold_s > 0:
+            time.sleep(hold_s)
+        self.release(keys, buttons, sync=sync)
 
     def _fake_button(self, event_type: int, button: int) -> None:
         xtest.fake_input(self.disp, event_type, button)
+        if self.recorder is not None:
+            self.recorder.event(event_type, button)
 
     def hold_left(self) -> None:
         """Send left mouse button down only (no release)."""
         self._fake_button(X.ButtonPress, 1)
-        self.disp.sync()
+        self.flush(sync=True)
 
     def release_left(self) -> None:
         """Send left mouse button up only."""
         self._fake_button(X.ButtonRelease, 1)
-        self.disp.sync()
+        self.flush(sync=True)
 
     def hold_right(self) -> None:
         """Send right mouse button down only (no release)."""
         self._fake_button(X.ButtonPress, 3)
-        self.disp.sync()
+        self.flush(sync=True)
 
     def release_right(self) -> None:
         """Send right mouse button up only."""
         self._fake_button(X.ButtonRelease, 3)
-        self.disp.sync()
+        self.flush(sync=True)
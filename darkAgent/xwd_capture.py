@@ -0,0 +1,118 @@
+"""
+Zero-copy frames from an Xvfb framebuffer exposed as an XWD file (`Xvfb ... -fbdir <dir>`).
+
+Xvfb keeps each screen in a shared mapping of `<fbdir>/Xvfb_screen<n>`, laid out as an XWD dump: a big-endian header,
+a colormap, then the pixels. Mapping the same file read-only gives a NumPy view of the live screen. Reading a frame
+costs no X request and no copy; only copying it out (e.g. into a FrameGrabber ring) touches the pixels. There is no
+synchronization with the server, so a frame read while Xvfb is drawing can mix old and new pixels, just like XShm.
+
+Select it per instance with `"capture_backend": "xwd"` and `"fbdir": "<dir>"` in `/root/config/dsr_instances.json`,
+or with FrameGrabber(..., backend="xwd", fbdir=...).
+
+Usage:
+    fb = XwdFramebuffer.for_fbdir("/tmp/xvfb_fb_90")
+    frame = fb.view            # (H, W, 4) uint8 BGRX view of the live screen
+    crop = fb.view[40:560, 0:800]
+"""
+
+from __future__ import annotations
+
+import mmap
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+XWD_FILE_VERSION = 7
+XWD_HEADER_FIELDS = 25  # CARD32 fields before the window name
+XWD_COLOR_SIZE = 12  # pixel CARD32, red/green/blue CARD16, flags and pad CARD8
+Z_PIXMAP = 2
+LSB_FIRST = 0
+
+
+@dataclass(frozen=True)
+class XwdHeader:
+    """Class for storing the fields of an XWD header needed to locate and interpret the pixels."""
+    header_size: int  # Includes the NUL-terminated window name
+    pixmap_format: int
+    pixmap_depth: int
+    width: int
+    height: int
+    byte_order: int
+    bits_per_pixel: int
+    bytes_per_line: int
+    red_mask: int
+    green_mask: int
+    blue_mask: int
+    ncolors: int
+
+    @property
+    def pixels_offset(self) -> int:
+        return self.header_size + self.ncolors * XWD_COLOR_SIZE
+
+
+def parse_header(buf) -> XwdHeader:
+    """
+    Parse the big-endian XWD header at the start of `buf`
+    Args:
+        buf: Anything supporting the buffer protocol (bytes, mmap)
+    Returns:
+        The parsed header
+    """
+    f = struct.unpack_from(f">{XWD_HEADER_FIELDS}I", buf, 0)
+    if f[1] != XWD_FILE_VERSION:
+        raise RuntimeError(f"Not an XWD framebuffer (file_version={f[1]}, expected {XWD_FILE_VERSION})")
+    return XwdHeader(
+        header_size=f[0], pixmap_format=f[2], pixmap_depth=f[3], width=f[4], height=f[5], byte_order=f[7],
+        bits_per_pixel=f[11], bytes_per_line=f[12], red_mask=f[14], green_mask=f[15], blue_mask=f[16], ncolors=f[19],
+    )
+
+
+class XwdFramebuffer:
+    """
+    Read-only mapping of an Xvfb screen file with a (H, W, 4) uint8 view of its pixels.
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        if not self.path.is_file():
+            raise RuntimeError(f"No Xvfb framebuffer at {self.path} (is Xvfb running with -fbdir?)")
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ)
+        self.header = h = parse_header(self._mm)
+        # Only the layout Xvfb uses on little-endian hosts with 24/32-bit depth: 32bpp BGRX rows
+        if h.pixmap_format != Z_PIXMAP or h.bits_per_pixel != 32 or h.byte_order != LSB_FIRST:
+            raise RuntimeError(f"Unsupported XWD layout in {self.path}: format={h.pixmap_format} bpp={h.bits_per_pixel} byte_order={h.byte_order}")
+        if (h.red_mask, h.green_mask, h.blue_mask) != (0xFF0000, 0x00FF00, 0x0000FF):
+            raise RuntimeError(f"Unsupported XWD channel masks in {self.path}: {h.red_mask:#x}/{h.green_mask:#x}/{h.blue_mask:#x}")
+        end = h.pixels_offset + h.bytes_per_line * h.height
+        if end > len(self._mm):
+            raise RuntimeError(f"Truncated XWD framebuffer {self.path}: {len(self._mm)} bytes, need {end}")
+        # Rows may be padded past width * 4, so step by bytes_per_line rather than reshaping
+        self.view = np.ndarray((h.height, h.width, 4), dtype=np.uint8, buffer=self._mm, offset=h.pixels_offset, strides=(h.bytes_per_line, 4, 1))
+
+    @classmethod
+    def for_fbdir(cls, fbdir: Path | str, screen: int = 0) -> "XwdFramebuffer":
+        return cls(Path(fbdir) / f"Xvfb_screen{screen}")
+
+    @property
+    def width(self) -> int:
+        return self.header.width
+
+    @property
+    def height(self) -> int:
+        return self.header.height
+
+    def close(self) -> None:
+        self.view = None
+        try:
+            self._mm.close()
+        except BufferError:
+            pass  # Views handed out are still alive; the mapping goes away with them
+
+    def __enter__(self) -> "XwdFramebuffer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -0,0 +1,393 @@
+"""
+Fork server ("zygote") for fast worker startup: one long-lived process imports the heavy modules (NumPy, PIL, mss,
+Xlib and the darkAgent modules built on them) and precomputes the SCOPE DCT bases once, then forks a ready worker per
+request, so a worker starts in a few milliseconds instead of paying the imports again.
+
+Requests come over a Unix socket together with the requester's stdin/stdout/stderr (SCM_RIGHTS), working directory
+and environment. A worker either runs a module as a script (like `python -m module argv...`; its __main__ code is
+executed again but every import it does is already loaded) or calls module.func(*args). The zygote reports the
+worker's pid right away and its exit code when it ends.
+
+Workers are forks of the zygote: modules that read the environment at import (e.g. DSR_TRACE in tracing.py) keep
+the zygote's values; start the zygote with those set. The zygote itself never opens X connections or /proc files.
+A worker exits like a normal interpreter, so atexit handlers run, including those it inherited from the zygote;
+modules holding per-process resources reset them in the child with os.register_at_fork() (tracing.py, metrics.py).
+
+Usage:
+    python3 /root/darkAgent/zygote.py serve &                      # Listens on /tmp/dsr_zygote.sock
+    python3 /root/darkAgent/zygote.py run capture -- --seconds 10    # A capture.py run forked from it
+    From Python:
+        with Zygote.start() as z:
+            w = z.spawn("memory_test", ["--instance", "dsr-1"])
+            w.wait()
+    Import times of the helper scripts (-X importtime) and fresh-interpreter vs zygote startup:
+        python3 /root/darkAgent/zygote.py importtime
+        python3 /root/darkAgent/zygote.py bench --runs 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import os
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import time
+import traceback
+from pathlib import Path
+
+SOCKET_PATH = Path("/tmp/dsr_zygote.sock")
+HERE = Path(__file__).resolve().parent
+# Imported by the zygote before it serves. Third-party modules first, then the repo modules that pull them in
+PRELOAD = (
+    "numpy",
+    "PIL.Image",
+    "PIL.PngImagePlugin",
+    "mss",
+    "Xlib.display",
+    "Xlib.ext.xtest",
+    "capture",
+    "frame_grabber",
+    "recorder",
+    "x11_input",
+    "input_state",
+    "memory_tools",
+    "instance_config",
+    "SCOPE",
+    "agent_loop",
+    "dsr_env",
+    "save_manager",
+)
+# (n, k) DCT bases to precompute: the frame heights/widths of agent_loop.OBS_SIZE and dsr_env.OBS_SIZE at k=16
+DCT_SIZES = ((96, 16), (128, 16), (120, 16), (160, 16))
+HELPERS = ("capture", "memory_test", "input_test", "save_manager")  # Measured by `importtime`
+MAX_MSG = 1 << 20
+
+
+def _send_json(sock: socket.socket, obj: dict) -> None:
+    sock.sendall(json.dumps(obj).encode("utf-8") + b"\n")
+
+
+def _recv_json(f) -> dict | None:
+    line = f.readline()
+    return json.loads(line) if line else None
+
+
+def preload(modules: tuple[str, ...] = PRELOAD, dct_sizes: tuple[tuple[int, int], ...] = DCT_SIZES) -> list[str]:
+    """
+    Import `modules` and build the DCT bases
+    Returns:
+        The modules that could not be imported (missing optional dependencies are not fatal)
+    """
+    failed = []
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            failed.append(name)
+    try:
+        from SCOPE import dct_basis
+
+        for n, k in dct_sizes:
+            dct_basis(n, k)  # Cached; forked workers inherit the arrays
+    except ImportError:
+        pass
+    return failed
+
+
+def _run_child(req: dict, fds: list[int]) -> int:
+    """Body of a forked worker; returns the exit code."""
+    for target, fd in zip((0, 1, 2), fds):
+        os.dup2(fd, target)
+    for fd in fds:
+        os.close(fd)
+    # Python's stdio objects still wrap fds 0-2, which now point at the requester's streams
+    os.chdir(req.get("cwd") or "/")
+    if req.get("env") is not None:
+        os.environ.clear()
+        os.environ.update(req["env"])
+    module = req["module"]
+    try:
+        if req.get("func"):
+            getattr(importlib.import_module(module), req["func"])(*req.get("args", []))
+        else:
+            import runpy
+
+            sys.argv = [module] + list(req.get("argv", []))
+            runpy.run_module(module, run_name="__main__", alter_sys=True)
+        return 0
+    except SystemExit as e:
+        code = e.code
+        if code is None:
+            return 0
+        if isinstance(code, int):
+            return code
+        print(code, file=sys.stderr)
+        return 1
+    except BaseException:
+        traceback.print_exc()
+        return 1
+
+
+def serve(path: Path = SOCKET_PATH, modules: tuple[str, ...] = PRELOAD) -> None:
+    """Preload, then fork a worker per request until SIGTERM/SIGINT. Single-threaded, so forking is safe."""
+    failed = preload(modules)
+    if failed:
+        print(f"zygote: could not preload {', '.join(failed)}", file=sys.stderr)
+    path.unlink(missing_ok=True)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(path))
+    listener.listen(64)
+
+    # SIGCHLD wakes the selector through a pipe; the handler itself does nothing
+    wake_r, wake_w = os.pipe()
+    os.set_blocking(wake_r, False)
+    os.set_blocking(wake_w, False)
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+    signal.set_wakeup_fd(wake_w)
+    stop = False
+
+    def _stop(*_) -> None:
+        nonlocal stop
+        stop = True
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    sel = selectors.DefaultSelector()
+    sel.register(listener, selectors.EVENT_READ, "accept")
+    sel.register(wake_r, selectors.EVENT_READ, "wake")
+    children: dict[int, socket.socket] = {}
+    server_pid = os.getpid()
+    print(f"zygote: ready on {path} (pid {os.getpid()})", flush=True)
+
+    def reap() -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            conn = children.pop(pid, None)
+            if conn is not None:
+                try:
+                    _send_json(conn, {"exit": os.waitstatus_to_exitcode(status)})
+                except OSError:
+                    pass
+                conn.close()
+
+    try:
+        while not stop:
+            for key, _ in sel.select():
+                if key.data == "wake":
+                    try:
+                        while os.read(wake_r, 512):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    reap()
+                    continue
+                conn, _ = listener.accept()
+                try:
+                    msg, fds, _, _ = socket.recv_fds(conn, MAX_MSG, 3)
+                    while msg and not msg.endswith(b"\n"):  # A large environment can arrive in pieces
+                        more = conn.recv(MAX_MSG)
+                        if not more:
+                            break
+                        msg += more
+                    req = json.loads(msg)
+                except (OSError, ValueError):
+                    conn.close()
+                    continue
+                if len(fds) != 3:
+                    _send_json(conn, {"error": "expected stdin, stdout and stderr"})
+                    for fd in fds:
+                        os.close(fd)
+                    conn.close()
+                    continue
+                pid = os.fork()
+                if pid == 0:
+                    # Worker: drop everything of the server before running the request
+                    signal.set_wakeup_fd(-1)
+                    for sig in (signal.SIGCHLD, signal.SIGTERM, signal.SIGINT):
+                        signal.signal(sig, signal.SIG_DFL)
+                    signal.signal(signal.SIGINT, signal.default_int_handler)
+                    sel.close()
+                    listener.close()
+                    conn.close()
+                    for c in children.values():
+                        c.close()
+                    os.close(wake_r)
+                    os.close(wake_w)
+                    # Leave like a normal interpreter so atexit handlers run (trace export, key release, metrics
+                    # cleanup); modules with per-process state reset it themselves with os.register_at_fork()
+                    raise SystemExit(_run_child(req, fds))
+                for fd in fds:
+                    os.close(fd)
+                children[pid] = conn
+                _send_json(conn, {"pid": pid})
+                reap()  # The child may already be gone
+    finally:
+        if os.getpid() == server_pid:  # Not in a worker unwinding to its exit
+            for pid in list(children):
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            listener.close()
+            path.unlink(missing_ok=True)
+
+
+class ZygoteWorker:
+    """A worker forked by the zygote: its pid and, once it ended, its exit code."""
+
+    def __init__(self, sock: socket.socket, pid: int):
+        self.pid = pid
+        self.returncode: int | None = None
+        self._sock = sock
+        self._f = sock.makefile("rb")
+
+    def wait(self, timeout: float | None = None) -> int:
+        """Block until the worker exits; returns its exit code (raises TimeoutError after `timeout`)."""
+        if self.returncode is None:
+            self._sock.settimeout(timeout)
+            try:
+                msg = _recv_json(self._f)
+            except socket.timeout:
+                raise TimeoutError(f"Worker {self.pid} still running after {timeout}s")
+            self.returncode = msg["exit"] if msg else -1
+            self._f.close()
+            self._sock.close()
+        return self.returncode
+
+    def kill(self, sig: int = signal.SIGTERM) -> None:
+        try:
+            os.kill(self.pid, sig)
+        except ProcessLookupError:
+            pass
+
+
+class Zygote:
+    """Client of a zygote listening on `path`."""
+
+    def __init__(self, path: Path = SOCKET_PATH, proc: subprocess.Popen | None = None):
+        self.path = path
+        self.proc = proc  # Set when this client started the zygote
+
+    @classmethod
+    def start(cls, path: Path = SOCKET_PATH, timeout: float = 60.0) -> "Zygote":
+        """Start a zygote process and wait until it serves."""
+        proc = subprocess.Popen([sys.executable, str(Path(__file__).resolve()), "--socket", str(path), "serve"], stdout=subprocess.PIPE, cwd=str(HERE))
+        line = proc.stdout.readline().decode("utf-8", errors="replace")  # The "ready" line, once everything is loaded
+        if "ready" not in line:
+            proc.kill()
+            raise RuntimeError(f"Zygote failed to start: {line.strip() or 'no output'}")
+        proc.stdout.close()
+        return cls(path, proc)
+
+    def spawn(self, module: str, argv: list[str] | tuple[str, ...] = (), func: str | None = None, args: list | tuple = (), stdio: tuple[int, int, int] | None = None, env: dict | None = None, cwd: str | None = None) -> ZygoteWorker:
+        """
+        Fork a worker
+        Args:
+            module: Module to run as __main__ (with `argv`), or to import and call `func` from
+            argv: sys.argv[1:] of the script
+            func: Call module.func(*args) instead of running the module as a script
+            args: JSON-serializable arguments of func
+            stdio: File descriptors for the worker's stdin/stdout/stderr (default: ours)
+            env: Environment of the worker (default: ours)
+            cwd: Working directory of the worker (default: ours)
+        Returns:
+            The worker handle
+        """
+        req = {"module": module, "argv": list(argv), "func": func, "args": list(args), "env": dict(os.environ) if env is None else env, "cwd": cwd or os.getcwd()}
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(str(self.path))
+        socket.send_fds(sock, [json.dumps(req).encode("utf-8") + b"\n"], list(stdio or (0, 1, 2)))
+        f = sock.makefile("rb")
+        msg = _recv_json(f)
+        f.close()
+        if not msg or "pid" not in msg:
+            sock.close()
+            raise RuntimeError(f"Zygote refused the request: {msg}")
+        return ZygoteWorker(sock, msg["pid"])
+
+    def close(self) -> None:
+        """Stop the zygote if this client started it."""
+        if self.proc is not None:
+            self.proc.terminate()
+            self.proc.wait()
+            self.proc = None
+
+    def __enter__(self) -> "Zygote":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def import_time_ms(module: str, repeats: int = 3) -> float:
+    """Cumulative import time of `module` in a fresh interpreter, from -X importtime (best of `repeats`)."""
+    best = float("inf")
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, cwd=str(HERE)).stderr
+        for line in out.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].strip() == module:
+                best = min(best, int(parts[1]) / 1e3)
+    return best
+
+
+def _import(module: str) -> None:
+    """Worker body of `bench`: the same work as `python -c "import module"`."""
+    importlib.import_module(module)
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Fork server with the heavy modules preloaded.")
+    p.add_argument("--socket", type=Path, default=SOCKET_PATH, help=f"Unix socket (default: {SOCKET_PATH}).")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("serve", help="Preload and serve fork requests")
+    run = sub.add_parser("run", help="Run a module as a script in a worker forked from a running zygote")
+    run.add_argument("module", help="Module name, e.g. capture")
+    run.add_argument("argv", nargs=argparse.REMAINDER, help="Arguments of the script (after --)")
+    sub.add_parser("importtime", help="Print the -X importtime cost of the helper scripts")
+    bench = sub.add_parser("bench", help="Compare worker startup: fresh interpreter vs zygote fork")
+    bench.add_argument("--runs", type=int, default=10, help="Workers started per method (default: 10).")
+    bench.add_argument("--module", default="capture", help="Module each worker imports (default: capture).")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.cmd == "serve":
+        serve(args.socket)
+    elif args.cmd == "run":
+        argv = args.argv[1:] if args.argv[:1] == ["--"] else args.argv
+        sys.exit(Zygote(args.socket).spawn(args.module, argv).wait())
+    elif args.cmd == "importtime":
+        for m in HELPERS + ("SCOPE", "memory_tools", "metrics"):
+            print(f"{m:<14} {import_time_ms(m):8.1f} ms")
+    else:
+        t0 = time.perf_counter()
+        for _ in range(args.runs):
+            subprocess.run([sys.executable, "-c", f"import {args.module}"], check=True, cwd=str(HERE))
+        fresh = (time.perf_counter() - t0) / args.runs
+        t_start = time.perf_counter()
+        with Zygote.start(args.socket) as z:
+            ready = time.perf_counter() - t_start
+            t0 = time.perf_counter()
+            for _ in range(args.runs):
+                if z.spawn("zygote", func="_import", args=[args.module]).wait() != 0:
+                    raise RuntimeError("Worker failed")
+            forked = (time.perf_counter() - t0) / args.runs
+        print(f"fresh interpreter + import {args.module}: {fresh * 1e3:8.1f} ms per worker")
+        print(f"zygote fork (preloaded):        {forked * 1e3:8.1f} ms per worker (zygote ready in {ready:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()